@@ -22,10 +22,59 @@ USER_AGENT_POOL = [
 START_YEAR = 2025  # 起始年份
 END_YEAR = 2026    # 结束年份（可修改为当前年份）
 HISTORY_CRAWL_BATCH_SIZE = 10  # 每次爬取10个城市后保存
+HISTORY_CRAWL_WORKERS = 4  # 历史爬取并发线程数（1 表示按原方式串行爬取）
+HISTORY_WRITER_QUEUE_SIZE = 8  # 流式写入队列容量（按城市计），队列满时爬取线程等待写入
+HISTORY_WRITER_COMMIT_ROWS = 5000  # SQLite 每累计多少行提交一次事务（队列为空时也会提交）
+
+HTTP_POOL_CONNECTIONS = 20  # 共享连接池最多保留的域名数
+HTTP_POOL_MAXSIZE = 20  # 每个域名最多保留的空闲连接数（应不小于并发线程数）
+EGRESS_IP_TTL = 10 * 60  # 出口IP缓存有效期（秒），过期后在后台刷新，仅用于日志
+
+# 单域名自适应礼貌限速（串行/并发模式均生效，取代固定的随机等待）
+HOST_MAX_INFLIGHT = 2  # 同一域名同时在途的最大请求数
+# 同一域名相邻两次请求的最小间隔（秒），即健康时的礼貌上限。不快于原串行循环：每页约 0.8–2.8 秒（safe_get 内等待）
+# + 2.5–3.5 秒（月份间等待）+ 城市间 5–9 秒、每批后 5–10 秒的停顿，平均约 5.5 秒一个请求；并发线程数不改变此上限
+HOST_MIN_INTERVAL = REQUEST_INTERVAL * 2 + 1.5
+HOST_RATE_BURST = 1  # 令牌桶容量（允许连续发出的请求数）
+HOST_BACKOFF_FACTOR = 2.0  # 429/5xx/超时后请求间隔放大倍数（速率乘性下降）
+HOST_RECOVERY_STEP = 0.1  # 每次成功后速率的增加量（占礼貌上限速率的比例，加性恢复）
+HOST_MAX_INTERVAL = 60.0  # 退避后的最大请求间隔（秒）
+
+# HTTP 响应缓存（开发调试/修复解析后重跑时避免重复请求，默认关闭）
+HTTP_CACHE_ENABLED = False
+HTTP_CACHE_DIR = os.path.join(BASE_DIR, "data", "http_cache")
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 缓存体积上限（压缩后），超出按最近最少使用淘汰
+# 按 URL 正则匹配缓存有效期（秒），先匹配先生效；0 表示不缓存
+# 含 month 命名分组的规则：月份未结束时有效期取 HTTP_CACHE_ACTIVE_TTL，过期后用 ETag/Last-Modified 重新验证
+HTTP_CACHE_TTL_RULES = [
+    (r"tianqihoubao\.com/aqi/[a-z]+-(?P<month>\d{6})\.html", 30 * 24 * 3600),  # 历史月度页面
+    (r"cnemc\.cn", 0),  # 实时接口数据每小时变化，不缓存
+]
+HTTP_CACHE_ACTIVE_TTL = 3600
+HTTP_CACHE_DEFAULT_TTL = 0  # 未匹配任何规则的 URL 不缓存
+
+# 历史页面原始归档（按月分包、zlib 压缩），修改解析逻辑后可用 `reparse` 命令离线重建数据
+HISTORY_ARCHIVE_ENABLED = True
+HISTORY_ARCHIVE_DIR = os.path.join(BASE_DIR, "data", "archive")
+REPARSE_WORKERS = None  # 重解析进程数，None 表示使用 CPU 核数
 
 # 实时数据配置
 REALTIME_CRAWL_INTERVAL = 3600  # 实时数据采集间隔（秒）=1小时
+REALTIME_SCHEDULE_OFFSET = 5 * 60  # 定时采集在每个时段内的偏移（秒），默认每小时 :05 开始
 REALTIME_CITIES = ["北京", "河北", "天津"]  # 优先爬取的重点城市
+REALTIME_CRAWL_WORKERS = 4  # 实时采集并发线程数（1 表示按原方式串行采集）
+REALTIME_HOST_MAX_INFLIGHT = 4  # 实时接口同时在途的最大请求数
+REALTIME_HOST_MIN_INTERVAL = 0.3  # 实时接口相邻两次请求的最小间隔（秒）
+# 按域名覆盖限速参数：{域名[:端口]: (最大在途数, 最小请求间隔)}，未列出的域名使用 HOST_* 默认值
+HOST_LIMIT_OVERRIDES = {
+    "air.cnemc.cn:18007": (REALTIME_HOST_MAX_INFLIGHT, REALTIME_HOST_MIN_INTERVAL),
+}
+REALTIME_RECORD_PAYLOADS = False  # 是否保存实时接口原始 JSON（供解码基准测试/离线回放）
+REALTIME_PAYLOAD_DIR = os.path.join(BASE_DIR, "data", "payloads", "realtime")
+PARQUET_LAKE_DIR = os.path.join(BASE_DIR, "data", "lake")  # Hive 分区 Parquet 数据湖（表/年份/城市）
+METRICS_DIR = os.path.join(BASE_DIR, "data", "metrics")  # 每轮结束后导出 Prometheus 文本格式指标（None 表示不导出）
+METRICS_HTTP_PORT = None  # 本机 /metrics 指标服务端口（如 9108），None 表示不启动
+REALTIME_DELTA_ONLY = True  # 只保存 realtime_index 中尚未落盘的 (城市, 日期, 小时)，无新增时不生成 Newraw 文件
 
 # 日志配置
 LOG_LEVEL = "INFO"
@@ -33,6 +82,19 @@ LOG_FILE = os.path.join(BASE_DIR, "aqi_crawl.log")
 
 # 是否把爬取的数据同时写入 SQLite（True），否则仅写 CSV
 SAVE_TO_SQLITE = True
+# SQLite 连接池参数（storage 模块的读写函数复用池中连接，见 src/data_processing/db_pool.py）
+SQLITE_CACHED_STATEMENTS = 256  # 每个连接缓存的已编译语句数
+SQLITE_BUSY_TIMEOUT = 30  # 数据库被其他连接锁定时的等待秒数
+SQLITE_CACHE_SIZE_KB = 64 * 1024  # 页缓存大小（KB）
+SQLITE_PAGE_SIZE = 8192  # 新建数据库的页大小（字节），对已有数据库需 VACUUM 后生效
+SQLITE_TEMP_STORE_MEMORY = True  # 临时表/排序使用内存
+# 是否同时写入 Parquet 数据湖（需安装 pyarrow），供按城市/年份的分析类读取
+SAVE_TO_PARQUET = False
+PARQUET_COMPRESSION = "zstd"
+# storage.query_sqlite 与查询 REPL 的默认查询引擎："sqlite"，或 "duckdb"（需 pip install duckdb，列式执行，适合聚合分析）
+QUERY_ENGINE = "sqlite"
+QUERY_CHUNK_ROWS = 50000  # iter_query / 导出时每块的行数（内存占用与之成正比，与结果总行数无关）
+QUERY_PAGE_CACHE = 8  # 查询 REPL 分页时在内存中缓存的页数（LRU），另在后台预取下一页
 
 # 创建目录（若不存在）
 for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR]:
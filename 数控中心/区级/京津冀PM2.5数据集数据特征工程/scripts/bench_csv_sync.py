@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""CSV → SQLite 同步基准测试
+
+在临时目录中按爬虫的布局生成历史数据 CSV（每个 (年份, 城市) 一个 `<年份>_<城市>_aqi_history.csv`），
+分别用两种方式同步到各自的临时数据库 `history_data` 表：
+
+- 逐文件重写：原 `sync_folder_to_table` 的做法，每次运行都读取全部 CSV、逐行拼接去重键，
+  再把全部行 UPSERT 进数据库；
+- 清单 + 集合同步：现在的 `sync_folder_to_table`，按 `sync_manifest` 跳过未变化的文件，
+  变化的文件经临时表在 SQLite 内并入目标表。
+
+依次测量三种场景的耗时：首次同步、无变化时再次同步、新增一个文件（下一年的一个城市）后同步；
+最后校验两个数据库中的 `history_data` 内容一致。
+
+用法示例：
+    python scripts/bench_csv_sync.py
+    python scripts/bench_csv_sync.py --years 20
+"""
+import sys
+import os
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from glob import glob
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pandas as pd
+from scripts.bench_sqlite_loader import make_history
+from scripts.sync_csv_to_db import _read_csv, sync_folder_to_table
+from src.data_processing.db_pool import close_pools
+from src.data_processing.schema import normalize_frame
+from src.data_processing.storage import save_to_sqlite
+
+
+def legacy_sync(folder, table_name, db_path):
+    """原同步方式（声明了主键的表）：读取目录下全部 CSV，逐行拼接键后整表 UPSERT。"""
+    for path in glob(os.path.join(folder, "*.csv")):
+        df = normalize_frame(_read_csv(path), table_name)
+        df["_sync_key"] = df[["城市", "日期"]].fillna("").astype(str).agg("|".join, axis=1)
+        save_to_sqlite(df.drop(columns=["_sync_key"]), table_name=table_name, db_path=db_path)
+
+
+def write_files(df, folder):
+    for (year, city), part in df.groupby(["年份", "城市"]):
+        part.to_csv(os.path.join(folder, f"{year}_{city}_aqi_history.csv"), index=False, encoding="utf-8-sig")
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV 同步基准测试（逐文件重写 vs 清单 + 集合同步）")
+    parser.add_argument("--years", type=int, default=10, help="每个城市的年数")
+    args = parser.parse_args()
+    logging.getLogger("db_operations").setLevel(logging.WARNING)
+
+    df = make_history(args.years + 1)
+    last_year = df["年份"].max()
+    extra = df[(df["年份"] == last_year) & (df["城市"] == df["城市"].iloc[0])]
+    df = df[df["年份"] != last_year]
+    workdir = tempfile.mkdtemp(prefix="bench_sync_")
+    try:
+        raw_dir = os.path.join(workdir, "Hisraw")
+        os.makedirs(raw_dir)
+        write_files(df, raw_dir)
+        legacy_db = os.path.join(workdir, "legacy", "aqi.db")
+        new_db = os.path.join(workdir, "new", "aqi.db")
+        print(f"📄 合成数据：{len(df)} 行，{len(glob(os.path.join(raw_dir, '*.csv')))} 个 CSV 文件")
+
+        scenarios = [("首次同步", None), ("无变化再次同步", None), ("新增 1 个文件后同步", lambda: write_files(extra, raw_dir))]
+        for name, prepare in scenarios:
+            if prepare is not None:
+                prepare()
+            legacy_time = _timed(lambda: legacy_sync(raw_dir, "history_data", legacy_db))
+            new_time = _timed(lambda: sync_folder_to_table(raw_dir, "history_data", db_path=new_db))
+            print(f"   ├─ {name}：逐文件重写 {legacy_time:.3f}秒，清单 + 集合同步 {new_time:.3f}秒"
+                  f"（{legacy_time / new_time:.1f}x）")
+
+        import sqlite3
+
+        query = 'SELECT * FROM history_data ORDER BY "城市", "日期"'
+        with sqlite3.connect(legacy_db) as a, sqlite3.connect(new_db) as b:
+            expected, actual = pd.read_sql_query(query, a), pd.read_sql_query(query, b)
+        pd.testing.assert_frame_equal(actual, expected)
+        print(f"   └─ ✅ 两个数据库内容一致：{len(actual)} 行")
+    finally:
+        close_pools()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
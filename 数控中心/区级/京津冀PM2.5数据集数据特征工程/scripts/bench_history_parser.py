@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""历史页面解析器基准测试
+
+对比 `parse_history_page`（lxml + XPath，列数组 + 向量化数值转换）与
+`parse_history_page_bs4`（原 BeautifulSoup 实现）在已保存页面上的耗时，
+并逐页校验两者输出的 DataFrame 完全一致。
+
+页面来源（二选一）：
+- 默认读取页面归档 `data/archive`（爬取时自动写入）
+- `--pages-dir`：目录下的 `<城市拼音>-<YYYYMM>.html` 文件（城市名取拼音）
+
+用法示例：
+    python scripts/bench_history_parser.py
+    python scripts/bench_history_parser.py --repeat 5 --limit 200
+    python scripts/bench_history_parser.py --pages-dir tests_pages/
+"""
+import sys
+import os
+import argparse
+import re
+import time
+from glob import glob
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pandas as pd
+from config.settings import HISTORY_ARCHIVE_DIR
+from src.crawlers.history_parser import parse_history_page, parse_history_page_bs4
+from src.crawlers.page_archive import PageArchive, read_page
+
+
+def load_pages(archive_dir=None, pages_dir=None, limit=None):
+    """返回 [(城市名, 月份, html), ...]。"""
+    pages = []
+    if pages_dir:
+        for path in sorted(glob(os.path.join(pages_dir, "*.html"))):
+            match = re.match(r"([a-z]+)-(\d{6})\.html$", os.path.basename(path))
+            if not match:
+                continue
+            with open(path, encoding="utf-8") as f:
+                pages.append((match.group(1), match.group(2), f.read()))
+    else:
+        archive = PageArchive(archive_dir)
+        try:
+            entries = archive.entries()
+        finally:
+            archive.close()
+        for _, city_name, month, pack_path, offset, length in entries:
+            pages.append((city_name, month, read_page(pack_path, offset, length)))
+    return pages[:limit] if limit else pages
+
+
+def _time_parser(parser, pages, repeat):
+    best = None
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [parser(html, city_name, month) for city_name, month, html in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史页面解析器基准测试（lxml vs BeautifulSoup）")
+    parser.add_argument("--archive-dir", default=HISTORY_ARCHIVE_DIR, help="页面归档目录")
+    parser.add_argument("--pages-dir", default=None, help="改为读取目录下的 <拼音>-<YYYYMM>.html 文件")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    parser.add_argument("--limit", type=int, default=None, help="最多使用的页面数")
+    args = parser.parse_args()
+
+    pages = load_pages(args.archive_dir, args.pages_dir, args.limit)
+    if not pages:
+        print("❌ 没有可用的页面，请先爬取历史数据（写入归档）或指定 --pages-dir")
+        return 1
+    print(f"📄 页面数：{len(pages)}，重复 {args.repeat} 次取最快")
+
+    bs4_time, bs4_results = _time_parser(parse_history_page_bs4, pages, args.repeat)
+    lxml_time, lxml_results = _time_parser(parse_history_page, pages, args.repeat)
+
+    # 逐页校验输出一致（列、顺序、dtype、取值）
+    rows = 0
+    for (city_name, month, _), expected, actual in zip(pages, bs4_results, lxml_results):
+        if expected is None or actual is None:
+            assert expected is None and actual is None, f"{city_name}{month}：表格识别结果不一致"
+            continue
+        pd.testing.assert_frame_equal(actual, expected, obj=f"{city_name}{month}")
+        rows += len(actual)
+    print(f"✅ 输出一致：{rows} 行")
+
+    print(f"   ├─ BeautifulSoup：{bs4_time:.3f}秒（{bs4_time / len(pages) * 1000:.2f} ms/页）")
+    print(f"   ├─ lxml        ：{lxml_time:.3f}秒（{lxml_time / len(pages) * 1000:.2f} ms/页）")
+    print(f"   └─ 加速比      ：{bs4_time / lxml_time:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Parquet 数据湖读取基准测试
+
+在临时目录中按爬虫的布局生成历史数据（每个 (年份, 城市) 一个 `<年份>_<城市>_aqi_history.csv`），
+并写入同样内容的 Parquet 数据湖，对比"读取一个城市全部年份的 PM2.5"：
+
+- CSV：下游的做法，读取 `Hisraw` 下全部 CSV（类型推断）后再按城市过滤；
+- 数据湖：`read_parquet(columns=[日期, PM2.5], cities=[城市])`，只打开该城市的分区文件并只解码两列。
+
+校验两者结果一致，并报告耗时与需读取的文件字节数。需要安装 pyarrow。
+
+用法示例：
+    python scripts/bench_parquet_lake.py
+    python scripts/bench_parquet_lake.py --years 20 --city 保定
+"""
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import time
+from glob import glob
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pandas as pd
+from scripts.bench_sqlite_loader import make_history
+from src.data_processing.parquet_lake import save_to_parquet, read_parquet, partition_files
+
+
+def read_csv_city(raw_dir, city):
+    frames = [pd.read_csv(path, encoding="utf-8-sig") for path in sorted(glob(os.path.join(raw_dir, "*.csv")))]
+    df = pd.concat(frames, ignore_index=True)
+    return df.loc[df["城市"] == city, ["日期", "PM2.5"]]
+
+
+def _best(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _size(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parquet 数据湖读取基准测试（全部 CSV vs 分区裁剪）")
+    parser.add_argument("--years", type=int, default=10, help="每个城市的年数")
+    parser.add_argument("--city", default="北京", help="读取的城市")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    df = make_history(args.years)
+    workdir = tempfile.mkdtemp(prefix="bench_lake_")
+    try:
+        raw_dir = os.path.join(workdir, "Hisraw")
+        lake_dir = os.path.join(workdir, "lake")
+        os.makedirs(raw_dir)
+        for (year, city), part in df.groupby(["年份", "城市"]):
+            part.to_csv(os.path.join(raw_dir, f"{year}_{city}_aqi_history.csv"), index=False, encoding="utf-8-sig")
+        save_to_parquet(df, "history_data", lake_dir=lake_dir)
+        csv_files = glob(os.path.join(raw_dir, "*.csv"))
+        lake_files = partition_files("history_data", cities=[args.city], lake_dir=lake_dir)
+        print(f"📄 合成数据：{len(df)} 行，CSV {len(csv_files)} 个文件，重复 {args.repeat} 次取最快")
+
+        csv_time, expected = _best(lambda: read_csv_city(raw_dir, args.city), args.repeat)
+        lake_time, actual = _best(lambda: read_parquet("history_data", columns=["日期", "PM2.5"], cities=[args.city],
+                                                       lake_dir=lake_dir), args.repeat)
+
+        expected = expected.sort_values("日期").reset_index(drop=True)
+        actual = actual.sort_values("日期").reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        print(f"✅ 结果一致：{args.city} {len(actual)} 行")
+        print(f"   ├─ CSV   ：{csv_time:.3f}秒，读取 {len(csv_files)} 个文件 {_size(csv_files) / 1024:,.0f} KB")
+        print(f"   ├─ 数据湖：{lake_time:.3f}秒，读取 {len(lake_files)} 个文件 {_size(lake_files) / 1024:,.0f} KB"
+              f"（仅解码 2 列）")
+        print(f"   └─ 加速比：{csv_time / lake_time:.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""查询结果导出基准测试（峰值内存）
+
+在临时 SQLite 库中用递归 CTE 生成一张实时数据结构的合成表（默认 100 万行），
+分别在独立子进程中导出 `SELECT * FROM bench_realtime LIMIT n`，记录耗时与进程峰值内存（RSS）：
+
+- 一次性：原 REPL 的做法，`query_sqlite` 读出整个 DataFrame 后 `to_csv`；
+- 流式 CSV：`export_query`，按 `QUERY_CHUNK_ROWS` 分块取行并逐块追加写入；
+- 流式 Parquet：`export_query` 写 `.parquet`（需要 pyarrow）。
+
+对每种方式分别导出一半行数与全部行数：流式导出的峰值内存应基本不随行数增长。
+最后校验三种方式导出的内容一致，并校验混合类型列（SQLite 同一列中既有数字又有字符串，
+如 `(1, 2, 'x', None)`）在不同块大小下都能流式导出 Parquet，且内容与 CSV 一致。
+
+用法示例：
+    python scripts/bench_query_export.py
+    python scripts/bench_query_export.py --rows 5000000 --chunksize 20000
+"""
+import sys
+import os
+import argparse
+import json
+import resource
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+MODES = {"eager": "一次性", "csv": "流式 CSV", "parquet": "流式 Parquet"}
+
+CREATE_SQL = """
+CREATE TABLE bench_realtime AS
+WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < :rows - 1)
+SELECT
+    CASE i % 13 WHEN 0 THEN '北京' WHEN 1 THEN '天津' WHEN 2 THEN '石家庄' WHEN 3 THEN '唐山' WHEN 4 THEN '秦皇岛'
+        WHEN 5 THEN '邯郸' WHEN 6 THEN '邢台' WHEN 7 THEN '保定' WHEN 8 THEN '张家口' WHEN 9 THEN '承德'
+        WHEN 10 THEN '沧州' WHEN 11 THEN '廊坊' ELSE '衡水' END AS "城市",
+    date('2000-01-01', '+' || (i / 312) || ' days') AS "日期",
+    printf('%02d', (i / 13) % 24) AS "小时",
+    (i * 7919) % 400 + 10.0 AS "AQI",
+    CASE WHEN i % 53 = 0 THEN NULL ELSE ((i * 104729) % 3000) / 10.0 END AS "PM2.5",
+    CASE (i * 31) % 6 WHEN 0 THEN '优' WHEN 1 THEN '良' WHEN 2 THEN '轻度污染' WHEN 3 THEN '中度污染'
+        WHEN 4 THEN '重度污染' ELSE '严重污染' END AS "空气质量等级",
+    datetime('2000-01-01', '+' || i || ' minutes') AS "采集时间"
+FROM seq
+"""
+
+# 混合类型列：首块为整数、后续块出现字符串 / 浮点数 / 空值
+MIXED_ROWS = [(1, 1, "a"), (2, 2.5, None), ("x", 3, "c"), (None, "y", 4)]
+
+
+def _child(mode, db_path, sql, out_path, chunksize):
+    """子进程：导出一次并输出 {rows, seconds, baseline_mb, peak_mb}。"""
+    from src.data_processing import storage
+    import logging
+    logging.getLogger("db_operations").setLevel(logging.WARNING)
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "eager":
+        df = storage.query_sqlite(sql, db_path=db_path, engine="sqlite")
+        df.to_csv(out_path, index=False, encoding="utf-8-sig")
+        rows = len(df)
+    else:
+        rows = storage.export_query(sql, out_path, chunksize=chunksize, db_path=db_path, engine="sqlite")
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"rows": rows, "seconds": elapsed, "baseline_mb": baseline / 1024, "peak_mb": peak / 1024}))
+
+
+def _run(mode, db_path, sql, out_path, chunksize):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--db", db_path, "--sql", sql,
+         "--out", out_path, "--chunksize", str(chunksize)],
+        capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def check_mixed(db_path, workdir):
+    """混合类型列：各块大小下流式导出的 Parquet 与 CSV 内容一致（按字符串比较）。"""
+    import logging
+    import pandas as pd
+    from src.data_processing import storage
+    from src.data_processing.db_pool import close_pools
+    logging.getLogger("db_operations").setLevel(logging.WARNING)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE bench_mixed ("a", "b", "c")')
+        conn.executemany("INSERT INTO bench_mixed VALUES (?, ?, ?)", MIXED_ROWS)
+    try:
+        for chunksize in (1, 2, 4):
+            csv_path = os.path.join(workdir, f"mixed_{chunksize}.csv")
+            parquet_path = os.path.join(workdir, f"mixed_{chunksize}.parquet")
+            sql = "SELECT * FROM bench_mixed"
+            storage.export_query(sql, csv_path, chunksize=chunksize, db_path=db_path, engine="sqlite")
+            storage.export_query(sql, parquet_path, chunksize=chunksize, db_path=db_path, engine="sqlite")
+            # CSV 中整数在与空值同块时会被 pandas 写成 "2.0"，按数值等价比较
+            expected = pd.read_csv(csv_path, encoding="utf-8-sig", dtype=str).map(_normalize)
+            actual = pd.read_parquet(parquet_path).astype(object).map(_normalize)
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    finally:
+        close_pools()
+    print(f"   └─ ✅ 混合类型列在块大小 1 / 2 / 4 下导出 Parquet 成功，内容与 CSV 一致")
+
+
+def _normalize(value):
+    if value is None or value != value:
+        return None
+    value = str(value)
+    return value[:-2] if value.endswith(".0") else value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询结果导出基准测试（一次性 vs 流式）")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="合成表行数")
+    parser.add_argument("--chunksize", type=int, default=50_000, help="流式导出每块行数")
+    parser.add_argument("--child", choices=list(MODES), help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--sql", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.db, args.sql, args.out, args.chunksize)
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix="bench_export_")
+    try:
+        db_path = os.path.join(workdir, "aqi.db")
+        start = time.perf_counter()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(CREATE_SQL, {"rows": args.rows})
+        print(f"📄 合成表：{args.rows} 行（生成耗时 {time.perf_counter() - start:.1f}秒），每块 {args.chunksize} 行")
+
+        outputs = {}
+        for mode, label in MODES.items():
+            results = []
+            for n in (args.rows // 2, args.rows):
+                ext = "parquet" if mode == "parquet" else "csv"
+                out_path = os.path.join(workdir, f"{mode}_{n}.{ext}")
+                results.append(_run(mode, db_path, f"SELECT * FROM bench_realtime LIMIT {n}", out_path, args.chunksize))
+                outputs[mode] = out_path
+            half, full = results
+            print(f"   ├─ {label}：{full['seconds']:.2f}秒；峰值内存 {half['rows']:,} 行 {half['peak_mb']:.0f} MB → "
+                  f"{full['rows']:,} 行 {full['peak_mb']:.0f} MB（导入后基线 {full['baseline_mb']:.0f} MB）")
+
+        import pandas as pd
+        expected = pd.read_csv(outputs["eager"], encoding="utf-8-sig", dtype={"小时": str})
+        streamed = pd.read_csv(outputs["csv"], encoding="utf-8-sig", dtype={"小时": str})
+        pd.testing.assert_frame_equal(streamed, expected, check_dtype=False)
+        pd.testing.assert_frame_equal(pd.read_parquet(outputs["parquet"]), expected, check_dtype=False)
+        print(f"   ├─ ✅ 三种方式导出内容一致：{len(expected):,} 行")
+        check_mixed(db_path, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""实时接口解码器基准测试
+
+对比 `decode_realtime_payloads`（列式、每轮所有城市一次解码，即采集时的用法）与
+`decode_realtime_records_loop`（逐城市逐条解析）在录制的接口 JSON 上的耗时，
+并逐轮校验两者输出的 DataFrame 完全一致。
+
+录制方法：在 `config/settings.py` 中把 `REALTIME_RECORD_PAYLOADS` 设为 True 后运行一次实时采集，
+原始 JSON 会按 `<采集时间>/<城市>.json` 保存到 `REALTIME_PAYLOAD_DIR`。
+
+用法示例：
+    python scripts/bench_realtime_decoder.py
+    python scripts/bench_realtime_decoder.py --repeat 20 --scale 10
+"""
+import sys
+import os
+import argparse
+import json
+import time
+from datetime import datetime
+from glob import glob
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pandas as pd
+from config.settings import REALTIME_PAYLOAD_DIR
+from src.crawlers.realtime_decoder import decode_realtime_payloads, decode_realtime_records_loop
+
+
+def load_rounds(payload_dir):
+    """返回 [(采集时间 datetime, {城市名: 记录列表}), ...]，每个子目录为一轮采集。"""
+    rounds = {}
+    for path in sorted(glob(os.path.join(payload_dir, "*", "*.json"))):
+        stamp = datetime.strptime(os.path.basename(os.path.dirname(path)), "%Y%m%d_%H%M")
+        with open(path, encoding="utf-8") as f:
+            rounds.setdefault(stamp, {})[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    return sorted(rounds.items())
+
+
+def _decode_loop(payloads, collected_at, now):
+    frames = [decode_realtime_records_loop(records, city_name, collected_at=collected_at, now=now)
+              for city_name, records in payloads.items()]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _decode_columnar(payloads, collected_at, now):
+    return decode_realtime_payloads(payloads, collected_at=collected_at, now=now)
+
+
+def _time_decoder(decoder, rounds, repeat):
+    best = None
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [decoder(payloads, stamp.strftime("%Y-%m-%d %H:%M:%S"), stamp) for stamp, payloads in rounds]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="实时接口解码器基准测试（列式 vs 逐条）")
+    parser.add_argument("--payload-dir", default=REALTIME_PAYLOAD_DIR, help="录制的接口 JSON 目录")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最快一次）")
+    parser.add_argument("--scale", type=int, default=1, help="把每个文件的记录复制 N 倍，模拟更长的返回")
+    args = parser.parse_args()
+
+    rounds = load_rounds(args.payload_dir)
+    if not rounds:
+        print(f"❌ {args.payload_dir} 下没有录制的接口数据，请先开启 REALTIME_RECORD_PAYLOADS 并运行一次实时采集")
+        return 1
+    rounds = [(stamp, {city: records * args.scale for city, records in payloads.items()})
+              for stamp, payloads in rounds]
+    total_records = sum(len(records) for _, payloads in rounds for records in payloads.values())
+    print(f"📄 采集轮数：{len(rounds)}，记录数：{total_records}，重复 {args.repeat} 次取最快")
+
+    loop_time, loop_results = _time_decoder(_decode_loop, rounds, args.repeat)
+    vec_time, vec_results = _time_decoder(_decode_columnar, rounds, args.repeat)
+
+    # 逐轮校验输出一致（列、顺序、取值；数值列均为 float）
+    rows = 0
+    for (stamp, _), expected, actual in zip(rounds, loop_results, vec_results):
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, obj=f"{stamp:%Y%m%d_%H%M}")
+        rows += len(actual)
+    print(f"✅ 输出一致：{rows} 行")
+
+    print(f"   ├─ 逐条解码：{loop_time:.3f}秒（{loop_time / total_records * 1e6:.1f} µs/条）")
+    print(f"   ├─ 列式解码：{vec_time:.3f}秒（{vec_time / total_records * 1e6:.1f} µs/条）")
+    print(f"   └─ 加速比  ：{loop_time / vec_time:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
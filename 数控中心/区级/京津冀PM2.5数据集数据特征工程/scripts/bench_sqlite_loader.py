@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""SQLite 批量写入基准测试
+
+在临时数据库上对比三种把历史数据写入 `history_data` 的方式：
+
+- 逐行：原 `save_to_sqlite` 的做法，每行 `tuple(None if pd.isna(x) else x ...)`、按 500 行分块 `executemany`；
+- 批量：`bulk_load`，按列转换空值、生成器流式写入、使用连接池中调优过的写连接；
+- 暂存：`bulk_load(stage=True)`，先写内存临时表再 `INSERT ... SELECT` 并入目标表。
+
+数据为合成的 13 个城市 × N 年逐日记录（含随机空值），写入后逐表校验三者内容完全一致。
+
+用法示例：
+    python scripts/bench_sqlite_loader.py
+    python scripts/bench_sqlite_loader.py --years 20 --repeat 5
+"""
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import time
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+from src.data_processing.db_pool import close_pools
+from src.data_processing.storage import _get_conn, _prepare_insert, bulk_load
+
+CITIES = ["北京", "天津", "石家庄", "唐山", "秦皇岛", "邯郸", "邢台", "保定", "张家口", "承德", "沧州", "廊坊", "衡水"]
+LEVELS = ["优", "良", "轻度污染", "中度污染", "重度污染", "严重污染"]
+
+
+def make_history(years, seed=0):
+    """生成与历史爬虫输出同结构的 DataFrame（13 城 × years 年逐日，约 2% 空值）。"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2014-01-01", periods=int(365.25 * years), freq="D")
+    n = len(dates) * len(CITIES)
+    df = pd.DataFrame({
+        "日期": np.tile(dates.strftime("%Y-%m-%d"), len(CITIES)),
+        "AQI指数": rng.integers(20, 400, n),
+        "质量等级": rng.choice(LEVELS, n),
+        "当天AQI排名": rng.integers(1, 370, n),
+        "PM2.5": rng.gamma(2.0, 30.0, n).round(1),
+        "PM10": rng.gamma(2.0, 50.0, n).round(1),
+        "No2": rng.gamma(2.0, 20.0, n).round(1),
+        "So2": rng.gamma(2.0, 8.0, n).round(1),
+        "Co": rng.gamma(2.0, 0.5, n).round(2),
+        "O3": rng.gamma(2.0, 40.0, n).round(1),
+        "城市": np.repeat(CITIES, len(dates)),
+    })
+    df["年份"] = df["日期"].str[:4]
+    df["月份"] = df["日期"].str[5:7]
+    for col in ["PM2.5", "PM10", "No2", "So2", "Co", "O3", "质量等级"]:
+        df.loc[rng.random(n) < 0.02, col] = None
+    return df
+
+
+def load_rowwise(df, table_name, db_path, chunksize=500):
+    """原 `save_to_sqlite` 的逐行写入（每次新建连接）。"""
+    conn = _get_conn(db_path)
+    try:
+        insert_sql, df = _prepare_insert(conn, table_name, df)
+        with conn:
+            for start in range(0, len(df), chunksize):
+                chunk = df.iloc[start:start + chunksize]
+                values = [tuple(None if pd.isna(x) else x for x in row) for row in chunk.values.tolist()]
+                conn.executemany(insert_sql, values)
+    finally:
+        conn.close()
+
+
+def load_bulk(df, table_name, db_path):
+    bulk_load(df, table_name, db_path=db_path)
+
+
+def load_staged(df, table_name, db_path):
+    bulk_load(df, table_name, db_path=db_path, stage=True)
+
+
+def _dump(db_path, table_name):
+    conn = _get_conn(db_path)
+    try:
+        return conn.execute(f'SELECT * FROM "{table_name}" ORDER BY "城市", "日期"').fetchall()
+    finally:
+        conn.close()
+
+
+def _time_loader(loader, df, workdir, name, repeat):
+    """每次写入一个新的临时库（含建表），返回 (最快耗时, 库路径)。"""
+    best = None
+    db_path = None
+    for i in range(repeat):
+        db_path = os.path.join(workdir, f"{name}_{i}.db")
+        start = time.perf_counter()
+        loader(df, "history_data", db_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        close_pools()
+    return best, db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 批量写入基准测试（逐行 vs 批量 vs 暂存）")
+    parser.add_argument("--years", type=int, default=10, help="每个城市的年数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    df = make_history(args.years)
+    print(f"📄 合成数据：{len(CITIES)} 个城市 × {args.years} 年，共 {len(df)} 行，重复 {args.repeat} 次取最快")
+
+    workdir = tempfile.mkdtemp(prefix="bench_sqlite_")
+    try:
+        row_time, row_db = _time_loader(load_rowwise, df, workdir, "rowwise", args.repeat)
+        bulk_time, bulk_db = _time_loader(load_bulk, df, workdir, "bulk", args.repeat)
+        stage_time, stage_db = _time_loader(load_staged, df, workdir, "staged", args.repeat)
+
+        expected = _dump(row_db, "history_data")
+        for name, db_path in [("批量", bulk_db), ("暂存", stage_db)]:
+            actual = _dump(db_path, "history_data")
+            if actual != expected:
+                print(f"❌ {name}写入的结果与逐行写入不一致")
+                return 1
+        print(f"✅ 结果一致：{len(expected)} 行")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    n = len(df)
+    print(f"   ├─ 逐行写入：{row_time:.3f}秒（{n / row_time:,.0f} 行/秒）")
+    print(f"   ├─ 批量写入：{bulk_time:.3f}秒（{n / bulk_time:,.0f} 行/秒）")
+    print(f"   ├─ 暂存写入：{stage_time:.3f}秒（{n / stage_time:,.0f} 行/秒）")
+    print(f"   └─ 加速比  ：批量 {row_time / bulk_time:.1f}x，暂存 {row_time / stage_time:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
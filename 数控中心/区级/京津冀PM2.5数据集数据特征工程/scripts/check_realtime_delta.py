@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""实时增量保存回归检查（写入失败时不丢数据）
+
+`REALTIME_DELTA_ONLY` 模式下每轮只保存 `realtime_index` 中没有的小时，因此写库失败的小时
+绝不能记入索引，否则以后每轮都会被过滤掉、永远写不进 `realtime_data`。本脚本在临时目录中
+（临时数据库与 Newraw 目录，不触碰项目数据）依次检查：
+
+1. `bulk_load` 写入 `realtime_data` 失败：`_save_delta` 抛出异常，索引与数据表都没有这些小时；
+2. 写入索引失败：同一事务中已写入的数据行一并回滚；
+3. 恢复正常后的下一轮：这些小时被重新保存，数据表与索引一致；再下一轮没有新增小时。
+
+任一检查不通过时以非零状态退出。
+
+用法示例：
+    python scripts/check_realtime_delta.py
+"""
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="check_realtime_delta_")
+
+# 必须在导入 src 之前改写配置：各模块以 DATABASE_PATH 作为函数默认参数
+import config.settings as settings
+settings.DATABASE_PATH = os.path.join(WORKDIR, "aqi_database.db")
+settings.NEWRAW_DATA_DIR = os.path.join(WORKDIR, "Newraw")
+settings.SAVE_TO_SQLITE = True
+settings.SAVE_TO_PARQUET = False
+
+import pandas as pd
+from src.crawlers import aqi_realtime
+from src.crawlers.realtime_index import RealtimeKeyIndex
+from src.data_processing.db_pool import close_pools
+
+
+def make_round(cities=("北京", "天津", "石家庄"), hours=24):
+    """合成一轮实时记录：每个城市最近 `hours` 小时。"""
+    rows = []
+    for city in cities:
+        for hour in range(hours):
+            rows.append({"城市": city, "日期": "2025-03-01", "小时": f"{hour:02d}", "AQI": 50.0 + hour,
+                         "空气质量等级": "良", "PM2.5": 30.0 + hour, "采集时间": "2025-03-02 00:05:00"})
+    return pd.DataFrame(rows)
+
+
+def counts():
+    with sqlite3.connect(settings.DATABASE_PATH) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        data = conn.execute('SELECT COUNT(*) FROM "realtime_data"').fetchone()[0] if "realtime_data" in tables else 0
+        index = conn.execute('SELECT COUNT(*) FROM "realtime_index"').fetchone()[0]
+    return data, index
+
+
+def check(condition, message):
+    print(f"   ├─ {'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def main():
+    crawler = aqi_realtime.AQIRealtimeCrawler.__new__(aqi_realtime.AQIRealtimeCrawler)
+    crawler.key_index = RealtimeKeyIndex(db_path=settings.DATABASE_PATH, csv_dir=settings.NEWRAW_DATA_DIR)
+    combined = make_round()
+    ok = True
+    print(f"📄 合成一轮实时数据：{len(combined)} 条（临时目录 {WORKDIR}）")
+
+    # 1. 写入 realtime_data 失败
+    original_bulk_load = aqi_realtime.bulk_load
+
+    def failing_bulk_load(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    aqi_realtime.bulk_load = failing_bulk_load
+    try:
+        crawler._save_delta(combined, datetime(2025, 3, 2, 0, 5))
+        ok &= check(False, "写库失败时 _save_delta 应抛出异常")
+    except sqlite3.OperationalError:
+        ok &= check(True, "写库失败时 _save_delta 抛出异常")
+    finally:
+        aqi_realtime.bulk_load = original_bulk_load
+    ok &= check(counts() == (0, 0), f"写库失败后数据表 / 索引行数为 (0, 0)：{counts()}")
+    ok &= check(len(crawler.key_index.filter_new(combined)) == len(combined), "失败的小时仍视为新增")
+
+    # 2. 写入索引失败：数据行随事务回滚
+    original_add = crawler.key_index.add
+
+    def failing_add(df, conn=None):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    crawler.key_index.add = failing_add
+    try:
+        crawler._save_delta(combined, datetime(2025, 3, 2, 0, 6))
+        ok &= check(False, "写索引失败时 _save_delta 应抛出异常")
+    except sqlite3.OperationalError:
+        ok &= check(True, "写索引失败时 _save_delta 抛出异常")
+    finally:
+        crawler.key_index.add = original_add
+    ok &= check(counts() == (0, 0), f"写索引失败后数据行已回滚：{counts()}")
+
+    # 3. 恢复后的下一轮补写，再下一轮没有新增
+    path = crawler._save_delta(combined, datetime(2025, 3, 2, 1, 5))
+    ok &= check(path is not None and counts() == (len(combined), len(combined)),
+                f"恢复后重新保存全部 {len(combined)} 条：{counts()}")
+    ok &= check(crawler._save_delta(combined, datetime(2025, 3, 2, 2, 5)) is None, "再下一轮没有新增小时")
+    print(f"   └─ {'✅ 全部检查通过' if ok else '❌ 存在未通过的检查'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        close_pools()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+"""离线爬取模拟站点与吞吐基准测试
+
+在本机启动一个替身 HTTP 服务，回放已录制的数据，使爬虫可以在无网络的环境下调优并发与重试策略：
+
+- 历史页面：`GET /aqi/<城市拼音>-<YYYYMM>.html`，来自页面归档 `data/archive`（或 `--pages-dir`）；
+- 实时接口：`POST <任意路径>?citycode=<编码>`，来自录制的接口 JSON `REALTIME_PAYLOAD_DIR`
+  （开启 `REALTIME_RECORD_PAYLOADS` 后运行一次实时采集即可录制）；
+- 故障注入：固定延迟 + 随机抖动、5xx 错误率、429（带 Retry-After）比例、连接重置比例；
+- `GET /__stats`：返回服务端统计（请求数、各状态码、注入的故障数）。
+
+爬虫的请求间隔由按域名的自适应限速器（`src/utils/rate_limiter.py`）控制：本机地址默认没有礼貌上限，
+可用 `--min-interval` / `--max-inflight` 模拟线上配置，失败时的退避与 Retry-After 处理与线上一致。
+未录制的城市月份默认用已录制页面替代（`--no-fallback` 时返回 404）。
+
+用法示例：
+    # 常驻模拟站点，供手动调试
+    python scripts/crawl_simulator.py serve --port 8765 --latency 0.2 --error-rate 0.05
+
+    # 历史爬虫：对比 1/2/4/8 个工作线程的吞吐
+    python scripts/crawl_simulator.py bench --engine history --workers 1,2,4,8 --latency 0.1
+
+    # 实时爬虫：注入 429 与连接重置，观察重试次数与尾延迟
+    python scripts/crawl_simulator.py bench --engine realtime --workers 4 --rounds 5 --rate-429 0.1 --reset-rate 0.05
+"""
+import sys
+import os
+import argparse
+import json
+import math
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from zlib import crc32
+
+# 确保项目根目录在 Python 路径中，以便正确导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config.settings import HISTORY_ARCHIVE_DIR, REALTIME_PAYLOAD_DIR
+from config.settings import HOST_MAX_INFLIGHT, HOST_MIN_INTERVAL, REALTIME_HOST_MAX_INFLIGHT, REALTIME_HOST_MIN_INTERVAL
+
+REALTIME_PATH = "/HourChangesPublish/GetCityRealTimeAqiHistoryByCondition"
+_PAGE_RE = re.compile(r"^/aqi/([a-z]+)-(\d{6})\.html$")
+
+
+class ReplayStore:
+    """已录制的历史页面与实时接口数据（只读，供模拟站点回放）。"""
+
+    def __init__(self, archive_dir=HISTORY_ARCHIVE_DIR, pages_dir=None, payload_dir=REALTIME_PAYLOAD_DIR):
+        self.pages = {}     # (城市拼音, 月份) -> html
+        self.payloads = {}  # 城市名 -> 记录列表（取最近一轮录制）
+        self._load_pages(archive_dir, pages_dir)
+        self._load_payloads(payload_dir)
+        self._page_keys = sorted(self.pages)
+        self._payload_keys = sorted(self.payloads)
+        self.city_by_code = {}
+        try:
+            from src.utils.city_mapper import get_city_code_map
+            self.city_by_code = {str(code): name for name, code in get_city_code_map().items()}
+        except (OSError, ValueError):
+            pass  # 没有城市编码表时按编码散列选取录制数据
+
+    def _load_pages(self, archive_dir, pages_dir):
+        if pages_dir:
+            for path in sorted(glob(os.path.join(pages_dir, "*.html"))):
+                match = re.match(r"([a-z]+)-(\d{6})\.html$", os.path.basename(path))
+                if match:
+                    with open(path, encoding="utf-8") as f:
+                        self.pages[match.groups()] = f.read()
+            return
+        if not os.path.isdir(archive_dir):
+            return
+        from src.crawlers.page_archive import PageArchive, read_page
+        archive = PageArchive(archive_dir)
+        try:
+            entries = archive.entries()
+        finally:
+            archive.close()
+        for city_pinyin, _, month, pack_path, offset, length in entries:
+            self.pages[(city_pinyin, month)] = read_page(pack_path, offset, length)
+
+    def _load_payloads(self, payload_dir):
+        # 子目录名为采集时间（YYYYmmdd_HHMM），排序后较新的一轮覆盖较旧的
+        for path in sorted(glob(os.path.join(payload_dir, "*", "*.json"))):
+            with open(path, encoding="utf-8") as f:
+                self.payloads[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+
+    @staticmethod
+    def _pick(keys, name):
+        return keys[crc32(name.encode("utf-8")) % len(keys)]
+
+    def page(self, city_pinyin, month, fallback=True):
+        """返回页面 HTML；未录制时按需用其他页面替代（同一 URL 总是得到同一页面）。"""
+        html = self.pages.get((city_pinyin, month))
+        if html is None and fallback and self._page_keys:
+            html = self.pages[self._pick(self._page_keys, f"{city_pinyin}-{month}")]
+        return html
+
+    def payload(self, citycode, fallback=True):
+        """返回城市编码对应的实时接口记录列表；未录制时按需用其他城市替代。"""
+        records = self.payloads.get(self.city_by_code.get(str(citycode)))
+        if records is None and fallback and self._payload_keys:
+            records = self.payloads[self._pick(self._payload_keys, str(citycode))]
+        return records
+
+
+class FaultProfile:
+    """故障注入参数。各比例按请求独立抽样，优先级：连接重置 > 429 > 5xx。"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_429=0.0, retry_after=1,
+                 reset_rate=0.0, seed=None):
+        self.latency = max(0.0, float(latency))
+        self.jitter = max(0.0, float(jitter))
+        self.error_rate = float(error_rate)
+        self.rate_429 = float(rate_429)
+        self.retry_after = int(retry_after)
+        self.reset_rate = float(reset_rate)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """返回 (延迟秒数, 故障类型)，故障类型为 None / "reset" / "429" / "5xx"。"""
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        if roll < self.reset_rate:
+            return delay, "reset"
+        if roll < self.reset_rate + self.rate_429:
+            return delay, "429"
+        if roll < self.reset_rate + self.rate_429 + self.error_rate:
+            return delay, "5xx"
+        return delay, None
+
+
+class CrawlSimulator:
+    """在后台线程运行的模拟站点（`ThreadingHTTPServer`）。"""
+
+    def __init__(self, store, faults=None, host="127.0.0.1", port=0, fallback=True):
+        self.store = store
+        self.faults = faults or FaultProfile()
+        self.fallback = fallback
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        # 注入的连接重置会让服务端写入失败，属于预期行为，不打印异常栈
+        self.server.handle_error = lambda request, client_address: None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {"requests": 0, "status": {}, "faults": {"reset": 0, "429": 0, "5xx": 0}}
+
+    def stats(self):
+        with self._stats_lock:
+            return json.loads(json.dumps(self._stats))
+
+    def _count(self, status=None, fault=None):
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            if fault:
+                self._stats["faults"][fault] += 1
+            if status is not None:
+                self._stats["status"][str(status)] = self._stats["status"].get(str(status), 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="crawl-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持 keep-alive，与真实站点的连接复用行为一致
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="text/plain; charset=utf-8", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _reset(self):
+                # SO_LINGER=0 后关闭：客户端收到 RST（ConnectionResetError）
+                self.close_connection = True
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                self.connection.close()
+
+            def _serve(self, body_fn, content_type):
+                delay, fault = simulator.faults.draw()
+                if delay:
+                    time.sleep(delay)
+                if fault == "reset":
+                    simulator._count(fault=fault)
+                    return self._reset()
+                if fault == "429":
+                    simulator._count(429, fault)
+                    return self._send(429, b"Too Many Requests", headers={"Retry-After": str(simulator.faults.retry_after)})
+                if fault == "5xx":
+                    simulator._count(503, fault)
+                    return self._send(503, b"Service Unavailable")
+                body = body_fn()
+                if body is None:
+                    simulator._count(404)
+                    return self._send(404, b"Not Found")
+                simulator._count(200)
+                self._send(200, body, content_type)
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path == "/__stats":
+                    return self._send(200, json.dumps(simulator.stats()).encode("utf-8"), "application/json")
+                match = _PAGE_RE.match(path)
+                if not match:
+                    simulator._count(404)
+                    return self._send(404, b"Not Found")
+
+                def page():
+                    html = simulator.store.page(*match.groups(), fallback=simulator.fallback)
+                    return html.encode("utf-8") if html is not None else None
+                self._serve(page, "text/html; charset=utf-8")
+
+            def do_POST(self):
+                # 读掉请求体，保持连接可复用
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                query = parse_qs(urlsplit(self.path).query)
+                citycode = (query.get("citycode") or [""])[0]
+
+                def payload():
+                    records = simulator.store.payload(citycode, fallback=simulator.fallback)
+                    return json.dumps(records, ensure_ascii=False).encode("utf-8") if records is not None else None
+                self._serve(payload, "application/json; charset=utf-8")
+
+        return Handler
+
+
+def _percentile(values, q):
+    """最近秩百分位（values 已排序）。"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _run_units(fn, units, workers):
+    """执行所有采集单元，返回 (总耗时, [(单元耗时, 是否成功), ...])。"""
+    def timed(unit):
+        start = time.perf_counter()
+        result = fn(*unit)
+        return time.perf_counter() - start, result is not None and len(result) > 0
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bench") as executor:
+            samples = list(executor.map(timed, units))
+    else:
+        samples = [timed(unit) for unit in units]
+    return time.perf_counter() - start, samples
+
+
+def bench_history(simulator, workers, limit=None):
+    """用 `AQIHistoryCrawler` 的单元采集逻辑爬取模拟站点上的全部已录制页面（不落盘）。"""
+    from src.crawlers.aqi_history import AQIHistoryCrawler
+
+    crawler = AQIHistoryCrawler(use_cache=False, archive=False)
+    crawler.base_url = f"{simulator.url}/aqi"
+    names = {city["pinyin"]: city["name"] for city_list in crawler.cities.values() for city in city_list}
+    units = [(pinyin, names.get(pinyin, pinyin), month) for pinyin, month in sorted(simulator.store.pages)]
+    units = units[:limit] if limit else units
+    fn = crawler._crawl_unit if workers > 1 else crawler.crawl_city_month_data
+    return _run_units(fn, units, workers)
+
+
+def bench_realtime(simulator, workers, rounds=1):
+    """用 `AQIRealtimeCrawler` 的接口请求逻辑对全部城市采集 `rounds` 轮（不解码、不落盘）。"""
+    from src.crawlers.aqi_realtime import AQIRealtimeCrawler
+
+    crawler = AQIRealtimeCrawler()
+    crawler.base_api = simulator.url + REALTIME_PATH
+    units = [(city,) for _ in range(rounds) for city in crawler.city_codes]
+    if workers > 1:
+        fn = lambda city: crawler.fetch_city_payload(city, session=crawler._thread_session())
+    else:
+        fn = crawler.fetch_city_payload
+    return _run_units(fn, units, workers)
+
+
+def run_benchmark(simulator, engine, workers, max_inflight, min_interval, rounds=1, limit=None):
+    """运行一次基准测试并返回汇总指标字典。
+
+    模拟站点的限速参数（最大在途数、礼貌上限）写入共享的自适应限速器，每组测试前重置其状态。
+    """
+    from src.utils.rate_limiter import get_host_throttle, host_of
+    from src.utils.pool_manager import pool_stats
+
+    def connections_created():
+        return sum(s["created"] for s in pool_stats().values())
+
+    throttle = get_host_throttle()
+    throttle.configure(simulator.url, max_inflight, min_interval)
+    throttle.reset(simulator.url)
+    simulator.reset_stats()
+    created_before = connections_created()
+    if engine == "history":
+        elapsed, samples = bench_history(simulator, workers, limit)
+    else:
+        elapsed, samples = bench_realtime(simulator, workers, rounds)
+    stats = simulator.stats()
+    pacing = throttle.snapshot().get(host_of(simulator.url), {})
+    latencies = sorted(duration for duration, _ in samples)
+    ok = sum(1 for _, success in samples if success)
+    return {
+        "engine": engine,
+        "workers": workers,
+        "pages": len(samples),
+        "ok": ok,
+        "failed": len(samples) - ok,
+        "elapsed": elapsed,
+        "pages_per_sec": ok / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "requests": stats["requests"],
+        # 服务端收到的请求数减去页面数 = 重试次数（含 urllib3 自动重试与爬虫自身的重试）
+        "retries": max(0, stats["requests"] - len(samples)),
+        "faults": stats["faults"],
+        # 自适应限速器的退避次数与测试结束时的请求间隔
+        "backoffs": pacing.get("failures", 0),
+        "final_interval": pacing.get("interval", min_interval),
+        # 本组测试新建的 TCP 连接数（共享连接池复用时远小于请求数）
+        "connections": connections_created() - created_before,
+    }
+
+
+def _print_report(results):
+    print(f"\n{'引擎':<10}{'线程':>6}{'页面':>7}{'成功':>7}{'耗时(秒)':>10}{'页/秒':>9}{'p50(ms)':>10}{'p99(ms)':>10}"
+          f"{'重试':>7}{'退避':>7}{'末间隔(秒)':>11}{'新建连接':>9}  注入故障")
+    for r in results:
+        faults = ", ".join(f"{k}={v}" for k, v in r["faults"].items() if v) or "-"
+        print(
+            f"{r['engine']:<10}{r['workers']:>6}{r['pages']:>7}{r['ok']:>7}{r['elapsed']:>10.2f}"
+            f"{r['pages_per_sec']:>9.2f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['retries']:>7}"
+            f"{r['backoffs']:>7}{r['final_interval']:>11.2f}{r['connections']:>9}  {faults}"
+        )
+
+
+def _add_fault_args(parser):
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="在固定延迟上叠加的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的比例")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="直接重置连接的比例")
+    parser.add_argument("--seed", type=int, default=None, help="故障抽样随机种子（便于复现）")
+    parser.add_argument("--archive-dir", default=HISTORY_ARCHIVE_DIR, help="历史页面归档目录")
+    parser.add_argument("--pages-dir", default=None, help="改为读取目录下的 <拼音>-<YYYYMM>.html 文件")
+    parser.add_argument("--payload-dir", default=REALTIME_PAYLOAD_DIR, help="录制的实时接口 JSON 目录")
+    parser.add_argument("--no-fallback", action="store_true", help="未录制的页面/城市返回 404，而不是用已录制数据替代")
+
+
+def _build_simulator(args, port=0):
+    store = ReplayStore(args.archive_dir, args.pages_dir, args.payload_dir)
+    faults = FaultProfile(args.latency, args.jitter, args.error_rate, args.rate_429, args.retry_after,
+                          args.reset_rate, args.seed)
+    return CrawlSimulator(store, faults, port=port, fallback=not args.no_fallback)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线爬取模拟站点与吞吐基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="启动常驻模拟站点")
+    serve.add_argument("--port", type=int, default=8765, help="监听端口")
+    _add_fault_args(serve)
+
+    bench = sub.add_parser("bench", help="启动模拟站点并对爬虫运行基准测试")
+    bench.add_argument("--engine", choices=["history", "realtime"], default="history", help="被测爬虫")
+    bench.add_argument("--workers", default="1,4", help="工作线程数，逗号分隔可依次对比多组")
+    bench.add_argument("--max-inflight", type=int, default=None, help="单域名最大在途请求数（默认取配置）")
+    bench.add_argument("--min-interval", type=float, default=0.0, help="单域名请求最小间隔（秒，礼貌上限），默认不限速")
+    bench.add_argument("--rounds", type=int, default=1, help="实时爬虫采集轮数")
+    bench.add_argument("--limit", type=int, default=None, help="历史爬虫最多爬取的页面数")
+    bench.add_argument("--json", default=None, help="把结果另存为 JSON 文件")
+    bench.add_argument("--verbose", action="store_true", help="保留爬虫的 INFO 日志")
+    _add_fault_args(bench)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        simulator = _build_simulator(args, port=args.port)
+        print(f"🧪 模拟站点已启动：{simulator.url}（历史页面 {len(simulator.store.pages)} 个，"
+              f"实时城市 {len(simulator.store.payloads)} 个），按 Ctrl+C 停止")
+        print(f"   ├─ 历史页面：{simulator.url}/aqi/<拼音>-<YYYYMM>.html")
+        print(f"   ├─ 实时接口：{simulator.url}{REALTIME_PATH}")
+        print(f"   └─ 服务统计：{simulator.url}/__stats")
+        try:
+            simulator.server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n🛑 模拟站点已停止")
+        finally:
+            simulator.server.server_close()
+        return 0
+
+    simulator = _build_simulator(args).start()
+    store = simulator.store
+    if args.engine == "history" and not store.pages:
+        print("❌ 没有可回放的历史页面，请先爬取历史数据（写入归档）或指定 --pages-dir")
+        return 1
+    if args.engine == "realtime" and not store.payloads:
+        print(f"❌ {args.payload_dir} 下没有录制的接口数据，请先开启 REALTIME_RECORD_PAYLOADS 并运行一次实时采集")
+        return 1
+    default_inflight = HOST_MAX_INFLIGHT if args.engine == "history" else REALTIME_HOST_MAX_INFLIGHT
+    max_inflight = args.max_inflight or default_inflight
+    print(f"🧪 模拟站点：{simulator.url}，延迟 {args.latency:.2f}+{args.jitter:.2f}秒，"
+          f"503 {args.error_rate:.0%} / 429 {args.rate_429:.0%} / 重置 {args.reset_rate:.0%}")
+    print(f"🚦 单域名最多 {max_inflight} 个在途请求，请求间隔 ≥ {args.min_interval:.2f}秒"
+          f"（线上配置：历史 {HOST_MIN_INTERVAL:.1f}秒，实时 {REALTIME_HOST_MIN_INTERVAL:.1f}秒）")
+
+    results = []
+    try:
+        for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+            if not args.verbose:
+                logging.disable(logging.ERROR)  # 故障注入产生的重试日志不逐条输出
+            try:
+                result = run_benchmark(simulator, args.engine, workers, max_inflight, args.min_interval,
+                                       rounds=args.rounds, limit=args.limit)
+            finally:
+                logging.disable(logging.NOTSET)
+            results.append(result)
+            print(f"✅ {workers} 个线程：{result['ok']}/{result['pages']} 页，{result['pages_per_sec']:.2f} 页/秒")
+    finally:
+        simulator.stop()
+
+    _print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已保存：{args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
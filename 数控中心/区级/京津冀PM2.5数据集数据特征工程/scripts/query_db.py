@@ -5,8 +5,10 @@
 - list                列出数据库中所有表
 - info <table>        显示表结构（PRAGMA table_info）
 - sql <SQL>           执行 SQL 并返回全部结果（谨慎使用）
-- show <SQL>          执行 SQL 并以分页方式显示结果
-- export <SQL> <file> 执行 SQL 并导出结果到 CSV（若无文件则提示）
+- show <SQL>          以分页方式显示结果（只读取当前页，后台预取下一页；单表查询按 rowid 翻页）
+- export <SQL> <file> 执行 SQL 并逐块导出结果到 CSV（.parquet 后缀导出为 Parquet，内存占用与结果行数无关）
+- explain <SQL>       显示查询计划（EXPLAIN QUERY PLAN），检查是否命中索引
+- engine <name>       切换查询引擎：sqlite（默认）或 duckdb（列式聚合；另可查询 lake.<表> 与 csv.hisraw 等视图）
 - next                在分页显示中显示下一页
 - prev                在分页显示中显示上一页
 - page <n>            跳到第 n 页
@@ -29,6 +31,8 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.data_processing import storage
+from src.data_processing.pager import QueryPager
+from config.settings import QUERY_ENGINE
 import logging
 
 # 使用 storage 中配置的 db_operations 日志
@@ -36,13 +40,24 @@ logger = logging.getLogger("db_operations")
 
 
 class REPL:
-    def __init__(self, page_size=20):
+    def __init__(self, page_size=20, engine=QUERY_ENGINE):
+        self.engine = engine
         self.page_size = page_size
-        self.current_df = None
-        self.current_sql = None
+        self.pager = None
         self.page = 0
 
     def list_tables(self):
+        if self.engine == 'duckdb':
+            try:
+                from src.data_processing.duckdb_engine import get_engine
+                sources = get_engine().sources()
+            except Exception as e:
+                print('列出 DuckDB 视图失败：', e)
+                return
+            print('可查询的表（DuckDB）：')
+            for schema, name in sources:
+                print(' -', name if schema == 'main' else f'{schema}.{name}')
+            return
         tables = storage.list_tables()
         if not tables:
             print('数据库中未发现表。')
@@ -62,106 +77,154 @@ class REPL:
             print('获取表结构失败：', e)
             logger.exception(f'获取表结构失败：{table} -> {e}')
 
-    def run_sql(self, sql, store=False):
+    def run_sql(self, sql):
         try:
-            df = storage.query_sqlite(sql)
+            df = storage.query_sqlite(sql, engine=self.engine)
         except Exception as e:
             print('查询失败：', e)
             logger.exception(f'查询失败：{sql} -> {e}')
             return None
         if df is None or df.empty:
             print('查询未返回数据')
-            return df
-        if store:
-            self.current_df = df
-            self.current_sql = sql
-            self.page = 0
         return df
 
+    def _open_pager(self, sql):
+        # 只建立分页器，不执行整条查询；之前的分页器（及其后台预取）随之关闭
+        if self.pager is not None:
+            self.pager.close()
+        self.pager = None
+        try:
+            self.pager = QueryPager(sql, page_size=self.page_size, engine=self.engine)
+        except Exception as e:
+            print('查询失败：', e)
+            logger.exception(f'查询失败：{sql} -> {e}')
+        self.page = 0
+        return self.pager
+
     def show(self, sql=None):
-        if sql:
-            df = self.run_sql(sql, store=True)
-        else:
-            df = self.current_df
-        if df is None or df.empty:
+        if sql and self._open_pager(sql) is not None and not self._print_page(0):
+            # 查询出错或无结果时不保留分页器
+            self.pager.close()
+            self.pager = None
             print('无可显示结果')
             return
-        self._print_page()
+        if not sql and (self.pager is None or not self._print_page(self.page)):
+            print('无可显示结果')
 
     def export(self, sql, path):
-        df = self.run_sql(sql, store=False)
-        if df is None or df.empty:
-            print('无数据可导出')
-            return
+        # 逐块写入（.parquet 后缀导出为 Parquet），不把整个结果读入内存
         try:
-            dirp = os.path.dirname(path) or '.'
-            if dirp and not os.path.exists(dirp):
-                os.makedirs(dirp, exist_ok=True)
-            df.to_csv(path, index=False, encoding='utf-8-sig')
-            print('已导出到：', path)
-            logger.info(f'已导出查询结果到 CSV：{path}')
+            rows = storage.export_query(sql, path, engine=self.engine)
+            if not rows:
+                print('无数据可导出')
+                return
+            print(f'已导出 {rows} 行到：', path)
         except Exception as e:
             print('导出失败：', e)
             logger.exception(f'导出失败：{e}')
 
+    def set_engine(self, name):
+        name = name.lower()
+        if name not in ('sqlite', 'duckdb'):
+            print('未知引擎，可选：sqlite / duckdb')
+            return
+        if name == 'duckdb':
+            try:
+                from src.data_processing.duckdb_engine import get_engine
+                get_engine()
+            except Exception as e:
+                print('无法启用 DuckDB：', e)
+                return
+        self.engine = name
+        print('查询引擎已切换为', name)
+
+    def explain(self, sql):
+        if self.engine == 'duckdb':
+            try:
+                plan = storage.query_sqlite(f'EXPLAIN {sql}', engine='duckdb')
+            except Exception as e:
+                print('获取查询计划失败：', e)
+                return
+            for value in plan.iloc[:, -1]:
+                print(value)
+            return
+        try:
+            plan = storage.explain_query(sql)
+        except Exception as e:
+            print('获取查询计划失败：', e)
+            logger.exception(f'获取查询计划失败：{sql} -> {e}')
+            return
+        # 按 parent 缩进显示计划树；SCAN 为全表扫描，SEARCH ... USING INDEX 为索引查找
+        depth = {0: -1}
+        for row in plan.itertuples(index=False):
+            depth[row.id] = depth.get(row.parent, -1) + 1
+            print('  ' * depth[row.id] + '└─ ' + row.detail)
+
     def set_size(self, n):
         try:
             n = int(n)
             if n <= 0:
                 raise ValueError()
             self.page_size = n
+            if self.pager is not None:
+                self._open_pager(self.pager.sql)
             self.page = 0
             print('分页大小已设置为', n)
         except Exception:
             print('分页大小无效')
 
     def next_page(self):
-        if self.current_df is None:
+        if self.pager is None:
             print('当前未加载数据')
             return
-        max_page = (len(self.current_df) - 1) // self.page_size
-        if self.page < max_page:
-            self.page += 1
-            self._print_page()
-        else:
+        if not self._print_page(self.page + 1):
             print('已经是最后一页')
 
     def prev_page(self):
-        if self.current_df is None:
+        if self.pager is None:
             print('当前未加载数据')
             return
         if self.page > 0:
-            self.page -= 1
-            self._print_page()
+            self._print_page(self.page - 1)
         else:
             print('已经是第一页')
 
     def goto_page(self, n):
+        if self.pager is None:
+            print('当前未加载数据')
+            return
         try:
             n = int(n)
             if n < 1:
                 raise ValueError()
-            idx = n - 1
-            max_page = (len(self.current_df) - 1) // self.page_size
-            if idx > max_page:
-                print('页码超出范围')
-                return
-            self.page = idx
-            self._print_page()
         except Exception:
             print('页码无效')
+            return
+        if not self._print_page(n - 1):
+            print('页码超出范围')
 
-    def _print_page(self):
-        df = self.current_df
-        start = self.page * self.page_size
-        end = start + self.page_size
-        sub = df.iloc[start:end]
-        print(f'-- 第 {self.page+1} 页 （行 {start+1}-{min(end,len(df))} / 共 {len(df)} 行） --')
+    def _print_page(self, page):
+        """读取并显示第 page 页（从 0 开始）；该页没有数据时返回 False。"""
+        try:
+            sub = self.pager.page(page)
+        except Exception as e:
+            print('查询失败：', e)
+            logger.exception(f'查询失败：{self.pager.sql} -> {e}')
+            return False
+        if sub.empty:
+            return False
+        self.page = page
+        start = page * self.page_size
+        # 总行数：后台计数完成前显示估计值或 "?"
+        total, exact = self.pager.total()
+        total = '共 ?' if total is None else (f'共 {total}' if exact else f'共约 {total}')
+        print(f'-- 第 {page+1} 页 （行 {start+1}-{start+len(sub)} / {total} 行） --')
         print(sub.to_string(index=False))
+        return True
 
 
-def repl_loop(initial_list=False):
-    r = REPL()
+def repl_loop(initial_list=False, engine=QUERY_ENGINE):
+    r = REPL(engine=engine)
     if initial_list:
         r.list_tables()
 
@@ -190,7 +253,7 @@ def repl_loop(initial_list=False):
             r.info(args[0]); continue
         if cmd == 'sql' and args:
             sql = line[len('sql'):].strip()
-            r.run_sql(sql, store=False); continue
+            r.run_sql(sql); continue
         if cmd == 'show':
             sql = line[len('show'):].strip()
             if sql:
@@ -207,6 +270,10 @@ def repl_loop(initial_list=False):
                 sql = sql[: -len(path)].strip()
             r.export(sql, path)
             continue
+        if cmd == 'engine' and args:
+            r.set_engine(args[0]); continue
+        if cmd == 'explain' and args:
+            r.explain(line[len('explain'):].strip()); continue
         if cmd == 'next':
             r.next_page(); continue
         if cmd == 'prev':
@@ -223,40 +290,40 @@ def main():
     parser.add_argument('--list', action='store_true', help='列出所有表并退出')
     parser.add_argument('--info', metavar='TABLE', help='显示表结构并退出')
     parser.add_argument('--sql', metavar='SQL', help='执行 SQL 并打印结果后退出')
-    parser.add_argument('--export', nargs=2, metavar=('SQL', 'PATH'), help='执行 SQL 并导出为 CSV，然后退出')
+    parser.add_argument('--export', nargs=2, metavar=('SQL', 'PATH'), help='执行 SQL 并逐块导出为 CSV（.parquet 后缀为 Parquet），然后退出')
+    parser.add_argument('--explain', metavar='SQL', help='显示 SQL 的查询计划并退出')
+    parser.add_argument('--engine', choices=['sqlite', 'duckdb'], default=QUERY_ENGINE, help='查询引擎（duckdb 需安装 duckdb）')
     args = parser.parse_args()
 
     if args.list:
-        tables = storage.list_tables()
-        if not tables:
-            print('数据库中未发现表。')
-            return
-        print('数据库表：')
-        for t in tables:
-            print(' -', t)
+        REPL(engine=args.engine).list_tables()
         return
 
     if args.info:
-        repl = REPL()
+        repl = REPL(engine=args.engine)
         repl.info(args.info)
         return
 
     if args.sql:
         # run SQL and print full result
-        repl = REPL()
-        df = repl.run_sql(args.sql, store=False)
+        repl = REPL(engine=args.engine)
+        df = repl.run_sql(args.sql)
         if df is not None and not df.empty:
             print(df.to_string(index=False))
         return
 
+    if args.explain:
+        REPL(engine=args.engine).explain(args.explain)
+        return
+
     if args.export:
         sql, path = args.export
-        repl = REPL()
+        repl = REPL(engine=args.engine)
         repl.export(sql, path)
         return
 
     # no top-level args -> enter REPL
-    repl_loop(initial_list=True)
+    repl_loop(initial_list=True, engine=args.engine)
 
 
 if __name__ == '__main__':
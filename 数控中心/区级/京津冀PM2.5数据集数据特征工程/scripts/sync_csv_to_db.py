@@ -4,17 +4,22 @@
 功能说明：
 - 把 `data/Newraw/` 目录下的实时数据 CSV 同步到 `realtime_data` 表
 - 把 `data/Hisraw/` 目录下的历史数据 CSV 同步到 `history_data` 表
-- 支持去重操作，避免重复数据插入
-- 提供 dry-run 模式，用于预览同步效果
+- 支持去重操作，避免重复数据插入：每个文件先写入临时表，再在 SQLite 内并入目标表
+  （`realtime_data` / `history_data` 按主键 UPSERT，只写入新增或取值变化的行；其他表按去重键反连接追加）
+- 同步清单（`sync_manifest` 表）记录每个已同步文件的大小、修改时间与内容哈希，未变化的文件直接跳过
+- 提供 dry-run 模式，用于预览同步效果；`--force` 忽略清单重新同步全部文件
 
 用法示例：
     python scripts/sync_csv_to_db.py --target both
     python scripts/sync_csv_to_db.py --target realtime --dry-run
     python scripts/sync_csv_to_db.py --target history
+    python scripts/sync_csv_to_db.py --target history --force
 """
 import sys
 import os
 import argparse
+import hashlib
+import io
 from glob import glob
 
 # 确保项目根目录在 Python 路径中，以便正确导入模块
@@ -23,8 +28,10 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 import pandas as pd
-from config.settings import RAW_DATA_DIR, NEWRAW_DATA_DIR
-from src.data_processing.storage import save_to_sqlite, query_sqlite, save_raw_data
+from config.settings import RAW_DATA_DIR, NEWRAW_DATA_DIR, DATABASE_PATH
+from src.data_processing.db_pool import writer
+from src.data_processing.storage import merge_staged
+from src.data_processing.sync_manifest import SyncManifest
 import logging
 
 # 使用 storage 模块已配置的日志文件，确保日志记录一致
@@ -36,7 +43,7 @@ def _read_csv(path):
     """读取 CSV 文件，自动处理编码问题
     
     参数:
-        path: CSV 文件路径
+        path: CSV 文件路径或已读入的文件对象
     
     返回:
         pandas.DataFrame: 读取的数据框
@@ -46,116 +53,66 @@ def _read_csv(path):
         return pd.read_csv(path, encoding='utf-8-sig')
     except Exception:
         # 失败时尝试普通 UTF-8 编码，忽略错误
-        return pd.read_csv(path, encoding='utf-8', errors='ignore')
+        if hasattr(path, 'seek'):
+            path.seek(0)
+        return pd.read_csv(path, encoding='utf-8', encoding_errors='ignore')
 
 
 
-def _build_key(df, cols):
-    """构建用于去重的键值
-    
-    参数:
-        df: pandas.DataFrame，包含数据的 DataFrame
-        cols: list，用于构建键的列名列表
-    
-    返回:
-        pandas.Series: 包含键值的 Series
-    """
-    # 将指定列的值用 | 连接，生成唯一键字符串
-    return df[cols].fillna('').astype(str).agg('|'.join, axis=1)
+def sync_folder_to_table(folder, table_name, prefer_keys=None, dry_run=False, force=False, db_path=DATABASE_PATH):
+    """将指定目录下的 CSV 文件同步到数据库表
 
+    只处理同步清单（`sync_manifest`）中没有记录或内容已变化的文件；每个文件先写入临时表，
+    再在 SQLite 内以集合操作并入目标表（见 `storage.merge_staged`），数据与清单记录在同一事务中提交。
+    同步耗时取决于新增/变化的文件，而不是历史数据总量。
 
-
-def sync_folder_to_table(folder, table_name, prefer_keys=None, dry_run=False):
-    """将指定目录下的所有 CSV 文件同步到数据库表
-    
     参数:
         folder: str，包含 CSV 文件的目录路径
         table_name: str，目标数据库表名
-        prefer_keys: list, optional，用于去重的首选列名列表
-        dry_run: bool, optional，是否启用 dry-run 模式（仅预览不实际插入）
+        prefer_keys: list, optional，用于去重的首选列名列表（声明了主键的表以主键为准）
+        dry_run: bool, optional，是否启用 dry-run 模式（仅预览不实际写入，也不更新清单；各文件分别与数据库比较）
+        force: bool, optional，忽略同步清单，重新同步全部文件
+        db_path: str, optional，数据库路径
     """
-    # 获取目录下所有 CSV 文件
-    files = glob(os.path.join(folder, '*.csv'))
+    # 获取目录下所有 CSV 文件（按文件名排序，后同步的文件覆盖先同步的同键数据）
+    files = sorted(glob(os.path.join(folder, '*.csv')))
     if not files:
         logger.info(f'目录没有 CSV 文件：{folder}')
         return
 
-    logger.info(f'发现 {len(files)} 个 CSV 文件在 {folder} -> 目标表: {table_name}')
-
-    # 尝试加载数据库中已存在的键值（用于去重）
-    existing_keys = set()
-    if prefer_keys:
-        # 构建 SQL 查询语句，获取去重所需的列
-        cols_sql = ','.join([f'"{c}"' for c in prefer_keys])
-        try:
-            # 查询数据库中已存在的数据
-            df_exist = query_sqlite(f'SELECT {cols_sql} FROM {table_name}')
-            if df_exist is not None and not df_exist.empty:
-                # 生成现有数据的键值集合
-                existing_keys = set(df_exist.fillna('').astype(str).agg('|'.join, axis=1).tolist())
-        except Exception:
-            # 如果查询失败，使用空集合（不进行去重）
-            existing_keys = set()
+    manifest = SyncManifest(db_path)
+    pending, skipped = manifest.plan(table_name, files, force=force, dry_run=dry_run)
+    logger.info(f'发现 {len(files)} 个 CSV 文件在 {folder} -> 目标表: {table_name}'
+                f'（未变化跳过 {skipped} 个，待同步 {len(pending)} 个）')
 
     total_inserted = 0
-    # 遍历处理每个 CSV 文件
-    for p in files:
-        logger.info(f'开始处理：{p}')
-        df = _read_csv(p)
-        if df is None or df.empty:
-            logger.info('  文件为空，跳过')
-            continue
-
-        # 选择用于去重的键列
-        if prefer_keys:
-            # 只使用文件中存在的首选键列
-            keys = [c for c in prefer_keys if c in df.columns]
-        else:
-            # 如果没有指定首选键列，使用所有列
-            keys = list(df.columns)
-
-        if not keys:
-            # 如果没有可用列，使用整行数据作为键
-            df['_sync_key'] = df.astype(str).agg('|'.join, axis=1)
-            keys = ['_sync_key']
-        else:
-            # 使用指定的键列生成键值
-            df['_sync_key'] = _build_key(df, keys)
-
-        # 筛选出数据库中不存在的新行
-        if existing_keys:
-            mask_new = ~df['_sync_key'].isin(existing_keys)
-        else:
-            # 如果没有现有键，所有行都是新行
-            mask_new = [True] * len(df)
-
-        new_rows = df[mask_new].drop(columns=['_sync_key'])
-        logger.info(f'  总行数: {len(df)}, 新行数: {len(new_rows)}')
-
-        if len(new_rows) == 0:
-            # 没有新数据，跳过
-            continue
-
-        if dry_run:
-            # dry-run 模式，仅预览插入效果
-            logger.info('  dry-run 模式，未执行写入')
-            total_inserted += len(new_rows)
-            # 更新模拟的现有键集合
-            existing_keys.update(df.loc[mask_new, '_sync_key'].tolist())
-            continue
-
-        # 将新数据插入数据库
+    total_updated = 0
+    # 遍历处理每个新增或变化的 CSV 文件
+    for item in pending:
+        logger.info(f'开始处理：{item.path}')
         try:
-            n = save_to_sqlite(new_rows, table_name=table_name)
-            logger.info(f'  已插入 {n} 行到 {table_name}')
-            total_inserted += n
-            # 更新现有键集合，避免后续文件重复插入
-            existing_keys.update(df.loc[mask_new, '_sync_key'].tolist())
+            with open(item.path, 'rb') as f:
+                data = f.read()
+            # 清单中的哈希取自本次实际读取的内容
+            item = item._replace(content_hash=hashlib.sha1(data).hexdigest())
+            df = _read_csv(io.BytesIO(data))
+            with writer(db_path) as conn:
+                inserted, updated = (0, 0) if df is None or df.empty else merge_staged(
+                    conn, df, table_name, keys=prefer_keys, dry_run=dry_run)
+                if not dry_run:
+                    manifest.record(conn, table_name, item, row_count=0 if df is None else len(df))
         except Exception as e:
-            # 记录插入失败的异常信息
-            logger.exception(f'  插入失败：{e}')
+            # 记录失败的异常信息（该文件不写入清单，下次同步时重试）
+            logger.exception(f'  同步失败：{e}')
+            continue
+
+        logger.info(f'  总行数: {0 if df is None else len(df)}, 新行数: {inserted}, 更新行数: {updated}'
+                    + ('（dry-run 模式，未执行写入）' if dry_run else ''))
+        total_inserted += inserted
+        total_updated += updated
 
-    logger.info(f'\n完成同步 {folder} -> {table_name}, total_inserted={total_inserted}')
+    logger.info(f'\n完成同步 {folder} -> {table_name}, total_inserted={total_inserted}, '
+                f'total_updated={total_updated}, skipped_files={skipped}')
 
 
 
@@ -168,21 +125,23 @@ def main():
                         default='both', help='指定要同步的数据类型')
     parser.add_argument('--dry-run', action='store_true', 
                         help='启用 dry-run 模式，仅预览同步效果不实际插入')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略同步清单，重新同步全部文件')
     args = parser.parse_args()
 
     # 根据参数选择同步实时数据
     if args.target in ('realtime', 'both'):
-        # 实时数据的去重键：城市、日期、小时、监测站点
+        # 实时数据的去重键：城市、日期、小时、监测站点（realtime_data 以声明的主键为准）
         prefer_keys_rt = ['城市', '日期', '小时', '监测站点']
         sync_folder_to_table(NEWRAW_DATA_DIR, 'realtime_data', 
-                           prefer_keys=prefer_keys_rt, dry_run=args.dry_run)
+                           prefer_keys=prefer_keys_rt, dry_run=args.dry_run, force=args.force)
 
     # 根据参数选择同步历史数据
     if args.target in ('history', 'both'):
-        # 历史数据的去重键：城市、年份、月份
-        prefer_keys_hist = ['城市', '年份', '月份']
+        # 历史数据的去重键：城市、日期（history_data 以声明的主键为准）
+        prefer_keys_hist = ['城市', '日期']
         sync_folder_to_table(RAW_DATA_DIR, 'history_data', 
-                           prefer_keys=prefer_keys_hist, dry_run=args.dry_run)
+                           prefer_keys=prefer_keys_hist, dry_run=args.dry_run, force=args.force)
 
 
 if __name__ == '__main__':
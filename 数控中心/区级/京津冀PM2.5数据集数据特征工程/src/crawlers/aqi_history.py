@@ -4,26 +4,36 @@
 并将数据以 CSV 形式保存到 `data/raw`。
 """
 
-from src.utils.request_utils import create_session, safe_get
-from config.settings import START_YEAR, END_YEAR, REQUEST_INTERVAL, RAW_DATA_DIR, HISTORY_CRAWL_BATCH_SIZE
+from src.utils.request_utils import create_session, safe_get, is_cached, is_loopback
+from src.utils.rate_limiter import get_host_throttle
+from src.utils.pool_manager import log_pool_stats
+from src.utils import metrics
+from config.settings import START_YEAR, END_YEAR, RAW_DATA_DIR, HISTORY_CRAWL_BATCH_SIZE
+from config.settings import HISTORY_CRAWL_WORKERS, HOST_MAX_INFLIGHT, HOST_MIN_INTERVAL, HISTORY_ARCHIVE_ENABLED
 from src.utils.city_mapper import get_all_cities
-from src.data_processing.storage import save_raw_data, save_to_sqlite
-from config.settings import SAVE_TO_SQLITE
-import pandas as pd
-from src.utils.get_ip import get_current_ip  # 导入IP查询工具
-from bs4 import BeautifulSoup
+from src.data_processing.batch_writer import StreamingBatchWriter
+from src.crawlers.crawl_ledger import CrawlLedger, content_hash, STATUS_DONE, STATUS_PARTIAL, STATUS_FAILED
+from src.crawlers.history_planner import plan_history_crawl, plan_to_month_map
+from src.crawlers.history_parser import parse_history_page
+from src.crawlers.page_archive import PageArchive
+from src.utils.get_ip import get_cached_ip  # 导入IP查询工具（带缓存）
 import time
-import random
-import os
 from datetime import datetime
 import re
 import logging
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests  # 用于获取当前IP
 
 class AQIHistoryCrawler:
-    def __init__(self):
-        self.session = create_session()  # 使用requests会话
+    def __init__(self, use_cache=None, archive=None):
+        # use_cache：是否启用本地响应缓存（None 时按 HTTP_CACHE_ENABLED）
+        self.use_cache = use_cache
+        self.session = create_session(cache=use_cache)  # 使用requests会话
+        # archive：是否把原始页面写入归档（None 时按 HISTORY_ARCHIVE_ENABLED）
+        archive = HISTORY_ARCHIVE_ENABLED if archive is None else archive
+        self.archive = PageArchive() if archive else None
         self.base_url = "https://www.tianqihoubao.com/aqi"
         self.cities = get_all_cities()  # 获取所有城市（中文名+拼音）
         # 生成可用日期范围
@@ -40,8 +50,11 @@ class AQIHistoryCrawler:
         self.processed_cities = 0
         self.start_time = None  # 总耗时计时起点
         self.logger = logging.getLogger(__name__)
-        # 新增：初始化时检查一次IP
-        initial_ip = get_current_ip()
+        # 并发模式：每个工作线程独立的会话（请求速率由 safe_get 内的按域名自适应限速器控制）
+        self._local = threading.local()
+        # 初始化时查询一次出口IP，之后请求日志使用缓存值（按 EGRESS_IP_TTL 后台刷新）
+        initial_ip = get_cached_ip(refresh=True)
+        metrics.start_metrics_server()  # 配置了 METRICS_HTTP_PORT 时提供 /metrics
         self.logger.info(f">>>爬虫初始化完成，📍 初始IP: {initial_ip}")
 
     def _get_months_in_range(self, start_year, end_year):
@@ -63,8 +76,17 @@ class AQIHistoryCrawler:
                 current_year += 1
         return months
 
-    def crawl_city_month_data(self, city_pinyin, city_name, month):
+    def _thread_session(self):
+        """返回当前工作线程专属的会话（首次调用时通过 `create_session` 创建）。"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = create_session(cache=self.use_cache)
+            self._local.session = session
+        return session
+
+    def crawl_city_month_data(self, city_pinyin, city_name, month, session=None):
         """使用requests爬取单个城市单个月份的每日AQI数据"""
+        session = session or self.session
         max_retries = 5
         retry_count = 0
         while retry_count < max_retries:
@@ -75,13 +97,15 @@ class AQIHistoryCrawler:
                 
                 # 记录请求前时间（用于单请求耗时计算）
                 request_start = time.time()
-                # 获取当前IP
-                current_ip = get_current_ip()
+                # 缓存命中时不访问网络：不查询IP（safe_get 也不会占用域名限速名额）
+                cached = is_cached(session, url)
+                # 当前出口IP（缓存值，不额外访问外部接口；本机模拟站点无需出口IP）
+                current_ip = "本地缓存" if cached else ("本机" if is_loopback(url) else get_cached_ip())
                 
-                # 使用安全请求方法（带重试和随机头）
+                # 使用安全请求方法（带重试、随机头与按域名自适应限速）
                 response = safe_get(
-                    self.session, 
-                    url, 
+                    session,
+                    url,
                     timeout=30  # 延长超时时间
                 )
                 
@@ -98,43 +122,22 @@ class AQIHistoryCrawler:
                     time.sleep(2 **retry_count)  # 指数退避
                     continue
                 self.logger.info(f"⏱️  请求耗时: {request_time:.2f}秒")
+                # 先归档原始页面，再解析（解析逻辑变更后可离线重建）
+                if self.archive is not None:
+                    try:
+                        self.archive.put(city_pinyin, city_name, month, url, response.text)
+                    except Exception as e:
+                        self.logger.error(f"📦 {city_name}{month}页面归档失败：{e}")
                 # 解析HTML
-                soup = BeautifulSoup(response.text, 'lxml')
-                table = soup.find("table", class_="b")
+                with metrics.PARSE_SECONDS.time(crawler="history"):
+                    df = parse_history_page(response.text, city_name, month)
 
-                if not table:
+                if df is None:
                     self.logger.warning(f"{city_name}{month}未找到数据表格")
                     return None
-                
-                # 解析表头（处理可能的嵌套结构）
-                headers = [th.text.strip() for th in table.find_all("tr")[0].find_all("td")]
-                # 解析表体数据
-                rows = table.find_all("tr")[1:]  # 跳过表头行
-                all_daily_data = []
-                
-                for row in rows:
-                    cols = [td.text.strip() for td in row.find_all("td")]
-                    if len(cols) == len(headers):
-                        daily_data = dict(zip(headers, cols))
-                        daily_data["城市"] = city_name
-                        daily_data["年份"] = month[:4]
-                        daily_data["月份"] = month[4:]
-                        all_daily_data.append(daily_data)
-
-                if not all_daily_data:
+                if df.empty:
                     self.logger.warning(f"{city_name}{month}未获取到有效数据")
                     return None
-
-                # 转换为DataFrame并处理数据类型
-                df = pd.DataFrame(all_daily_data)
-                # 处理数值列（原数据中的"-"或空值转换为NaN）
-                numeric_cols = [
-                    "AQI指数", "当天AQI排名", "PM2.5", 
-                    "PM10", "No2", "So2", "Co", "O3"
-                ]
-                for col in numeric_cols:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col].replace("-", None), errors="coerce")
                 
                 self.logger.info(f"✅ {city_name}{month}爬取成功，获取{len(df)}条记录📊")
                 return df if not df.empty else None
@@ -148,12 +151,20 @@ class AQIHistoryCrawler:
         self.logger.error(f"❌ {city_name}{month}多次重试失败，跳过")
         return None
 
-    def crawl_all(self, batch_size=None):
-        """爬取所有城市所有月份数据（支持批量保存）"""
-        batch_count = 0
-        batch_data = []
-        batch_size = batch_size or HISTORY_CRAWL_BATCH_SIZE  # 默认每X个城市保存一次
+    def crawl_all(self, batch_size=None, workers=None, resume=False, incremental=False):
+        """爬取所有城市所有月份数据（支持批量保存）
+
+        `workers` 大于 1 时使用线程池并发爬取（默认取 `HISTORY_CRAWL_WORKERS`），
+        同一域名的请求受 `HOST_MAX_INFLIGHT` / `HOST_MIN_INTERVAL` 限制，`batch_size` 为每批提交的城市数。
+        每个城市爬完即交给后台的 `StreamingBatchWriter` 追加写入 CSV / SQLite，
+        写入并提交后再把各 (城市, 月份) 的结果写入 `crawl_ledger`；`resume=True` 时跳过
+        台账中已完成的单元，只爬取剩余月份；`incremental=True` 时按 `history_planner`
+        的计划只爬取当前月、天数不全及缺失的月份。
+        """
+        batch_size = batch_size or HISTORY_CRAWL_BATCH_SIZE  # 并发模式每批提交X个城市
+        workers = workers or HISTORY_CRAWL_WORKERS
         self.start_time = time.time()  # 记录总开始时间
+        metrics_before = metrics.snapshot()  # 结束时只汇总本轮增量
         self.logger.info(f"📅 可用日期数量: {len(self.available_dates)}个")
         
         # 筛选日期范围
@@ -164,7 +175,74 @@ class AQIHistoryCrawler:
         ]
         self.logger.info(f"🔍 筛选后待爬取月份：{filtered_dates}，共{len(filtered_dates)}个")
         self.logger.info(f"🔍 总待爬取城市数量：{self.total_cities}")
-        
+
+        self.ledger = CrawlLedger()
+        self.merge_existing = resume or incremental
+        month_plan = self._build_month_plan(filtered_dates, resume, incremental)
+
+        writer = StreamingBatchWriter(
+            table_name='history_data', raw_dir=RAW_DATA_DIR,
+            merge_existing=self.merge_existing, on_written=self._record_units,
+        )
+        with writer:
+            if workers > 1:
+                self._crawl_all_concurrent(month_plan, batch_size, workers, writer)
+            else:
+                self._crawl_all_serial(month_plan, writer)
+            
+        # 总耗时统计
+        total_elapsed = time.time() - self.start_time  # 计算总耗时
+        # 爬取完成时的汇总信息
+        self.logger.info(">>>GOOD>>>")
+        self.logger.info("🔌 【全部爬取任务完成】")
+        self.logger.info(f"   ├─ 🎯 总耗时：{total_elapsed:.2f}秒")
+        self.logger.info(f"   ├─ 🌍 总处理城市数：{self.processed_cities}/{self.total_cities}")
+        cache = getattr(self.session, "response_cache", None)
+        if cache is not None:
+            stats = cache.stats()
+            self.logger.info(
+                f"   ├─ 💾 响应缓存：命中 {stats['hits']} 次，304 复用 {stats['revalidated']} 次，"
+                f"网络请求 {stats['misses']} 次（缓存 {stats['entries']} 条，{stats['bytes'] / 1024 / 1024:.1f}MB）"
+            )
+        for host, state in get_host_throttle().snapshot().items():
+            self.logger.info(
+                f"   ├─ 🚦 {host}：成功 {state['successes']} 次，退避 {state['failures']} 次"
+                f"（Retry-After {state['retry_after']} 次），当前请求间隔 {state['interval']:.2f}秒"
+            )
+        log_pool_stats(self.logger.info)
+        metrics.finish_run("history", total_elapsed, since=metrics_before)
+        metrics.log_summary(self.logger.info, since=metrics_before)
+        metrics_path = metrics.export_metrics("history")
+        if metrics_path:
+            self.logger.info(f"   ├─ 📈 指标文件：{metrics_path}")
+        self.logger.info(f"   └─ 📅 完成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        self.logger.info(">>>END>>>" + "\n" + "=" * 90 + "\n")
+
+    def _build_month_plan(self, filtered_dates, resume=False, incremental=False):
+        """返回 {城市拼音: 待爬取月份列表}；续爬时剔除台账中已完成的月份。"""
+        completed = self.ledger.completed_units() if (resume or incremental) else set()
+        if incremental:
+            plan = plan_history_crawl(self.cities, filtered_dates, completed=completed)
+            planned = plan_to_month_map(plan)
+            total = len(filtered_dates) * self.total_cities
+            self.logger.info(f"🗓️ 增量爬取：按覆盖情况计划 {len(plan)}/{total} 个城市月份")
+            return {
+                city["pinyin"]: planned.get(city["pinyin"], [])
+                for city_list in self.cities.values() for city in city_list
+            }
+        month_plan = {}
+        skipped = 0
+        for city_list in self.cities.values():
+            for city in city_list:
+                months = [m for m in filtered_dates if (city["pinyin"], m) not in completed]
+                skipped += len(filtered_dates) - len(months)
+                month_plan[city["pinyin"]] = months
+        if resume:
+            self.logger.info(f"⏭️ 断点续爬：跳过台账中已完成的 {skipped} 个城市月份")
+        return month_plan
+
+    def _crawl_all_serial(self, month_plan, writer):
+        """串行爬取：逐省份、逐城市、逐月份请求，每个城市爬完即提交给写入器。"""
         for province, city_list in self.cities.items():
             self.logger.info("-" * 50)
             self.logger.info(f"🚀 【开始爬取 🌍 {province} 数据】")
@@ -181,91 +259,105 @@ class AQIHistoryCrawler:
                 
                 # 记录单个城市爬取开始时间
                 city_start = time.time()
+                city_data = []
+                city_units = []
                 
-                for month in filtered_dates:
+                # 请求间隔由自适应限速器控制（健康时按 HOST_MIN_INTERVAL，出错时自动放慢），不再固定等待
+                for month in month_plan[city_pinyin]:
                     df = self.crawl_city_month_data(city_pinyin, city_name, month)
-                    if df is not None and not df.empty:
-                        batch_data.append(df)
-                    
-                    # 月份间增加随机间隔，增强抗反爬
-                    time.sleep(REQUEST_INTERVAL + random.uniform(0.5, 1.5))
-                
-                # 计算单个城市耗时
-                city_time = time.time() - city_start
-                self.processed_cities += 1
-                # 计算总体进度
-                progress = (self.processed_cities / self.total_cities) * 100
-                # 计算总耗时
-                total_time = time.time() - self.start_time
+                    city_units.append((city_pinyin, city_name, month, df))
+                    city_data.append(df)
                 
-                self.logger.info("=" * 60)  # 分隔线
-                self.logger.info(f"📊 【{city_name} 处理完成】")
-                self.logger.info(f"   ├─ ⏱️ 耗时：{city_time:.2f}秒")
-                self.logger.info(f"   ├─ 🎯 总体进度：{progress:.1f}%（{self.processed_cities}/{self.total_cities}）")
-                self.logger.info(f"   └─ ⏱️ 累计耗时：{total_time:.2f}秒")
-                self.logger.info("=" * 60)  # 分隔线
+                self._log_city_done(city_name, time.time() - city_start)
+                writer.submit(city_data, city_units)
 
-                
-                # 城市间间隔更长一些
-                time.sleep(REQUEST_INTERVAL * 2 + random.uniform(1, 3))
-                batch_count += 1
+    def _crawl_all_concurrent(self, month_plan, batch_size, workers, writer):
+        """并发爬取：同一批城市的所有 (城市, 月份) 页面提交到线程池并行请求。
 
-                # 批量保存
-                if batch_count >= batch_size:
-                    self._save_batch(batch_data)
-                    batch_data = []
-                    batch_count = 0
-                    # 每批完成后休息一段时间
-                    time.sleep(random.uniform(5, 10))
-        
-        # 保存剩余数据
-        if batch_data:
-            self._save_batch(batch_data)
-            
-        # 总耗时统计
-        total_elapsed = time.time() - self.start_time  # 计算总耗时
-        # 爬取完成时的汇总信息
-        self.logger.info(">>>GOOD>>>")
-        self.logger.info("🔌 【全部爬取任务完成】")
-        self.logger.info(f"   ├─ 🎯 总耗时：{total_elapsed:.2f}秒")
-        self.logger.info(f"   ├─ 🌍 总处理城市数：{self.processed_cities}/{self.total_cities}")
-        self.logger.info(f"   └─ 📅 完成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        self.logger.info(">>>END>>>" + "\n" + "=" * 90 + "\n")
+        请求速率由共享的 `HostThrottle` 按域名自适应控制；某个城市的全部月份完成后，
+        按月份顺序提交给写入器，因此输出文件与串行模式一致。
+        """
+        self.logger.info(
+            f"⚡ 并发模式：{workers} 个工作线程，单域名最多 {HOST_MAX_INFLIGHT} 个在途请求，"
+            f"请求间隔 ≥ {HOST_MIN_INTERVAL:.1f}秒（出错时自动放慢）"
+        )
+        # 与串行模式相同的城市顺序，批次跨省份连续计数
+        all_cities = [city for city_list in self.cities.values() for city in city_list]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="history") as executor:
+            for batch_start in range(0, len(all_cities), batch_size):
+                batch = all_cities[batch_start:batch_start + batch_size]
+                batch_start_time = time.time()
+                futures = {}
+                for ci, city in enumerate(batch):
+                    months = month_plan[city["pinyin"]]
+                    self.logger.info(f"🔍 提交爬取任务：{city['name']}（拼音：{city['pinyin']}），{len(months)}个月份")
+                    for mi, month in enumerate(months):
+                        future = executor.submit(self._crawl_unit, city["pinyin"], city["name"], month)
+                        futures[future] = (ci, mi)
 
-    def _save_batch(self, batch_data):
-        """批量保存数据到CSV"""
-        if not batch_data:
-            return
-        combined_df = pd.concat(batch_data, ignore_index=True)
-        # 按年份+城市分组保存（每个城市每年一个文件）
-        for (year, city), df in combined_df.groupby(["年份", "城市"]):
-            filename = f"{year}_{city}_aqi_history.csv"
-            # 根据配置决定是否同时写入 SQLite
-            if SAVE_TO_SQLITE:
-                try:
-                    save_raw_data(df, filename=filename, table_name='history_data')
-                except Exception as e:
-                    # 回退到本地 CSV 写入（尽可能保存数据）
-                    file_path = os.path.join(RAW_DATA_DIR, filename)
-                    df.to_csv(
-                        file_path,
-                        mode='a' if os.path.exists(file_path) else 'w',
-                        header=not os.path.exists(file_path),
-                        index=False,
-                        encoding="utf-8-sig"
-                    )
-                    self.logger.error(f"📁 保存到 SQLite 失败，已回退为 CSV：{e}")
-            else:
-                # 仅写 CSV
-                file_path = os.path.join(RAW_DATA_DIR, filename)
-                df.to_csv(
-                    file_path,
-                    mode='a' if os.path.exists(file_path) else 'w',
-                    header=not os.path.exists(file_path),
-                    index=False,
-                    encoding="utf-8-sig"
-                )
-        self.logger.info(f">>>📁 批量保存完成✅，共{len(combined_df)}条数据 💾")
+                results = {}
+                pending = [len(month_plan[city["pinyin"]]) for city in batch]
+                for ci, count in enumerate(pending):
+                    if count == 0:
+                        # 没有月份可爬时也要计入进度
+                        self._log_city_done(batch[ci]["name"], 0.0)
+                for future in as_completed(futures):
+                    ci, mi = futures[future]
+                    results[(ci, mi)] = future.result()
+                    pending[ci] -= 1
+                    if pending[ci] == 0:
+                        self._log_city_done(batch[ci]["name"], time.time() - batch_start_time)
+                        self._submit_city(writer, batch[ci], month_plan, results, ci)
+
+    def _submit_city(self, writer, city, month_plan, results, ci):
+        """把一个城市已完成的全部月份按月份顺序交给写入器，并释放其结果。"""
+        frames = []
+        units = []
+        for mi, month in enumerate(month_plan[city["pinyin"]]):
+            df = results.pop((ci, mi))
+            units.append((city["pinyin"], city["name"], month, df))
+            frames.append(df)
+        writer.submit(frames, units)
+
+    def _crawl_unit(self, city_pinyin, city_name, month):
+        """线程池任务：使用当前线程的会话爬取单个 (城市, 月份)。"""
+        return self.crawl_city_month_data(city_pinyin, city_name, month, session=self._thread_session())
+
+    def _record_units(self, batch_units, failed=False):
+        """把一批 (城市, 月份) 的爬取结果写入断点台账（须在数据落盘之后调用）。
+
+        `failed=True` 表示这批数据写入 SQLite 失败（已回滚），全部记为失败，续爬时重新爬取。
+        """
+        current_month = datetime.now().strftime("%Y%m")
+        entries = []
+        for city_pinyin, city_name, month, df in batch_units:
+            if failed or df is None or df.empty:
+                metrics.PAGES.inc(crawler="history", result="failed")
+                entries.append((city_pinyin, city_name, month, STATUS_FAILED, 0, ""))
+                continue
+            metrics.PAGES.inc(crawler="history", result="ok")
+            # 当前月仍在更新，只记为 partial，下次续爬时会重新爬取
+            status = STATUS_PARTIAL if month >= current_month else STATUS_DONE
+            entries.append((city_pinyin, city_name, month, status, len(df), content_hash(df)))
+        try:
+            self.ledger.record_many(entries)
+        except Exception as e:
+            self.logger.error(f"📒 写入爬取台账失败：{e}")
+
+    def _log_city_done(self, city_name, city_time):
+        """记录单个城市完成情况与总体进度。"""
+        self.processed_cities += 1
+        # 计算总体进度
+        progress = (self.processed_cities / self.total_cities) * 100
+        # 计算总耗时
+        total_time = time.time() - self.start_time
+
+        self.logger.info("=" * 60)  # 分隔线
+        self.logger.info(f"📊 【{city_name} 处理完成】")
+        self.logger.info(f"   ├─ ⏱️ 耗时：{city_time:.2f}秒")
+        self.logger.info(f"   ├─ 🎯 总体进度：{progress:.1f}%（{self.processed_cities}/{self.total_cities}）")
+        self.logger.info(f"   └─ ⏱️ 累计耗时：{total_time:.2f}秒")
+        self.logger.info("=" * 60)  # 分隔线
 
 if __name__ == "__main__":
     crawler = AQIHistoryCrawler()
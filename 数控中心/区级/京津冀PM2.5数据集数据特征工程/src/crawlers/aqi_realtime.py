@@ -1,14 +1,21 @@
 from src.utils.request_utils import create_session, safe_post, get_headers
+from src.utils.pool_manager import log_pool_stats
+from src.utils import metrics
 from config.settings import NEWRAW_DATA_DIR, SAVE_TO_SQLITE
+from config.settings import REALTIME_CRAWL_WORKERS, REALTIME_HOST_MAX_INFLIGHT, REALTIME_HOST_MIN_INTERVAL
+from config.settings import REALTIME_DELTA_ONLY, REALTIME_RECORD_PAYLOADS, REALTIME_PAYLOAD_DIR
+from src.crawlers.realtime_index import RealtimeKeyIndex
+from src.crawlers.realtime_decoder import decode_realtime_records, decode_realtime_payloads
 from src.utils.city_mapper import get_city_code_map
-from src.data_processing.storage import save_raw_data, save_to_sqlite
-import pandas as pd
+from src.data_processing.db_pool import writer
+from src.data_processing.storage import bulk_load, save_to_lake, save_to_sqlite
 import time
 from datetime import datetime
 import os
-import re
+import json
 import logging
-import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests  # 直接引入requests处理POST请求
 
 # 配置日志输出
@@ -31,39 +38,56 @@ class AQIRealtimeCrawler:
         # 记录总进度
         self.total_cities = len(self.city_codes)
         self.completed_cities = 0
+        # 并发模式：每个工作线程独立的会话（请求速率由 safe_post 内的按域名自适应限速器控制）
+        self._local = threading.local()
+        # 已落盘小时索引：每轮只保存新增的 (城市, 日期, 小时)
+        self.key_index = RealtimeKeyIndex() if REALTIME_DELTA_ONLY else None
+        metrics.start_metrics_server()  # 配置了 METRICS_HTTP_PORT 时提供 /metrics（常驻调度时可被持续采集）
         
     def _get_headers(self):
         """生成符合接口要求的请求头"""
         return get_headers(referer="https://air.cnemc.cn:18007/")  # 传入实时接口的 Referer
     
-    def _parse_timepoint(self, timepoint_str):
-        """解析TimePointStr格式为日期和小时（增强容错）"""
-        if not timepoint_str:
-            return None, None
-            
-        # 匹配格式如"02日20时"
-        match = re.match(r"(\d{2})日(\d{2})时", timepoint_str)
-        if match:
-            day, hour = match.groups()
-            # 获取当前年月
-            now = datetime.now()
-            current_year, current_month = now.year, now.month
-            
-            # 处理跨月情况（如本月1日爬取上月31日数据）
-            try:
-                datetime(current_year, current_month, int(day))
-            except ValueError:
-                current_month -= 1
-                if current_month == 0:
-                    current_month = 12
-                    current_year -= 1
-            
-            date_str = f"{current_year}-{current_month:02d}-{day}"
-            return date_str, hour
-        return None, None
-    
-    def crawl_city_realtime(self, city_name):
-        """爬取单个城市的实时AQI数据（按小时）"""
+    def _record_payload(self, city_name, data, collected_at=None):
+        """把接口原始返回保存为 JSON（用于解码基准测试与离线回放），失败时只记录日志。"""
+        stamp = datetime.strptime(collected_at, "%Y-%m-%d %H:%M:%S") if collected_at else datetime.now()
+        folder = os.path.join(REALTIME_PAYLOAD_DIR, stamp.strftime("%Y%m%d_%H%M"))
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f"{city_name}.json"), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        except Exception as e:
+            logging.warning(f"⚠️ 保存{city_name}接口原始数据失败：{e}")
+
+    def _thread_session(self):
+        """返回当前工作线程专属的会话（首次调用时通过 `create_session` 创建）。"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = create_session()
+            self._local.session = session
+        return session
+
+    def crawl_city_realtime(self, city_name, session=None, collected_at=None):
+        """爬取单个城市的实时AQI数据（按小时）
+
+        `collected_at` 为本轮采集时间（"%Y-%m-%d %H:%M:%S"），批量采集时所有城市共用同一时间戳；
+        缺省时取解析时的当前时间。
+        """
+        data = self.fetch_city_payload(city_name, session=session, collected_at=collected_at)
+        if data is None:
+            return None
+        try:
+            # 列式解码（时间点解析、数值转换、跨月判断均为整批向量化处理）
+            df = decode_realtime_records(data, city_name, collected_at=collected_at)
+            logging.info(f" └─🎯 {city_name}数据解析完成，共{len(df)}条有效记录")
+            return df
+        except Exception as e:
+            logging.error(f" └─ ❌ 解析{city_name}数据失败: {str(e)}", exc_info=True)
+            return None
+
+    def fetch_city_payload(self, city_name, session=None, collected_at=None):
+        """请求单个城市的实时接口，返回原始记录列表；失败时返回 None。"""
+        session = session or self.session
         logging.info(f"🚀 开始处理城市: {city_name}")
         
         city_code = self.city_codes.get(city_name)
@@ -79,8 +103,9 @@ class AQIRealtimeCrawler:
 
         # 发送POST请求（关键修改）
         logging.info(f"🚦向API发送POST请求获取🌍 {city_name}数据...")
+        # 请求速率由按域名的自适应限速器控制（HOST_LIMIT_OVERRIDES 中的实时接口配置）
         response = safe_post(
-            self.session,
+            session,
             self.base_api,
             params=params,
             referer="https://air.cnemc.cn:18007/",  # 传入实时接口的referer
@@ -98,112 +123,71 @@ class AQIRealtimeCrawler:
             if isinstance(data, dict) and "data" in data:
                 data = data["data"]
                 
+            if not isinstance(data, list):
+                raise ValueError(f"返回格式异常：{type(data).__name__}")
             logging.info(f"✅ 成功获取{city_name}原始数据，共{len(data)}条时间点记录 📋")
-            
-            all_hour_data = []
-            for idx, item in enumerate(data):
-                # 解析时间点
-                date_str, hour = self._parse_timepoint(item.get("TimePointStr", ""))
-                if not date_str or not hour:
-                    logging.warning(f"⏳ 跳过无效时间格式记录: {item.get('TimePointStr')}")
-                    continue
-                    
-                # 统一处理空值和特殊符号
-                def parse_numeric(value):
-                    if value in ["—", "", "None", None]:
-                        return None
-                    try:
-                        return float(value)
-                    except ValueError:
-                        return None
-
-                hour_data = {
-                    "城市": city_name,
-                    "日期": date_str,
-                    "小时": hour,
-                    "AQI": parse_numeric(item.get("AQI")),
-                    "空气质量等级": item.get("Quality", "").strip(),
-                    "PM2.5": parse_numeric(item.get("PM2_5")),
-                    "PM10": parse_numeric(item.get("PM10")),
-                    "SO₂": parse_numeric(item.get("SO2")),
-                    "NO₂": parse_numeric(item.get("NO2")),
-                    "CO": parse_numeric(item.get("CO")),
-                    "O₃": parse_numeric(item.get("O3")),
-                    "首要污染物": item.get("PrimaryPollutant", "").replace("—", "").strip(),
-                    "健康建议": item.get("Unheathful", "").strip(),
-                    "措施建议": item.get("Measure", "").strip(),
-                    "采集时间": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                all_hour_data.append(hour_data)
-                
-                # 每解析10条数据显示一次进度
-                if (idx + 1) % 10 == 0:
-                    logging.info(f" ├─⏳ {city_name}数据解析进度: {idx + 1}/{len(data)}")
-
-            df = pd.DataFrame(all_hour_data)
-            logging.info(f" └─🎯 {city_name}数据解析完成，共{len(df)}条有效记录")
-            return df
-
         except Exception as e:
             logging.error(f" └─ ❌ 解析{city_name}数据失败: {str(e)}", exc_info=True)
             return None
 
-    def crawl_realtime_batch(self, cities=None):
-        """批量爬取多个城市的实时数据"""
+        if REALTIME_RECORD_PAYLOADS:
+            self._record_payload(city_name, data, collected_at)
+        return data
+
+    def crawl_realtime_batch(self, cities=None, workers=None):
+        """批量爬取多个城市的实时数据
+
+        `workers` 大于 1 时使用线程池并发采集（默认取 `REALTIME_CRAWL_WORKERS`），接口请求受
+        `REALTIME_HOST_MAX_INFLIGHT` / `REALTIME_HOST_MIN_INTERVAL` 限制；本轮所有记录的
+        "采集时间" 统一为开始采集的时刻。各城市只取回原始记录，整轮结束后按城市列表顺序
+        一次性解码（`decode_realtime_payloads`），与串行模式结构一致。
+        """
         cities = cities or list(self.city_codes.keys())
-        all_realtime_data = []
+        workers = workers or REALTIME_CRAWL_WORKERS
+        self.completed_cities = 0
         
         start_time = datetime.now()
+        collected_at = start_time.strftime("%Y-%m-%d %H:%M:%S")
+        metrics_before = metrics.snapshot()  # 结束时只汇总本轮增量
         logging.info(f"=============== 开始爬取京津冀实时AQI数据 ===============")
         logging.info(f"⏱️ 爬取时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
         logging.info(f"🧩 待爬取城市数量: {len(cities)}")
         logging.info(f"🗺️ 城市列表: {', '.join(cities)}")
         
-        for i, city in enumerate(cities, 1):
-            logging.info(f"\n=============== 处理第{i}/{len(cities)}个城市: {city} ===============")
-            df = self.crawl_city_realtime(city)
-            
-            if df is not None and not df.empty:
-                all_realtime_data.append(df)
-                logging.info(f"✅ {city}爬取成功，获取{len(df)}条记录 📋")
-            else:
-                logging.warning(f"❌ {city}爬取失败或无有效数据")
-                
-            self.completed_cities = i
-            # 显示总体进度
-            progress = (self.completed_cities / self.total_cities) * 100
-            logging.info(f"⏳ 当前总体进度: {progress:.1f}% ({self.completed_cities}/{self.total_cities})")
-            
-            if i < len(cities):
-                wait_time = random.uniform(1.5, 3.5)  # 随机等待时间，避免反爬
-                logging.info(f"🔄 等待{wait_time:.1f}秒后继续下一个城市...")
-                time.sleep(wait_time)
+        if workers > 1:
+            payloads = self._crawl_batch_concurrent(cities, workers, collected_at)
+        else:
+            payloads = self._crawl_batch_serial(cities, collected_at)
         
-        if all_realtime_data:
-            combined = pd.concat(all_realtime_data, ignore_index=True)
-            # 确保存储目录存在
-            os.makedirs(NEWRAW_DATA_DIR, exist_ok=True)
-            # 按时间戳保存
-            filename = f"realtime_京津冀_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
-            file_path = os.path.join(NEWRAW_DATA_DIR, filename)
-            # 使用统一保存函数：写入 CSV（NEWRAW_DATA_DIR 的绝对路径）并根据配置写入 SQLite
+        combined = None
+        if payloads:
             try:
-                if SAVE_TO_SQLITE:
-                    save_raw_data(combined, filename=file_path, table_name='realtime_data')
-                else:
-                    # 仅保存 CSV
-                    combined.to_csv(file_path, index=False, encoding="utf-8-sig")
-                logging.info("📄 realtime 数据保存完成。")
+                with metrics.PARSE_SECONDS.time(crawler="realtime"):
+                    combined = decode_realtime_payloads(payloads, collected_at=collected_at, now=start_time)
+                logging.info(f"🎯 本轮数据解码完成，共{len(combined)}条有效记录")
             except Exception as e:
-                logging.error(f"⚠️ 保存 realtime 数据失败：{e}")
+                logging.error(f"❌ 解码本轮实时数据失败：{e}", exc_info=True)
+        
+        if combined is not None and not combined.empty:
+            try:
+                with metrics.SAVE_SECONDS.time(crawler="realtime"):
+                    file_path = self._save_delta(combined, start_time)
+            except Exception as e:
+                # 失败的小时没有记入 realtime_index，下一轮会重新保存
+                elapsed = (datetime.now() - start_time).total_seconds()
+                logging.error(f"❌ 保存本轮 realtime 数据失败（下一轮重新保存）：{e}", exc_info=True)
+                self._finish_metrics(elapsed, metrics_before)
+                return None
             
             end_time = datetime.now()
             elapsed = (end_time - start_time).total_seconds()
             logging.info(f"\n=============== 爬取完成 ===============")
             logging.info(f"⏱️ 总耗时: {elapsed:.2f}秒")
-            logging.info(f"📁 保存文件路径: {file_path}")
+            logging.info(f"📁 保存文件路径: {file_path or '无（没有新增小时）'}")
             logging.info(f"📌 总记录数: {len(combined)}条")
             logging.info(f"📍 平均每个城市: {len(combined)/len(cities):.1f}条记录")
+            log_pool_stats(logging.info)
+            self._finish_metrics(elapsed, metrics_before)
             logging.info(f">>>✅ realtime数据爬取与保存成功！>>>")
             return combined
         else:
@@ -211,8 +195,99 @@ class AQIRealtimeCrawler:
             elapsed = (end_time - start_time).total_seconds()
             logging.warning(f"\n===== 爬取完成但未获取到任何有效数据 =====")
             logging.info(f"⏱️ 总耗时: {elapsed:.2f}秒")
+            self._finish_metrics(elapsed, metrics_before)
             return None
 
+    def _finish_metrics(self, elapsed, metrics_before):
+        """记录本轮耗时与吞吐，汇总本轮指标增量并导出指标文件。"""
+        metrics.finish_run("realtime", elapsed, since=metrics_before)
+        metrics.log_summary(logging.info, since=metrics_before)
+        metrics_path = metrics.export_metrics("realtime")
+        if metrics_path:
+            logging.info(f"📈 指标文件: {metrics_path}")
+
+    def _save_delta(self, combined, start_time):
+        """保存本轮新增的小时数据（CSV + 可选 SQLite），返回 CSV 路径；没有新增时返回 None。
+
+        写入失败时抛出异常。`realtime_index` 与 `realtime_data` 在同一个写事务中提交，
+        未落盘的小时不会记入索引，下一轮仍会保存。
+        """
+        to_save = combined
+        if self.key_index is not None:
+            try:
+                to_save = self.key_index.filter_new(combined)
+                logging.info(f"🧮 本轮共 {len(combined)} 条记录，新增 {len(to_save)} 条（其余小时已落盘）")
+            except Exception as e:
+                logging.error(f"⚠️ 读取 realtime_index 失败，本轮全量保存：{e}")
+        if to_save.empty:
+            logging.info("⏭️ 没有新增小时，跳过保存")
+            return None
+
+        # 确保存储目录存在
+        os.makedirs(NEWRAW_DATA_DIR, exist_ok=True)
+        # 按时间戳保存
+        filename = f"realtime_京津冀_{start_time.strftime('%Y%m%d_%H%M')}.csv"
+        file_path = os.path.join(NEWRAW_DATA_DIR, filename)
+        to_save.to_csv(file_path, index=False, encoding="utf-8-sig")
+        metrics.ROWS_WRITTEN.inc(len(to_save), crawler="realtime", sink="csv")
+        logging.info(f"💾 CSV 已保存：{file_path}")
+        if SAVE_TO_SQLITE:
+            # 数据行与索引键在同一个事务中提交；任一步失败时整体回滚
+            with writer() as conn:
+                bulk_load(to_save, "realtime_data")
+                if self.key_index is not None:
+                    self.key_index.add(to_save, conn)
+            metrics.ROWS_WRITTEN.inc(len(to_save), crawler="realtime", sink="sqlite")
+            logging.info(f"✅ 已写入 SQLite 表 'realtime_data'，记录数：{len(to_save)}")
+            save_to_lake(to_save, "realtime_data")
+        elif self.key_index is not None:
+            self.key_index.add(to_save)
+        logging.info("📄 realtime 数据保存完成。")
+        return file_path
+
+    def _crawl_batch_serial(self, cities, collected_at):
+        """串行采集：逐个城市请求（间隔由自适应限速器控制）；返回 {城市: 原始记录列表}。"""
+        payloads = {}
+        for i, city in enumerate(cities, 1):
+            logging.info(f"\n=============== 处理第{i}/{len(cities)}个城市: {city} ===============")
+            data = self.fetch_city_payload(city, collected_at=collected_at)
+            self._log_city_result(city, data)
+            if data:
+                payloads[city] = data
+        return payloads
+
+    def _crawl_batch_concurrent(self, cities, workers, collected_at):
+        """并发采集：所有城市同时提交到线程池，返回按城市列表排序的 {城市: 原始记录列表}。"""
+        logging.info(
+            f"⚡ 并发模式：{workers} 个工作线程，接口最多 {REALTIME_HOST_MAX_INFLIGHT} 个在途请求，"
+            f"请求间隔 ≥ {REALTIME_HOST_MIN_INTERVAL:.1f}秒（出错时自动放慢）"
+        )
+        results = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="realtime") as executor:
+            futures = {executor.submit(self._crawl_city_unit, city, collected_at): city for city in cities}
+            for future in as_completed(futures):
+                city = futures[future]
+                results[city] = future.result()
+                self._log_city_result(city, results[city])
+        return {city: results[city] for city in cities if results[city]}
+
+    def _crawl_city_unit(self, city, collected_at):
+        """线程池任务：使用当前线程的会话请求单个城市。"""
+        return self.fetch_city_payload(city, session=self._thread_session(), collected_at=collected_at)
+
+    def _log_city_result(self, city, data):
+        """记录单个城市采集结果与总体进度。"""
+        if data:
+            metrics.PAGES.inc(crawler="realtime", result="ok")
+            logging.info(f"✅ {city}爬取成功，获取{len(data)}条时间点记录 📋")
+        else:
+            metrics.PAGES.inc(crawler="realtime", result="failed")
+            logging.warning(f"❌ {city}爬取失败或无有效数据")
+        self.completed_cities += 1
+        # 显示总体进度
+        progress = (self.completed_cities / self.total_cities) * 100
+        logging.info(f"⏳ 当前总体进度: {progress:.1f}% ({self.completed_cities}/{self.total_cities})")
+
 if __name__ == "__main__":
     logging.info("🚀 启动京津冀实时AQI数据爬虫...")
     try:
@@ -0,0 +1,96 @@
+"""历史爬取断点台账。
+
+在 SQLite（默认与业务数据同库 `aqi_database.db`）中维护 `crawl_ledger` 表，
+按 (城市拼音, 月份) 记录每个爬取单元的状态、行数、内容哈希与爬取时间，
+供 `AQIHistoryCrawler.crawl_all(resume=True)` 跳过已完成的单元。
+
+状态取值：
+- done：已爬取并落盘的历史月份（源站数据不再变化，续爬时跳过）
+- partial：已落盘但月份尚未结束（当前月），续爬时仍需重新爬取
+- failed：请求失败或未解析到数据，续爬时重新爬取
+"""
+
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+from config.settings import DATABASE_PATH
+from src.data_processing.storage import _get_conn
+
+LEDGER_TABLE = "crawl_ledger"
+
+STATUS_DONE = "done"
+STATUS_PARTIAL = "partial"
+STATUS_FAILED = "failed"
+
+
+def content_hash(df: pd.DataFrame) -> str:
+    """返回 DataFrame 内容的 SHA1 摘要（基于 CSV 序列化，与行顺序相关）。"""
+    if df is None or df.empty:
+        return ""
+    return hashlib.sha1(df.to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+class CrawlLedger:
+    """(城市, 月份) 粒度的爬取台账。"""
+
+    def __init__(self, db_path: str = DATABASE_PATH):
+        self.db_path = db_path
+        conn = _get_conn(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{LEDGER_TABLE}" ('
+                    "city_pinyin TEXT NOT NULL, "
+                    "month TEXT NOT NULL, "
+                    "city_name TEXT, "
+                    "status TEXT NOT NULL, "
+                    "row_count INTEGER DEFAULT 0, "
+                    "content_hash TEXT, "
+                    "fetched_at TEXT, "
+                    "PRIMARY KEY (city_pinyin, month))"
+                )
+        finally:
+            conn.close()
+
+    def completed_units(self) -> set:
+        """返回状态为 done 的 (city_pinyin, month) 集合。"""
+        conn = _get_conn(self.db_path)
+        try:
+            cur = conn.execute(
+                f'SELECT city_pinyin, month FROM "{LEDGER_TABLE}" WHERE status = ?', (STATUS_DONE,)
+            )
+            return {(row[0], row[1]) for row in cur.fetchall()}
+        finally:
+            conn.close()
+
+    def record_many(self, entries):
+        """批量写入台账。
+
+        `entries` 为 (city_pinyin, city_name, month, status, row_count, content_hash) 元组序列，
+        同一单元重复写入时覆盖旧记录。
+        """
+        entries = list(entries)
+        if not entries:
+            return 0
+        fetched_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = _get_conn(self.db_path)
+        try:
+            with conn:
+                conn.executemany(
+                    f'INSERT INTO "{LEDGER_TABLE}" '
+                    "(city_pinyin, city_name, month, status, row_count, content_hash, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(city_pinyin, month) DO UPDATE SET "
+                    "city_name = excluded.city_name, status = excluded.status, "
+                    "row_count = excluded.row_count, content_hash = excluded.content_hash, "
+                    "fetched_at = excluded.fetched_at",
+                    [(p, n, m, s, int(c), h, fetched_at) for p, n, m, s, c, h in entries],
+                )
+            return len(entries)
+        finally:
+            conn.close()
+
+
+__all__ = ["CrawlLedger", "content_hash", "STATUS_DONE", "STATUS_PARTIAL", "STATUS_FAILED"]
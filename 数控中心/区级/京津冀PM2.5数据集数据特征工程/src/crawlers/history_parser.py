@@ -0,0 +1,122 @@
+"""历史月度页面解析。
+
+把 `AQIHistoryCrawler` 中的 HTML 解析逻辑独立出来，便于：
+
+- 爬取时在线解析（`crawl_city_month_data`）；
+- 离线重解析时在进程池中直接调用（`python -m src.main reparse`）。
+
+`parse_history_page` 使用 lxml + XPath 直接提取列数组并向量化转换数值列；
+`parse_history_page_bs4` 保留原 BeautifulSoup 实现作为对照
+（`scripts/bench_history_parser.py` 校验两者输出一致并对比耗时）。
+
+本模块只依赖 HTML 文本，不访问网络、不写日志，可安全地在子进程中运行。
+"""
+
+import pandas as pd
+from bs4 import BeautifulSoup
+from lxml import etree
+
+# 原数据中的"-"或空值转换为 NaN 的数值列
+NUMERIC_COLS = [
+    "AQI指数", "当天AQI排名", "PM2.5",
+    "PM10", "No2", "So2", "Co", "O3"
+]
+
+# 与 BeautifulSoup 的 find("table", class_="b") 等价：class 属性中含有独立的 b
+_TABLE_XPATH = etree.XPath("(//table[contains(concat(' ', normalize-space(@class), ' '), ' b ')])[1]")
+_ROWS_XPATH = etree.XPath(".//tr")
+_CELLS_XPATH = etree.XPath(".//td")
+
+
+def _cell_text(td):
+    # 等价于 bs4 的 td.text.strip()（注释节点不计入文本）
+    return "".join(td.itertext()).strip()
+
+
+def parse_history_page(html, city_name, month):
+    """解析单个城市单个月份页面中的每日 AQI 表格。
+
+    返回:
+        - None：页面中没有 `table.b` 数据表格
+        - 空 DataFrame：有表格但没有有效数据行
+        - DataFrame：表格各列 + 城市、年份、月份，数值列已转换为数字
+    """
+    if not html:
+        return None
+    try:
+        # etree.HTML 使用线程内默认解析器，可在爬虫线程池中并发调用
+        root = etree.HTML(html)
+    except ValueError:
+        # 带编码声明的 str 不能直接解析，转为字节后交给 lxml 识别
+        root = etree.HTML(html.encode("utf-8"))
+    if root is None:
+        return None
+    tables = _TABLE_XPATH(root)
+    if not tables:
+        return None
+
+    rows = _ROWS_XPATH(tables[0])
+    if not rows:
+        return pd.DataFrame()
+    headers = [_cell_text(td) for td in _CELLS_XPATH(rows[0])]
+
+    # 直接按列收集；表头重复时与 dict(zip(...)) 一致：列位置取首次出现，取值取最后一次出现
+    positions = {name: i for i, name in enumerate(headers)}
+    columns = {name: [] for name in headers}
+    width = len(headers)
+    for row in rows[1:]:
+        cells = _CELLS_XPATH(row)
+        if len(cells) != width:
+            continue
+        for name, i in positions.items():
+            columns[name].append(_cell_text(cells[i]))
+
+    n_rows = len(columns[headers[0]]) if headers else 0
+    if n_rows == 0:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(columns)
+    df["城市"] = city_name
+    df["年份"] = month[:4]
+    df["月份"] = month[4:]
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            # "-" 与空字符串在 coerce 下均转为 NaN
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def parse_history_page_bs4(html, city_name, month):
+    """原 BeautifulSoup 实现（对照基准），返回值约定同 `parse_history_page`。"""
+    soup = BeautifulSoup(html, 'lxml')
+    table = soup.find("table", class_="b")
+    if not table:
+        return None
+
+    # 解析表头（处理可能的嵌套结构）
+    headers = [th.text.strip() for th in table.find_all("tr")[0].find_all("td")]
+    # 解析表体数据
+    rows = table.find_all("tr")[1:]  # 跳过表头行
+    all_daily_data = []
+
+    for row in rows:
+        cols = [td.text.strip() for td in row.find_all("td")]
+        if len(cols) == len(headers):
+            daily_data = dict(zip(headers, cols))
+            daily_data["城市"] = city_name
+            daily_data["年份"] = month[:4]
+            daily_data["月份"] = month[4:]
+            all_daily_data.append(daily_data)
+
+    if not all_daily_data:
+        return pd.DataFrame()
+
+    # 转换为DataFrame并处理数据类型
+    df = pd.DataFrame(all_daily_data)
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].replace("-", None), errors="coerce")
+    return df
+
+
+__all__ = ["parse_history_page", "parse_history_page_bs4", "NUMERIC_COLS"]
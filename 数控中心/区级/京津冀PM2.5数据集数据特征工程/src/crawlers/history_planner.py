@@ -0,0 +1,133 @@
+"""历史爬取增量计划器。
+
+源站上已结束的月份数据不再变化，因此无需每次从 `START_YEAR` 起全量重爬。
+本模块根据 `history_data` 表中已有的覆盖情况（每个城市每月的天数、最大日期）
+以及爬取台账，只安排以下城市月份：
+
+- 当前月份（数据仍在更新）
+- 已有数据但天数不全的月份
+- 完全没有数据的月份（缺口或尚未爬取的新月份）
+
+`python -m src.main history --plan` 输出计划与预计请求数（不发起请求）；
+`python -m src.main history --incremental` 按计划爬取。
+"""
+
+import calendar
+import sqlite3
+from collections import namedtuple
+from datetime import datetime
+
+from config.settings import DATABASE_PATH, START_YEAR, END_YEAR
+from src.data_processing.storage import _get_conn
+
+PlanItem = namedtuple("PlanItem", ["city_name", "city_pinyin", "month", "reason"])
+
+REASON_CURRENT = "当前月份"
+REASON_INCOMPLETE = "天数不全"
+REASON_MISSING = "缺失"
+
+
+def candidate_months(start_year=START_YEAR, end_year=END_YEAR, now=None):
+    """返回 [start_year-01, min(end_year-12, 当前月)] 范围内的全部月份（YYYYMM）。"""
+    now = now or datetime.now()
+    last = min(f"{end_year}12", now.strftime("%Y%m"))
+    months = []
+    for year in range(start_year, end_year + 1):
+        for month in range(1, 13):
+            ym = f"{year}{month:02d}"
+            if ym > last:
+                return months
+            months.append(ym)
+    return months
+
+
+def load_coverage(db_path: str = DATABASE_PATH) -> dict:
+    """读取 `history_data` 的覆盖情况：{(城市, YYYYMM): (天数, 最大日期)}。
+
+    表不存在时返回空字典。
+    """
+    sql = (
+        'SELECT "城市", substr("日期", 1, 4) || substr("日期", 6, 2) AS ym, '
+        'COUNT(DISTINCT "日期"), MAX("日期") '
+        'FROM "history_data" WHERE "日期" IS NOT NULL GROUP BY "城市", ym'
+    )
+    conn = _get_conn(db_path)
+    try:
+        rows = conn.execute(sql).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+    return {(city, ym): (int(days), max_date) for city, ym, days, max_date in rows}
+
+
+def plan_history_crawl(cities: dict, months: list, coverage: dict = None, completed: set = None, now=None) -> list:
+    """生成增量爬取计划。
+
+    参数:
+        cities: 与 `get_all_cities()` 相同结构的 {省份: [{"name", "pinyin"}]} 字典
+        months: 候选月份列表（YYYYMM）
+        coverage: `load_coverage()` 的结果，缺省时从数据库读取
+        completed: 爬取台账中状态为 done 的 (城市拼音, 月份) 集合，这些月份视为已完成
+    返回:
+        PlanItem 列表，顺序与串行爬取一致（省份 → 城市 → 月份）
+    """
+    coverage = load_coverage() if coverage is None else coverage
+    completed = completed or set()
+    current_month = (now or datetime.now()).strftime("%Y%m")
+
+    plan = []
+    for city_list in cities.values():
+        for city in city_list:
+            name, pinyin = city["name"], city["pinyin"]
+            for month in months:
+                if month >= current_month:
+                    plan.append(PlanItem(name, pinyin, month, REASON_CURRENT))
+                    continue
+                if (pinyin, month) in completed:
+                    continue
+                days, _ = coverage.get((name, month), (0, None))
+                expected = calendar.monthrange(int(month[:4]), int(month[4:]))[1]
+                if days == 0:
+                    plan.append(PlanItem(name, pinyin, month, REASON_MISSING))
+                elif days < expected:
+                    plan.append(PlanItem(name, pinyin, month, f"{REASON_INCOMPLETE}({days}/{expected}天)"))
+    return plan
+
+
+def plan_to_month_map(plan: list) -> dict:
+    """把计划转换为 {城市拼音: [月份, ...]}，供 `AQIHistoryCrawler` 使用。"""
+    month_map = {}
+    for item in plan:
+        month_map.setdefault(item.city_pinyin, []).append(item.month)
+    return month_map
+
+
+def print_plan(plan: list, total_units: int, coverage: dict = None):
+    """打印计划明细与预计请求数。"""
+    coverage = coverage or {}
+    print("🗓️ 历史数据增量爬取计划（dry-run，不发起请求）")
+    print("=" * 60)
+    by_city = {}
+    for item in plan:
+        by_city.setdefault(item.city_name, []).append(item)
+    for city_name, items in by_city.items():
+        covered = [ym for (c, ym) in coverage if c == city_name]
+        latest = max((coverage[(city_name, ym)][1] for ym in covered), default="无")
+        print(f"🌍 {city_name}（已有最大日期：{latest}）")
+        for i, item in enumerate(items):
+            branch = "└─" if i == len(items) - 1 else "├─"
+            print(f"   {branch} {item.month}  {item.reason}")
+    print("=" * 60)
+    print(f"📌 计划城市月份：{len(plan)} / 全量 {total_units}")
+    print(f"🌐 预计请求数：{len(plan)}（每个城市月份 1 次页面请求，不含失败重试）")
+
+
+__all__ = [
+    "PlanItem",
+    "candidate_months",
+    "load_coverage",
+    "plan_history_crawl",
+    "plan_to_month_map",
+    "print_plan",
+]
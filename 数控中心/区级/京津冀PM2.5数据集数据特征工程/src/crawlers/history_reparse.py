@@ -0,0 +1,130 @@
+"""从页面归档离线重建历史数据。
+
+`python -m src.main reparse [--months 202501,202502] [--workers N]`
+
+按数据包把归档页面分发到进程池解析（`history_parser.parse_history_page`），
+再在主进程中按 (年份, 城市) 重建 `RAW_DATA_DIR` 下的年度 CSV 与 `history_data` 表：
+归档中出现的 (城市, 月份) 整月替换，其余月份保持不变。整个过程不访问网络。
+"""
+
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from config.settings import RAW_DATA_DIR, DATABASE_PATH, SAVE_TO_SQLITE, HISTORY_ARCHIVE_DIR, REPARSE_WORKERS
+from src.crawlers.history_parser import parse_history_page
+from src.crawlers.page_archive import PageArchive
+from src.data_processing.db_pool import writer
+from src.data_processing.schema import ensure_indexes
+from src.data_processing.storage import _prepare_insert, iter_rows, save_to_lake
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _parse_pack(pack_path, units):
+    """子进程任务：顺序读取一个数据包中的页面并解析。
+
+    `units` 为 (城市名, 月份, 偏移, 长度) 列表；返回 (DataFrame 列表, 解析失败的单元列表)。
+    """
+    frames = []
+    failed = []
+    with open(pack_path, "rb") as f:
+        for city_name, month, offset, length in units:
+            f.seek(offset)
+            html = zlib.decompress(f.read(length)).decode("utf-8")
+            df = parse_history_page(html, city_name, month)
+            if df is None or df.empty:
+                failed.append((city_name, month))
+            else:
+                frames.append(df)
+    return frames, failed
+
+
+def _replace_months_in_csv(df, file_path):
+    """把年度 CSV 中 df 覆盖到的月份整月替换为 df 的内容。"""
+    months = set(df["日期"].astype(str).str[:7])
+    if os.path.exists(file_path):
+        existing = pd.read_csv(file_path, dtype=str, encoding="utf-8-sig")
+        if "日期" in existing.columns:
+            existing = existing[~existing["日期"].astype(str).str[:7].isin(months)]
+        df = pd.concat([existing, df], ignore_index=True)
+    df = df.sort_values("日期", kind="stable")
+    df.to_csv(file_path, index=False, encoding="utf-8-sig")
+    return len(df)
+
+
+def _replace_months_in_db(df, city, db_path=DATABASE_PATH):
+    """在一个写事务中删除 `history_data` 中该城市对应月份的旧行并写入重解析结果，返回写入行数。
+
+    任一步失败时整体回滚，保留原有数据。
+    """
+    with writer(db_path) as conn:
+        # 先建表（表不存在时）并规范化，删除的月份按规范化后的日期计算
+        insert_sql, df = _prepare_insert(conn, "history_data", df)
+        months = sorted(set(df["日期"].dropna().astype(str).str[:7]))
+        conn.executemany(
+            'DELETE FROM "history_data" WHERE "城市" = ? AND substr("日期", 1, 7) = ?',
+            [(city, ym) for ym in months],
+        )
+        conn.executemany(insert_sql, iter_rows(df))
+        ensure_indexes(conn, ["history_data"])
+    return len(df)
+
+
+def reparse_history(months=None, workers=None, archive_dir=HISTORY_ARCHIVE_DIR,
+                    raw_dir=RAW_DATA_DIR, db_path=DATABASE_PATH):
+    """从归档重建历史数据，返回重建的行数。"""
+    start = time.time()
+    archive = PageArchive(archive_dir)
+    try:
+        entries = archive.entries(months)
+    finally:
+        archive.close()
+    if not entries:
+        logger.warning("📦 归档中没有可重解析的页面")
+        return 0
+
+    # 按数据包分组，每个数据包一个进程任务（顺序读文件）
+    by_pack = {}
+    for _, city_name, month, pack_path, offset, length in entries:
+        by_pack.setdefault(pack_path, []).append((city_name, month, offset, length))
+    workers = workers or REPARSE_WORKERS or os.cpu_count() or 1
+    logger.info(f"📦 开始重解析：{len(entries)} 个页面，{len(by_pack)} 个数据包，{workers} 个进程")
+
+    frames = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_parse_pack, pack_path, units) for pack_path, units in sorted(by_pack.items())]
+        for future in futures:
+            pack_frames, pack_failed = future.result()
+            frames.extend(pack_frames)
+            failed.extend(pack_failed)
+    parse_time = time.time() - start
+    for city_name, month in failed:
+        logger.warning(f"⚠️ {city_name}{month}归档页面未解析到有效数据，保留原有数据")
+    if not frames:
+        return 0
+
+    combined = pd.concat(frames, ignore_index=True)
+    for (year, city), df in combined.groupby(["年份", "城市"], sort=True):
+        file_path = os.path.join(raw_dir, f"{year}_{city}_aqi_history.csv")
+        total = _replace_months_in_csv(df, file_path)
+        logger.info(f"💾 已重建 CSV：{file_path}（重解析 {len(df)} 行，共 {total} 行）")
+        if SAVE_TO_SQLITE:
+            try:
+                _replace_months_in_db(df, city, db_path=db_path)
+            except Exception as e:
+                logger.error(f"📁 重建 {city}{year} SQLite 数据失败（已回滚，保留原有数据）：{e}")
+        save_to_lake(df, "history_data")
+
+    logger.info(
+        f"✅ 重解析完成：{len(combined)} 行，解析耗时 {parse_time:.2f}秒，总耗时 {time.time() - start:.2f}秒"
+    )
+    return len(combined)
+
+
+__all__ = ["reparse_history"]
@@ -0,0 +1,119 @@
+"""历史页面原始归档。
+
+爬取到的月度页面在解析前先写入归档，之后修改列处理逻辑时可以用
+`python -m src.main reparse` 直接从归档重建数据，而不必重新爬取。
+
+存储结构（`HISTORY_ARCHIVE_DIR` 下）：
+- `YYYYMM.pack`：按月份追加写入的数据包，每条记录为一行 `"<sha1> <长度>\\n"` 头 + zlib 压缩的 UTF-8 页面；
+- `index.db`：SQLite 索引，`blobs` 表按内容 SHA1 记录所在数据包与偏移（相同内容只存一份），
+  `pages` 表记录每个 (城市拼音, 月份) 最近一次爬取到的页面。
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+from config.settings import HISTORY_ARCHIVE_DIR
+
+
+def read_page(pack_path, offset, length):
+    """从数据包读取一条页面记录并解压为文本（可在子进程中调用）。"""
+    with open(pack_path, "rb") as f:
+        f.seek(offset)
+        return zlib.decompress(f.read(length)).decode("utf-8")
+
+
+class PageArchive:
+    """内容寻址、按月分包的页面归档（线程安全）。"""
+
+    def __init__(self, archive_dir=HISTORY_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(archive_dir, "index.db"), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha1 TEXT PRIMARY KEY, pack TEXT NOT NULL, offset INTEGER NOT NULL, "
+                "length INTEGER NOT NULL, raw_size INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "city_pinyin TEXT NOT NULL, month TEXT NOT NULL, city_name TEXT, url TEXT, "
+                "sha1 TEXT NOT NULL, fetched_at TEXT, PRIMARY KEY (city_pinyin, month))"
+            )
+
+    def pack_path(self, pack):
+        return os.path.join(self.archive_dir, pack)
+
+    def put(self, city_pinyin, city_name, month, url, html):
+        """归档一个页面，返回内容 SHA1；内容已存在时只更新 `pages` 索引。"""
+        raw = html.encode("utf-8")
+        sha1 = hashlib.sha1(raw).hexdigest()
+        fetched_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self._conn:
+            exists = self._conn.execute("SELECT 1 FROM blobs WHERE sha1 = ?", (sha1,)).fetchone()
+            if not exists:
+                blob = zlib.compress(raw, 9)
+                pack = f"{month}.pack"
+                with open(self.pack_path(pack), "ab") as f:
+                    f.write(f"{sha1} {len(blob)}\n".encode("ascii"))
+                    offset = f.tell()
+                    f.write(blob)
+                self._conn.execute(
+                    "INSERT INTO blobs (sha1, pack, offset, length, raw_size) VALUES (?, ?, ?, ?, ?)",
+                    (sha1, pack, offset, len(blob), len(raw)),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (city_pinyin, month, city_name, url, sha1, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (city_pinyin, month, city_name, url, sha1, fetched_at),
+            )
+        return sha1
+
+    def get(self, city_pinyin, month):
+        """读取 (城市拼音, 月份) 最近一次归档的页面文本，不存在返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.pack, b.offset, b.length FROM pages p JOIN blobs b ON p.sha1 = b.sha1 "
+                "WHERE p.city_pinyin = ? AND p.month = ?",
+                (city_pinyin, month),
+            ).fetchone()
+        if row is None:
+            return None
+        pack, offset, length = row
+        return read_page(self.pack_path(pack), offset, length)
+
+    def months(self):
+        """返回归档中已有页面的月份列表（升序）。"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT month FROM pages ORDER BY month").fetchall()
+        return [row[0] for row in rows]
+
+    def entries(self, months=None):
+        """返回页面索引列表：(城市拼音, 城市名, 月份, 数据包路径, 偏移, 长度)。"""
+        sql = (
+            "SELECT p.city_pinyin, p.city_name, p.month, b.pack, b.offset, b.length "
+            "FROM pages p JOIN blobs b ON p.sha1 = b.sha1"
+        )
+        params = []
+        if months:
+            sql += f" WHERE p.month IN ({', '.join('?' for _ in months)})"
+            params = list(months)
+        sql += " ORDER BY p.month, b.pack, b.offset"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            (pinyin, name, month, self.pack_path(pack), offset, length)
+            for pinyin, name, month, pack, offset, length in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+__all__ = ["PageArchive", "read_page"]
@@ -0,0 +1,134 @@
+"""实时接口 JSON 解码。
+
+把 `AQIRealtimeCrawler.crawl_city_realtime` 中逐条解析 JSON 的逻辑改为列式处理：
+
+- `pd.DataFrame.from_records` 一次性构造原始表，一轮采集的全部城市合并后只解码一次
+  （`decode_realtime_payloads`），分摊 pandas 的单次调用开销；
+- 数值字段用向量化的 `pd.to_numeric(errors="coerce")` 转换（"—"、空串、"None" 均为 NaN）；
+- `TimePointStr`（如 "02日20时"）用 `str.extract` 一次解析出日与小时；
+- 跨月只在整批层面判断一次：日大于当前日的记录属于上个月（本月 1 日采集到上月 31 日的数据）。
+
+`decode_realtime_records_loop` 保留逐条实现作为对照，
+`scripts/bench_realtime_decoder.py` 在录制的接口数据上校验两者输出一致并对比耗时。
+"""
+
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# 与 crawl_city_realtime 输出一致的列顺序
+REALTIME_COLUMNS = [
+    "城市", "日期", "小时", "AQI", "空气质量等级", "PM2.5", "PM10",
+    "SO₂", "NO₂", "CO", "O₃", "首要污染物", "健康建议", "措施建议", "采集时间",
+]
+# 输出列 -> 接口字段
+NUMERIC_FIELDS = {
+    "AQI": "AQI", "PM2.5": "PM2_5", "PM10": "PM10", "SO₂": "SO2",
+    "NO₂": "NO2", "CO": "CO", "O₃": "O3",
+}
+TEXT_FIELDS = {
+    "空气质量等级": "Quality", "首要污染物": "PrimaryPollutant",
+    "健康建议": "Unheathful", "措施建议": "Measure",
+}
+_TIMEPOINT_RE = re.compile(r"(\d{2})日(\d{2})时")
+
+
+def _month_prefixes(now):
+    """返回 (本月前缀, 上月前缀)，形如 "2025-12-"。"""
+    previous = now.replace(day=1) - timedelta(days=1)
+    return f"{now.year}-{now.month:02d}-", f"{previous.year}-{previous.month:02d}-"
+
+
+def decode_realtime_payloads(payloads, collected_at=None, now=None):
+    """把一轮采集中各城市的接口返回一次性解码为 DataFrame（列见 `REALTIME_COLUMNS`）。
+
+    `payloads` 为 {城市名: 记录列表}，结果按城市顺序、城市内按接口顺序排列。
+    `collected_at` 为写入"采集时间"列的字符串，缺省取 `now`；`now` 缺省为当前时间，
+    用于补全年月与跨月判断。无有效记录时返回只有表头的空 DataFrame。
+    """
+    now = now or datetime.now()
+    collected_at = collected_at or now.strftime("%Y-%m-%d %H:%M:%S")
+    cities = []
+    records = []
+    for city_name, city_records in payloads.items():
+        records.extend(city_records)
+        cities.extend([city_name] * len(city_records))
+    if not records:
+        return pd.DataFrame(columns=REALTIME_COLUMNS)
+    raw = pd.DataFrame.from_records(records)
+    if "TimePointStr" not in raw.columns:
+        return pd.DataFrame(columns=REALTIME_COLUMNS)
+
+    parts = raw["TimePointStr"].astype(object).str.extract(r"^(\d{2})日(\d{2})时")
+    valid = parts[0].notna().to_numpy()
+    if not valid.any():
+        return pd.DataFrame(columns=REALTIME_COLUMNS)
+    raw = raw[valid]
+    days = parts[0].to_numpy(dtype=object)[valid]
+    current_prefix, previous_prefix = _month_prefixes(now)
+    rolled = days.astype(int) > now.day
+
+    columns = {
+        "城市": np.asarray(cities, dtype=object)[valid],
+        "日期": np.where(rolled, previous_prefix, current_prefix) + days.astype(str),
+        "小时": parts[1].to_numpy(dtype=object)[valid],
+    }
+    # 数值字段整块转换："—"、空串、"None" 等无法解析的值在 coerce 下为 NaN
+    for col, field in NUMERIC_FIELDS.items():
+        values = raw[field].to_numpy(dtype=object) if field in raw.columns else np.full(len(raw), None, dtype=object)
+        columns[col] = pd.to_numeric(values, errors="coerce").astype(float)
+    for col, field in TEXT_FIELDS.items():
+        values = raw[field].fillna("").astype(str) if field in raw.columns else pd.Series("", index=raw.index)
+        if field == "PrimaryPollutant":
+            values = values.str.replace("—", "", regex=False)
+        columns[col] = values.str.strip().to_numpy(dtype=object)
+    columns["采集时间"] = np.full(len(raw), collected_at, dtype=object)
+    return pd.DataFrame(columns, columns=REALTIME_COLUMNS)
+
+
+def decode_realtime_records(records, city_name, collected_at=None, now=None):
+    """解码单个城市的接口返回，参数与返回值同 `decode_realtime_payloads`。"""
+    return decode_realtime_payloads({city_name: records}, collected_at=collected_at, now=now)
+
+
+def decode_realtime_records_loop(records, city_name, collected_at=None, now=None):
+    """逐条解码的对照实现（与原 crawl_city_realtime 的循环一致，跨月规则同上）。"""
+    now = now or datetime.now()
+    collected_at = collected_at or now.strftime("%Y-%m-%d %H:%M:%S")
+    current_prefix, previous_prefix = _month_prefixes(now)
+
+    def parse_numeric(value):
+        if value in ["—", "", "None", None]:
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    rows = []
+    for item in records:
+        match = _TIMEPOINT_RE.match(item.get("TimePointStr") or "")
+        if not match:
+            continue
+        day, hour = match.groups()
+        prefix = previous_prefix if int(day) > now.day else current_prefix
+        row = {"城市": city_name, "日期": f"{prefix}{day}", "小时": hour}
+        for col, field in NUMERIC_FIELDS.items():
+            row[col] = parse_numeric(item.get(field))
+        for col, field in TEXT_FIELDS.items():
+            value = item.get(field)
+            text = "" if value is None else str(value)
+            if field == "PrimaryPollutant":
+                text = text.replace("—", "")
+            row[col] = text.strip()
+        row["采集时间"] = collected_at
+        rows.append(row)
+    df = pd.DataFrame(rows, columns=REALTIME_COLUMNS)
+    for col in NUMERIC_FIELDS:
+        df[col] = df[col].astype(float)
+    return df
+
+
+__all__ = ["decode_realtime_payloads", "decode_realtime_records", "decode_realtime_records_loop", "REALTIME_COLUMNS"]
@@ -0,0 +1,114 @@
+"""实时数据已存键索引。
+
+实时接口每次返回每个城市最近约 24 小时的数据，相邻两轮采集约 23 小时重叠。
+本模块在 SQLite（默认与业务数据同库 `aqi_database.db`）中维护 `realtime_index` 表，
+以 (城市, 日期, 小时) 为主键记录已落盘的小时，`AQIRealtimeCrawler` 每轮只保存新增的小时。
+
+索引为空时自动从已有数据初始化：优先读取 `realtime_data` 表，表不存在时扫描
+`NEWRAW_DATA_DIR` 下的 `realtime_*.csv`。
+
+只有数据确认落盘后才能写入索引，否则这些小时以后都会被 `filter_new` 过滤掉：
+`add(df, conn)` 可在写入 `realtime_data` 的同一个写事务中记录键，两者一起提交或一起回滚。
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from glob import glob
+
+import pandas as pd
+
+from config.settings import DATABASE_PATH, NEWRAW_DATA_DIR
+from src.data_processing.db_pool import reader, writer
+
+INDEX_TABLE = "realtime_index"
+KEY_COLS = ["城市", "日期", "小时"]
+
+
+def normalize_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """返回规范化后的键列：日期取 YYYY-MM-DD，小时统一为两位字符串（CSV/数据库中可能是整数）。"""
+    keys = pd.DataFrame(index=df.index)
+    keys["城市"] = df["城市"].astype(str)
+    keys["日期"] = df["日期"].astype(str).str[:10]
+    hours = pd.to_numeric(df["小时"], errors="coerce")
+    keys["小时"] = hours.map(lambda h: f"{int(h):02d}" if pd.notna(h) else "")
+    return keys
+
+
+class RealtimeKeyIndex:
+    """(城市, 日期, 小时) 粒度的实时数据落盘索引。"""
+
+    def __init__(self, db_path: str = DATABASE_PATH, csv_dir: str = NEWRAW_DATA_DIR):
+        self.db_path = db_path
+        self.csv_dir = csv_dir
+        with writer(db_path) as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{INDEX_TABLE}" ('
+                '"城市" TEXT NOT NULL, "日期" TEXT NOT NULL, "小时" TEXT NOT NULL, '
+                'saved_at TEXT, PRIMARY KEY ("城市", "日期", "小时"))'
+            )
+            empty = conn.execute(f'SELECT 1 FROM "{INDEX_TABLE}" LIMIT 1').fetchone() is None
+        if empty:
+            self.seed()
+
+    def seed(self) -> int:
+        """从 `realtime_data` 表（或 Newraw CSV）初始化索引，返回写入的键数量。"""
+        with reader(self.db_path) as conn:
+            try:
+                existing = pd.read_sql_query('SELECT DISTINCT "城市", "日期", "小时" FROM "realtime_data"', conn)
+            except (sqlite3.OperationalError, pd.errors.DatabaseError):
+                existing = None
+        if existing is None:
+            existing = self._keys_from_csv()
+        if existing.empty:
+            return 0
+        return self.add(existing)
+
+    def _keys_from_csv(self) -> pd.DataFrame:
+        frames = []
+        for path in sorted(glob(os.path.join(self.csv_dir, "realtime_*.csv"))):
+            try:
+                frames.append(pd.read_csv(path, usecols=KEY_COLS, dtype=str, encoding="utf-8-sig"))
+            except (ValueError, UnicodeDecodeError):
+                continue  # 列不全或编码异常的文件不参与初始化
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=KEY_COLS)
+
+    def filter_new(self, df: pd.DataFrame) -> pd.DataFrame:
+        """返回 df 中尚未落盘的行（同一批内重复的键只保留首行）。"""
+        if df is None or df.empty:
+            return df
+        keys = normalize_keys(df)
+        cities = sorted(keys["城市"].unique())
+        dates = sorted(keys["日期"].unique())
+        with reader(self.db_path) as conn:
+            rows = conn.execute(
+                f'SELECT "城市", "日期", "小时" FROM "{INDEX_TABLE}" '
+                f'WHERE "城市" IN ({", ".join("?" for _ in cities)}) '
+                f'AND "日期" IN ({", ".join("?" for _ in dates)})',
+                cities + dates,
+            ).fetchall()
+        stored = set(rows)
+        key_tuples = pd.Series(list(zip(keys["城市"], keys["日期"], keys["小时"])), index=df.index)
+        mask = ~key_tuples.isin(stored) & ~key_tuples.duplicated()
+        return df[mask]
+
+    def add(self, df: pd.DataFrame, conn=None) -> int:
+        """把 df 中的键写入索引（已存在的键忽略），返回尝试写入的键数量。
+
+        传入 `conn`（`db_pool.writer` 的连接）时在调用方的事务中写入，随数据一起提交。
+        """
+        if df is None or df.empty:
+            return 0
+        if conn is None:
+            with writer(self.db_path) as conn:
+                return self.add(df, conn)
+        keys = normalize_keys(df).drop_duplicates()
+        saved_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.executemany(
+            f'INSERT OR IGNORE INTO "{INDEX_TABLE}" ("城市", "日期", "小时", saved_at) VALUES (?, ?, ?, ?)',
+            [(c, d, h, saved_at) for c, d, h in keys.itertuples(index=False, name=None)],
+        )
+        return len(keys)
+
+
+__all__ = ["RealtimeKeyIndex", "normalize_keys"]
@@ -1,53 +1,142 @@
 import sys
+import threading
 import time
-from config.settings import REALTIME_CRAWL_INTERVAL
+from datetime import datetime, timedelta
+from config.settings import REALTIME_CRAWL_INTERVAL, REALTIME_SCHEDULE_OFFSET
 
 
-def run_scheduled_realtime():
-    """定时运行实时数据爬取（每小时一次，使用配置中的间隔时间）"""
-    print(f"🚀 开始定时实时爬取（间隔 {REALTIME_CRAWL_INTERVAL/3600} 小时）...")
-    print("⚠️  按 Ctrl+C 停止")
-    try: 
-        while True:
-           # 执行实时爬取
-            print(f"\n📊 开始执行实时数据爬取 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            # 直接调用爬虫逻辑，避免循环导入
-            try:
-                from src.crawlers.aqi_realtime import AQIRealtimeCrawler
-                crawler = AQIRealtimeCrawler()
-                crawler.crawl_realtime_batch()
-            except Exception as e:
-                print(f"无法执行实时爬取：{e}")
-                return
-            
+class RealtimeScheduler:
+    """常驻的实时数据采集调度器。
+
+    - 按固定时间网格运行：每天 0 点起每隔 `interval` 秒一个时段，时段内偏移 `offset` 秒
+      （默认每小时 :05），下一次运行时间始终由网格计算，不随单次耗时漂移；
+    - 整个进程只创建一个 `AQIRealtimeCrawler`，城市编码与连接池在各轮之间复用；
+    - 采集在后台线程中执行：到点时上一轮仍未结束则不重叠启动，记为错过；
+    - 补采：启动时立即采集一次；错过的时段（采集过慢、系统休眠等）合并为一次补采，
+      接口本身返回最近 24 小时数据，一次补采即可覆盖多个错过的小时。
+    """
+
+    def __init__(self, interval=REALTIME_CRAWL_INTERVAL, offset=REALTIME_SCHEDULE_OFFSET, crawler=None,
+                 show_countdown=True):
+        self.interval = int(interval)
+        self.offset = int(offset) % self.interval
+        self.show_countdown = show_countdown
+        if crawler is None:
+            # 延迟导入，避免循环导入
+            from src.crawlers.aqi_realtime import AQIRealtimeCrawler
+            crawler = AQIRealtimeCrawler()
+        self.crawler = crawler
+        self._run_lock = threading.Lock()
+        self._worker = None
+        self._catchup_pending = False
+        self.runs = 0
+        self.missed_slots = 0
+
+    def next_run_after(self, now):
+        """返回严格晚于 `now` 的下一个时段起点（datetime）。"""
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        elapsed = (now - day_start).total_seconds() - self.offset
+        slot = int(elapsed // self.interval) + 1
+        return day_start + timedelta(seconds=self.offset + slot * self.interval)
+
+    def _job(self, label):
+        try:
+            print(f"\n📊 开始执行实时数据爬取（{label}） - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            self.crawler.crawl_realtime_batch()
+            self.runs += 1
             print(f"✅ 爬取完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            # 可视化倒计时休眠
-            print(f"\n⏳ 开始休眠 {REALTIME_CRAWL_INTERVAL/3600} 小时，剩余时间：")
-            for remaining in range(REALTIME_CRAWL_INTERVAL, 0, -1):
-                # 计算时分秒
-                hours = remaining // 3600
-                minutes = (remaining % 3600) // 60
-                seconds = remaining % 60
+        except Exception as e:
+            print(f"❌ 实时爬取失败：{e}")
+        finally:
+            self._run_lock.release()
+
+    def trigger(self, label):
+        """在后台线程启动一轮采集；上一轮尚未结束时不重叠启动，返回是否已启动。"""
+        if not self._run_lock.acquire(blocking=False):
+            self.missed_slots += 1
+            self._catchup_pending = True
+            print(f"\n⚠️ 上一轮采集仍在进行，跳过时段（{label}），结束后补采")
+            return False
+        # 每轮采集都会拿到最近 24 小时数据，已挂起的补采随之完成
+        self._catchup_pending = False
+        self._worker = threading.Thread(target=self._job, args=(label,), name="realtime-job", daemon=True)
+        self._worker.start()
+        return True
+
+    def _maybe_catch_up(self):
+        """上一轮结束后，若期间有被跳过的时段，合并为一次补采。"""
+        if self._catchup_pending and not self._run_lock.locked():
+            self.trigger("补采")
+
+    def _wait_until(self, target):
+        """等待到 `target`（每秒检查一次，便于 Ctrl+C 与处理补采）。"""
+        while True:
+            remaining = (target - datetime.now()).total_seconds()
+            if remaining <= 0:
+                break
+            self._maybe_catch_up()
+            if self.show_countdown and not self._run_lock.locked():
+                hours, rest = divmod(int(remaining), 3600)
+                minutes, seconds = divmod(rest, 60)
                 # 格式化输出（覆盖当前行）
-                sys.stdout.write(f"\r    {hours:02d}:{minutes:02d}:{seconds:02d}")
+                sys.stdout.write(f"\r⏳ 距下次采集（{target.strftime('%H:%M:%S')}）：{hours:02d}:{minutes:02d}:{seconds:02d}")
                 sys.stdout.flush()
-                time.sleep(1)
-            
-            # 休眠结束后清空倒计时行
-            sys.stdout.write("\r" + " " * 20 + "\r")  # 清空倒计时显示
+            time.sleep(min(1.0, remaining))
+        if self.show_countdown:
+            sys.stdout.write("\r" + " " * 40 + "\r")  # 清空倒计时显示
             sys.stdout.flush()
-            print("\n🔄 休眠结束，准备下一次爬取...")
+
+    def run_forever(self, run_on_start=True, max_runs=None):
+        """按时段循环采集，直到 Ctrl+C（或达到 `max_runs` 次触发）。"""
+        triggered = 0
+        if run_on_start:
+            self.trigger("启动补采")
+            triggered += 1
+        next_at = self.next_run_after(datetime.now())
+        while max_runs is None or triggered < max_runs:
+            self._wait_until(next_at)
+            now = datetime.now()
+            # 系统休眠或时钟跳变导致跨过多个时段时，只补采一次
+            skipped = int((now - next_at).total_seconds() // self.interval)
+            if skipped > 0:
+                self.missed_slots += skipped
+                print(f"\n⚠️ 检测到错过 {skipped} 个时段，合并为一次采集")
+            self.trigger(next_at.strftime("%Y-%m-%d %H:%M"))
+            triggered += 1
+            next_at = self.next_run_after(now)
+        self._drain()
+
+    def _drain(self):
+        """等待进行中的采集（及其补采）结束。"""
+        while True:
+            if self._worker is not None:
+                self._worker.join()
+            if not self._catchup_pending:
+                return
+            self._maybe_catch_up()
+
+
+def run_scheduled_realtime():
+    """定时运行实时数据爬取（按配置的时段网格，默认每小时 :05 采集）"""
+    minutes, seconds = divmod(REALTIME_SCHEDULE_OFFSET, 60)
+    print(f"🚀 开始定时实时爬取（间隔 {REALTIME_CRAWL_INTERVAL/3600} 小时，每个时段第 {minutes:02d}:{seconds:02d} 开始）...")
+    print("⚠️  按 Ctrl+C 停止")
+    try:
+        scheduler = RealtimeScheduler()
+    except Exception as e:
+        print(f"无法执行实时爬取：{e}")
+        return
+    try:
+        scheduler.run_forever()
     except KeyboardInterrupt:
         # 捕获终止信号，优雅退出
-        sys.stdout.write("\r" + " " * 20 + "\r")  # 清空倒计时
+        sys.stdout.write("\r" + " " * 40 + "\r")  # 清空倒计时
         sys.stdout.flush()
         print("\n🛑 定时任务已手动停止")
     except Exception as e:
-        sys.stdout.write("\r" + " " * 20 + "\r")
+        sys.stdout.write("\r" + " " * 40 + "\r")
         sys.stdout.flush()
         print(f"\n❌ 定时任务异常终止：{str(e)}")
 
 
-__all__ = ["run_scheduled_realtime"]
\ No newline at end of file
+__all__ = ["RealtimeScheduler", "run_scheduled_realtime"]
@@ -0,0 +1,276 @@
+"""爬取结果的流式写入。
+
+`StreamingBatchWriter` 在后台线程中消费一个有界队列，把爬虫解析出的 DataFrame
+逐块追加到按 (年份, 城市) 划分的 CSV（`<年份>_<城市>_aqi_history.csv`），并通过连接池的写连接
+（`db_pool.writer`，每个提交批次取用一次）分批事务写入 SQLite，
+取代原先"攒满一批 → concat → 逐组重写 CSV、逐组新建数据库连接"的做法：
+
+- 爬虫线程只负责 `submit`，不等待磁盘；队列满时 `submit` 阻塞，内存占用与在途月份数无关；
+- 每个文件在内存中维护已写入的日期集合，重复日期的行不再写入 CSV 与 SQLite；
+- `merge_existing=False` 时本次运行首次写入某个文件会覆盖旧文件（与原先整批重写一致），
+  `merge_existing=True`（续爬/增量）时保留旧文件并只追加其中没有的日期，
+  追加的日期早于文件已有日期时在 `close()` 时按日期重排一次；
+- SQLite 累计 `commit_rows` 行或队列暂时为空时提交一次事务，提交后才调用 `on_written(units)`
+  （如写入断点台账），保证台账记录的单元都已落盘；本批任一次写入或提交失败时整批回滚，
+  并以 `on_written(units, failed=True)` 回调，由调用方记为失败，续爬时重新爬取；
+- 续爬时重新爬取的日期即使已在 CSV 中也会再次 UPSERT 进 SQLite（本次运行内只写一次），
+  以补上此前写库失败的月份。
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+
+from config.settings import RAW_DATA_DIR, DATABASE_PATH, SAVE_TO_SQLITE
+from config.settings import HISTORY_WRITER_QUEUE_SIZE, HISTORY_WRITER_COMMIT_ROWS
+from src.data_processing.db_pool import writer
+from src.data_processing.schema import ensure_indexes
+from src.data_processing.storage import _prepare_insert, _ensure_dir, iter_rows, save_to_lake, logger
+from src.utils import metrics
+
+_STOP = object()
+
+
+class _FileState:
+    def __init__(self, path, dates, header_written, last_date):
+        self.path = path
+        self.dates = dates                    # 文件中已有的日期（字符串）
+        self.db_dates = set()                 # 本次运行已交给 SQLite 的日期
+        self.header_written = header_written  # 文件已存在且有表头时为 True
+        self.last_date = last_date            # 已写入的最大日期，用于判断是否需要重排
+        self.needs_sort = False
+
+
+class StreamingBatchWriter:
+    """后台线程 + 有界队列的 CSV / SQLite 流式写入器（可用作上下文管理器）。"""
+
+    def __init__(self, table_name: str = "history_data", raw_dir: str = RAW_DATA_DIR,
+                 db_path: str = DATABASE_PATH, save_sqlite: bool = SAVE_TO_SQLITE,
+                 merge_existing: bool = False, on_written: Optional[Callable] = None, crawler: str = "history",
+                 queue_size: int = HISTORY_WRITER_QUEUE_SIZE, commit_rows: int = HISTORY_WRITER_COMMIT_ROWS):
+        self.table_name = table_name
+        self.raw_dir = raw_dir
+        self.db_path = db_path
+        self.save_sqlite = save_sqlite
+        self.merge_existing = merge_existing
+        self.on_written = on_written
+        self.crawler = crawler  # 指标标签
+        self.commit_rows = max(1, int(commit_rows))
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread = None
+        self._batch = None  # 当前提交批次持有的 db_pool.writer() 上下文
+        self._conn = None
+        self._files = {}
+        self._pending_units = []   # 已写入 CSV、等待 SQLite 提交后回调的单元
+        self._pending_rows = 0
+        self._batch_failed = False  # 当前事务中有写入失败，提交时整批回滚
+        self.csv_rows = 0
+        self.db_rows = 0
+        self.skipped_rows = 0
+        self.commits = 0
+        self.peak_queue = 0
+        self.errors = 0
+
+    # ---- 生产者接口 ----
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, frames, units=None):
+        """提交一组 DataFrame（通常为一个城市的若干月份，按月份顺序）及其对应的台账单元。
+
+        队列已满时阻塞，直到写入线程腾出空间。
+        """
+        frames = [df for df in (frames or []) if df is not None and not df.empty]
+        if not frames and not units:
+            return
+        self.start()
+        self._queue.put((frames, list(units or [])))
+        self.peak_queue = max(self.peak_queue, self._queue.qsize())
+
+    def close(self):
+        """等待队列写完、提交剩余事务、重排需要排序的文件并关闭数据库连接。"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ---- 写入线程 ----
+    def _run(self):
+        start = time.time()
+        try:
+            while True:
+                try:
+                    item = self._queue.get(block=False)
+                except queue.Empty:
+                    # 队列暂时为空：先提交已写入的行，再阻塞等待
+                    self._commit()
+                    item = self._queue.get()
+                if item is _STOP:
+                    break
+                with metrics.SAVE_SECONDS.time(crawler=self.crawler):
+                    self._write_item(*item)
+                    if self._pending_rows >= self.commit_rows:
+                        self._commit()
+            self._commit()
+            self._sort_files()
+            if self.db_rows:
+                with writer(self.db_path) as conn:
+                    ensure_indexes(conn, [self.table_name])
+        finally:
+            if self._batch is not None:
+                self._finish_batch(failed=True)  # 异常退出：回滚未提交的批次并释放写连接
+        logger.info(
+            f">>>📁 流式写入完成✅ CSV {self.csv_rows} 行（{len(self._files)} 个文件），"
+            f"SQLite {self.db_rows} 行（提交 {self.commits} 次），跳过重复日期 {self.skipped_rows} 行，"
+            f"队列峰值 {self.peak_queue}，耗时 {time.time() - start:.2f}秒 💾"
+        )
+
+    def _write_item(self, frames, units):
+        written = []
+        try:
+            if frames:
+                combined = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+                for (year, city), df in combined.groupby(["年份", "城市"], sort=False):
+                    written.append(self._append_csv(year, city, df))
+        except Exception as e:
+            # CSV 未写成功的单元不记入台账，续爬时会重新爬取
+            self.errors += 1
+            logger.exception(f"📁 追加 CSV 失败：{e}")
+            return
+        for new_rows, db_rows in written:
+            if not db_rows.empty:
+                self._insert_sqlite(db_rows)
+            if not new_rows.empty:
+                save_to_lake(new_rows, self.table_name)
+        self._pending_units.extend(units)
+
+    def _file_state(self, year, city):
+        path = os.path.join(self.raw_dir, f"{year}_{city}_aqi_history.csv")
+        state = self._files.get(path)
+        if state is not None:
+            return state
+        if self.merge_existing and os.path.exists(path):
+            existing = pd.read_csv(path, dtype=str, encoding="utf-8-sig", usecols=lambda c: c == "日期")
+            dates = set(existing["日期"].dropna()) if "日期" in existing.columns else set()
+            state = _FileState(path, dates, True, max(dates) if dates else None)
+        else:
+            # 非续爬：本次运行首次写入时覆盖旧文件
+            _ensure_dir(path)
+            state = _FileState(path, set(), False, None)
+        self._files[path] = state
+        return state
+
+    def _append_csv(self, year, city, df):
+        """把 df 中文件尚未包含的日期追加到年度 CSV，返回 (实际写入 CSV 的行, 需写入 SQLite 的行)。"""
+        state = self._file_state(year, city)
+        db_df = df
+        if "日期" in df.columns:
+            dates = df["日期"].astype(str)
+            unique = ~dates.duplicated()
+            to_db = unique & ~dates.isin(state.db_dates)
+            db_df = df[to_db.to_numpy()]
+            state.db_dates.update(dates[to_db])
+            fresh = unique & ~dates.isin(state.dates)
+            self.skipped_rows += int((~fresh).sum())
+            df = df[fresh.to_numpy()]
+            if df.empty:
+                return df, db_df
+            new_dates = dates[fresh]
+            if state.last_date is not None and new_dates.min() < state.last_date:
+                state.needs_sort = True
+            state.dates.update(new_dates)
+            state.last_date = max(state.last_date or "", new_dates.max())
+        if state.header_written:
+            with open(state.path, "a", encoding="utf-8", newline="") as f:
+                df.to_csv(f, index=False, header=False)
+        else:
+            with open(state.path, "w", encoding="utf-8-sig", newline="") as f:
+                df.to_csv(f, index=False)
+            state.header_written = True
+        self.csv_rows += len(df)
+        metrics.ROWS_WRITTEN.inc(len(df), crawler=self.crawler, sink="csv")
+        return df, db_df
+
+    def _insert_sqlite(self, df):
+        if not self.save_sqlite or self._batch_failed:
+            return  # 本批已失败，提交时会整体回滚
+        try:
+            if self._batch is None:
+                # 每个提交批次取用一次连接池的写连接，提交或回滚后释放
+                batch = writer(self.db_path)
+                self._conn = batch.__enter__()
+                self._batch = batch
+            insert_sql, df = _prepare_insert(self._conn, self.table_name, df)
+            self._conn.executemany(insert_sql, iter_rows(df))
+            self._pending_rows += len(df)
+        except Exception as e:
+            self.errors += 1
+            self._batch_failed = True
+            logger.exception(f"📁 写入 SQLite 表 '{self.table_name}' 失败（CSV 已保存）：{e}")
+
+    def _finish_batch(self, failed):
+        """结束当前批次：成功时提交，失败时回滚，并释放写连接；返回是否已提交。"""
+        batch, self._batch, self._conn = self._batch, None, None
+        try:
+            if failed:
+                error = RuntimeError("批次写入失败")
+                batch.__exit__(type(error), error, None)  # 写连接在异常退出时回滚
+                return False
+            batch.__exit__(None, None, None)
+            return True
+        except Exception as e:
+            self.errors += 1
+            logger.exception(f"📁 提交 SQLite 事务失败：{e}")
+            return False
+
+    def _commit(self):
+        failed = self._batch_failed
+        if self._batch is not None:
+            if self._finish_batch(failed):
+                self.db_rows += self._pending_rows
+                self.commits += 1
+                metrics.ROWS_WRITTEN.inc(self._pending_rows, crawler=self.crawler, sink="sqlite")
+            else:
+                failed = True
+                logger.error(f"📁 本批 {len(self._pending_units)} 个单元未写入 SQLite，已回滚，记为失败")
+            self._pending_rows = 0
+        self._batch_failed = False
+        if self._pending_units and self.on_written is not None:
+            units, self._pending_units = self._pending_units, []
+            try:
+                if failed:
+                    self.on_written(units, failed=True)
+                else:
+                    self.on_written(units)
+            except Exception as e:
+                logger.exception(f"📒 写入完成回调失败：{e}")
+        else:
+            self._pending_units = []
+
+    def _sort_files(self):
+        """续爬时追加了较早的日期：按日期稳定排序后重写这些文件（每个文件一次）。"""
+        for state in self._files.values():
+            if not state.needs_sort:
+                continue
+            merged = pd.read_csv(state.path, dtype=str, encoding="utf-8-sig")
+            merged = merged.sort_values("日期", kind="stable")
+            merged.to_csv(state.path, index=False, encoding="utf-8-sig")
+            logger.info(f"💾 已按日期重排 CSV：{state.path}（共 {len(merged)} 行）")
+
+
+__all__ = ["StreamingBatchWriter"]
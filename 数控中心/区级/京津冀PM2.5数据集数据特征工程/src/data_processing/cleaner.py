@@ -6,7 +6,7 @@ import pandas as pd
 import logging
 
 from config.settings import PROCESSED_DATA_DIR, DATABASE_PATH, SAVE_TO_SQLITE, RAW_DATA_DIR, NEWRAW_DATA_DIR
-from src.data_processing.storage import save_to_sqlite
+from src.data_processing.storage import save_to_sqlite, save_to_lake
 
 # 使用与 storage 相同的日志记录器，写入仓库根目录的 db_operations.log
 logger = logging.getLogger("db_operations")
@@ -54,6 +54,8 @@ def _save_processed(df: pd.DataFrame, basename: str, table_name: str) -> None:
         logger.exception(f"写入数据库表 '{table_name}' 失败：{e}")
         print(f"写入数据库表 '{table_name}' 失败：{e}")
 
+    save_to_lake(df, table_name)
+
 
 def clean_realtime(df: pd.DataFrame, save_individual: bool = False) -> pd.DataFrame:
     """清洗实时数据，保留并规范化列：
@@ -6,6 +6,23 @@ from src.data_processing.cleaner import clean_history as _clean_history, clean_r
 from src.utils.logger import setup_logger
 
 
+def _merge_cleaned(frames: list, key_cols: list, logger) -> Optional[pd.DataFrame]:
+    """一次性合并各文件的清洗结果并按键去重（保留先出现的行），替代逐文件合并后反复去重。
+
+    `realtime_data` / `history_data` 靠声明的主键在写入时 UPSERT 去重，但合并结果写入的是带时间戳的
+    CSV 与推断建表（自增 id、无主键）的 `*_merged` 表，两者都没有写入时的键，这里的去重不能省略。
+    """
+    if not frames:
+        return None
+    merged = pd.concat(frames, ignore_index=True)
+    keys = [c for c in key_cols if c in merged.columns]
+    before = len(merged)
+    if keys:
+        merged = merged.drop_duplicates(subset=keys)
+    logger.info(f"合并 {len(frames)} 个清洗结果：共 {before} 行，按{'+'.join(keys)}去重减少 {before - len(merged)} 行")
+    return merged
+
+
 def run_clean_history(dir_path: str = None, merge_all: bool = True, log_file: str = None):
     """清洗历史数据：扫描 `data/Hisraw`（或指定目录）中的 CSV，逐文件调用 `clean_history` 并保存结果。
     
@@ -31,7 +48,7 @@ def run_clean_history(dir_path: str = None, merge_all: bool = True, log_file: st
     
     count = 0
     success_count = 0
-    all_cleaned_data = None
+    cleaned_frames = []
     
     for fname in os.listdir(dir_path):
         logger.info(f"发现文件：{fname}")
@@ -50,23 +67,17 @@ def run_clean_history(dir_path: str = None, merge_all: bool = True, log_file: st
             success_count += 1
             logger.info(f"清洗文件成功：{fpath}")
             
-            # 收集所有清洗后的数据
+            # 收集所有清洗后的数据（最后一次性合并）
             if merge_all and cleaned_df is not None and not cleaned_df.empty:
-                if all_cleaned_data is None:
-                    all_cleaned_data = cleaned_df.copy()
-                    logger.info(f"初始化合并数据集，当前数据量：{len(all_cleaned_data)} 行")
-                else:
-                    prev_count = len(all_cleaned_data)
-                    all_cleaned_data = pd.concat([all_cleaned_data, cleaned_df], ignore_index=True)
-                    # 去重
-                    all_cleaned_data = all_cleaned_data.drop_duplicates(subset=[c for c in ["城市", "日期"] if c in all_cleaned_data.columns])
-                    logger.info(f"合并数据：新增 {len(cleaned_df)} 行，合并后共 {len(all_cleaned_data)} 行，去重减少 {prev_count + len(cleaned_df) - len(all_cleaned_data)} 行")
+                cleaned_frames.append(cleaned_df)
+                logger.info(f"收集清洗结果：{len(cleaned_df)} 行")
                     
         except Exception as e:
             logger.error(f"清洗文件失败：{fpath} -> {e}")
             print(f"❌ 清洗文件失败：{fpath} -> {e}")
     
-    # 保存合并后的结果
+    # 保存合并后的结果：Hisraw 每个 (年份, 城市) 一个文件且写入时已按日期去重，合并后只需一次去重兜底
+    all_cleaned_data = _merge_cleaned(cleaned_frames, ["城市", "日期"], logger)
     if merge_all and all_cleaned_data is not None and not all_cleaned_data.empty:
         logger.info(f"开始合并 {success_count} 个文件的清洗结果，合并后共 {len(all_cleaned_data)} 行数据")
         print(f"📊 正在合并 {success_count} 个文件的清洗结果...")
@@ -108,7 +119,7 @@ def run_clean_realtime(dir_path: str = None, merge_all: bool = True, log_file: s
     
     count = 0
     success_count = 0
-    all_cleaned_data = None
+    cleaned_frames = []
     
     for fname in os.listdir(dir_path):
         logger.info(f"发现文件：{fname}")
@@ -126,27 +137,17 @@ def run_clean_realtime(dir_path: str = None, merge_all: bool = True, log_file: s
             success_count += 1
             logger.info(f"清洗文件成功：{fpath}")
             
-            # 收集所有清洗后的数据
+            # 收集所有清洗后的数据（最后一次性合并）
             if merge_all and cleaned_df is not None and not cleaned_df.empty:
-                if all_cleaned_data is None:
-                    all_cleaned_data = cleaned_df.copy()
-                    logger.info(f"初始化合并数据集，当前数据量：{len(all_cleaned_data)} 行")
-                else:
-                    prev_count = len(all_cleaned_data)
-                    all_cleaned_data = pd.concat([all_cleaned_data, cleaned_df], ignore_index=True)
-                    # 去重
-                    if "监测站点" in all_cleaned_data.columns:
-                        all_cleaned_data = all_cleaned_data.drop_duplicates(subset=[c for c in ["城市", "日期", "小时", "监测站点"] if c in all_cleaned_data.columns])
-                        logger.info(f"合并数据：新增 {len(cleaned_df)} 行，合并后共 {len(all_cleaned_data)} 行，去重减少 {prev_count + len(cleaned_df) - len(all_cleaned_data)} 行（按城市+日期+小时+监测站点去重）")
-                    else:
-                        all_cleaned_data = all_cleaned_data.drop_duplicates(subset=[c for c in ["城市", "日期", "小时"] if c in all_cleaned_data.columns])
-                        logger.info(f"合并数据：新增 {len(cleaned_df)} 行，合并后共 {len(all_cleaned_data)} 行，去重减少 {prev_count + len(cleaned_df) - len(all_cleaned_data)} 行（按城市+日期+小时去重）")
+                cleaned_frames.append(cleaned_df)
+                logger.info(f"收集清洗结果：{len(cleaned_df)} 行")
                     
         except Exception as e:
             logger.error(f"清洗文件失败：{fpath} -> {e}")
             print(f"❌ 清洗文件失败：{fpath} -> {e}")
     
-    # 保存合并后的结果
+    # 保存合并后的结果：相邻实时文件的小时可能重叠，合并后按键一次去重
+    all_cleaned_data = _merge_cleaned(cleaned_frames, ["城市", "日期", "小时", "监测站点"], logger)
     if merge_all and all_cleaned_data is not None and not all_cleaned_data.empty:
         logger.info(f"开始合并 {success_count} 个文件的清洗结果，合并后共 {len(all_cleaned_data)} 行数据")
         print(f"📊 正在合并 {success_count} 个文件的清洗结果...")
@@ -0,0 +1,188 @@
+"""SQLite 连接池。
+
+`storage` 模块的公开函数（`save_to_sqlite`、`query_sqlite`、`list_tables`、`table_info`、
+`view_db_table`）不再每次调用都检查目录、新建连接并重新设置 PRAGMA，而是复用本模块按数据库路径
+维护的进程级连接池：
+
+- 读连接：每个线程一个只读连接（`mode=ro`），线程内反复的小查询直接复用；
+- 写连接：全池唯一，由锁串行化（SQLite 同一时刻也只允许一个写事务），
+  `with pool.writer() as conn:` 正常退出时提交、异常时回滚，可重入；
+- 所有连接开启语句缓存（`cached_statements`），参数化查询重复执行时不必重新编译；
+- 子进程（fork）中首次使用时自动新建连接池，不复用父进程的连接；进程退出时关闭全部连接。
+
+用法：
+
+    from src.data_processing.db_pool import reader, writer
+
+    with reader() as conn:
+        conn.execute("SELECT COUNT(*) FROM history_data").fetchone()
+    with writer() as conn:
+        conn.execute("DELETE FROM realtime_data WHERE 日期 < ?", ("2024-01-01",))
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from config.settings import DATABASE_PATH, SQLITE_CACHED_STATEMENTS, SQLITE_BUSY_TIMEOUT
+from config.settings import SQLITE_CACHE_SIZE_KB, SQLITE_PAGE_SIZE, SQLITE_TEMP_STORE_MEMORY
+
+_DETECT_TYPES = sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+
+
+def _apply_pragmas(conn, statements):
+    for sql in statements:
+        try:
+            conn.execute(sql)
+        except sqlite3.Error:
+            pass
+
+
+def _tuning_pragmas():
+    pragmas = [f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)};"]
+    if SQLITE_TEMP_STORE_MEMORY:
+        pragmas.append("PRAGMA temp_store=MEMORY;")
+    return pragmas
+
+
+class ConnectionPool:
+    """单个数据库文件的连接池：线程内只读连接 + 一个加锁的写连接。"""
+
+    def __init__(self, db_path: str = DATABASE_PATH):
+        self.db_path = db_path
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()          # 保护 _readers / 写连接的创建
+        self._write_lock = threading.RLock()   # 串行化写事务（可重入）
+        self._write_depth = 0
+        self._writer = None
+        self._readers = []
+        self.reader_checkouts = 0
+        self.writer_checkouts = 0
+        self.writer_wait_seconds = 0.0
+
+    # ---- 连接创建 ----
+    def _connect(self, target, uri=False):
+        return sqlite3.connect(target, uri=uri, timeout=SQLITE_BUSY_TIMEOUT, detect_types=_DETECT_TYPES,
+                               cached_statements=SQLITE_CACHED_STATEMENTS, check_same_thread=False)
+
+    def _get_writer(self):
+        with self._lock:
+            if self._writer is None:
+                from src.data_processing.storage import _ensure_dir
+
+                _ensure_dir(self.db_path)
+                conn = self._connect(self.db_path)
+                # page_size 只对尚未建表的新库生效，须在其他写操作之前设置
+                _apply_pragmas(conn, [f"PRAGMA page_size={int(SQLITE_PAGE_SIZE)};",
+                                      "PRAGMA journal_mode=WAL;", "PRAGMA synchronous=NORMAL;",
+                                      "PRAGMA foreign_keys=ON;"] + _tuning_pragmas())
+                self._writer = conn
+            return self._writer
+
+    def _get_reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.db_path):
+                # 只读连接无法创建数据库文件，先由写连接建库
+                self._get_writer()
+            conn = self._connect(f"{Path(os.path.abspath(self.db_path)).as_uri()}?mode=ro", uri=True)
+            _apply_pragmas(conn, _tuning_pragmas())
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    # ---- 上下文管理接口 ----
+    @contextmanager
+    def reader(self):
+        """借出当前线程的只读连接（不关闭，退出时无需提交）。"""
+        self.reader_checkouts += 1
+        yield self._get_reader()
+
+    @contextmanager
+    def writer(self):
+        """独占写连接：最外层 `with` 正常退出时提交，出现异常时回滚。"""
+        start = time.perf_counter()
+        with self._write_lock:
+            self.writer_wait_seconds += time.perf_counter() - start
+            self.writer_checkouts += 1
+            conn = self._get_writer()
+            self._write_depth += 1
+            try:
+                yield conn
+                if self._write_depth == 1:
+                    conn.commit()
+            except BaseException:
+                if self._write_depth == 1:
+                    conn.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+
+    def stats(self):
+        """返回 {readers, reader_checkouts, writer_checkouts, writer_wait_seconds}。"""
+        with self._lock:
+            readers = len(self._readers)
+        return {"readers": readers, "reader_checkouts": self.reader_checkouts,
+                "writer_checkouts": self.writer_checkouts,
+                "writer_wait_seconds": round(self.writer_wait_seconds, 6)}
+
+    def close(self):
+        """关闭池中全部连接（之后再次使用会重新创建）。"""
+        with self._write_lock, self._lock:
+            conns = self._readers + ([self._writer] if self._writer is not None else [])
+            self._readers = []
+            self._writer = None
+            self._local = threading.local()
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DATABASE_PATH) -> ConnectionPool:
+    """返回 `db_path` 对应的进程级连接池（首次调用时创建；fork 出的子进程中重新创建）。"""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+def reader(db_path: str = DATABASE_PATH):
+    """`with reader() as conn:` —— 当前线程的只读连接。"""
+    return get_pool(db_path).reader()
+
+
+def writer(db_path: str = DATABASE_PATH):
+    """`with writer() as conn:` —— 独占写连接，退出时提交。"""
+    return get_pool(db_path).writer()
+
+
+def close_pools():
+    """关闭所有连接池（进程退出时自动调用）。"""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_pools)
+
+
+__all__ = ["ConnectionPool", "get_pool", "reader", "writer", "close_pools"]
@@ -0,0 +1,193 @@
+"""DuckDB 查询引擎（可选，用于按城市/月份聚合等分析类查询）。
+
+在一个进程内的 DuckDB 内存库上统一查询本地数据：
+
+- SQLite：以只读方式 ATTACH `aqi_database.db`（库名 `aqi`），并为其中每张表建立同名视图，
+  因此 `SELECT ... FROM history_data` 与 SQLite 引擎下的写法一致；
+- Parquet 数据湖：`lake.<表名>` 视图（Hive 分区，`城市` / `年份` 过滤只扫描命中的分区）；
+  未能 ATTACH SQLite 时（如离线环境无法安装 DuckDB 的 sqlite 扩展），同名表回退为数据湖中的版本；
+- CSV：`csv.hisraw` / `csv.newraw` / `csv.processed` 视图（按列名合并同目录下全部 CSV）。
+
+查询在 DuckDB 中以列式向量化执行，结果以 pandas DataFrame 或 Arrow Table 返回，
+不经过 `pd.read_sql_query` 逐行物化。新出现的表/数据湖目录在下一次查询时自动建立视图。
+
+依赖 duckdb（可选依赖，仅在 `engine="duckdb"` 或直接使用本模块时需要）。
+"""
+
+import itertools
+import os
+import threading
+from typing import Any, Optional
+
+import logging
+
+from config.settings import DATABASE_PATH, PARQUET_LAKE_DIR, RAW_DATA_DIR, NEWRAW_DATA_DIR, PROCESSED_DATA_DIR
+from src.data_processing.parquet_lake import PARTITION_COLUMNS, list_lake_tables, table_dir
+
+logger = logging.getLogger("db_operations")
+
+SQLITE_ALIAS = "aqi"
+CSV_SOURCES = {"hisraw": RAW_DATA_DIR, "newraw": NEWRAW_DATA_DIR, "processed": PROCESSED_DATA_DIR}
+
+
+def _import_duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("DuckDB 查询引擎需要 duckdb，请先执行：pip install duckdb") from e
+    return duckdb
+
+
+def _ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _literal(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+class DuckDBEngine:
+    """挂载 SQLite 库、Parquet 数据湖与 CSV 目录的 DuckDB 内存库（线程间串行使用）。"""
+
+    def __init__(self, db_path: str = DATABASE_PATH, lake_dir: str = PARQUET_LAKE_DIR, csv_sources: dict = None):
+        duckdb = _import_duckdb()
+        self._error = duckdb.Error
+        self.db_path = db_path
+        self.lake_dir = lake_dir
+        self.csv_sources = CSV_SOURCES if csv_sources is None else csv_sources
+        self.conn = duckdb.connect()
+        self._lock = threading.Lock()
+        self._views = set()
+        self._snapshot_ids = itertools.count(1)
+        try:
+            # 缓存 Parquet 文件元数据，重复查询数据湖时不再逐个文件解析 footer
+            self.conn.execute("SET parquet_metadata_cache = true")
+        except self._error:
+            pass
+        self.conn.execute("CREATE SCHEMA IF NOT EXISTS lake")
+        self.conn.execute("CREATE SCHEMA IF NOT EXISTS csv")
+        self.sqlite_attached = self._attach_sqlite()
+        self.refresh()
+
+    def _attach_sqlite(self):
+        """挂载 SQLite 库：成功返回 True，失败返回 False，库文件尚不存在时返回 None（之后再试）。"""
+        if not os.path.exists(self.db_path):
+            return None
+        try:
+            self.conn.execute(f"ATTACH {_literal(self.db_path)} AS {SQLITE_ALIAS} (TYPE SQLITE, READ_ONLY)")
+            return True
+        except self._error as e:
+            logger.warning(f"⚠️ DuckDB 无法挂载 SQLite 库（{e}），将只查询 Parquet 数据湖与 CSV")
+            return False
+
+    def _create_view(self, name, select):
+        if name not in self._views:
+            self.conn.execute(f"CREATE OR REPLACE VIEW {name} AS {select}")
+            self._views.add(name)
+
+    def _sqlite_tables(self):
+        if not self.sqlite_attached:
+            return []
+        rows = self.conn.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE database_name = ?", [SQLITE_ALIAS]).fetchall()
+        return [row[0] for row in rows]
+
+    def refresh(self):
+        """为新出现的 SQLite 表、数据湖表与 CSV 目录建立视图。"""
+        if self.sqlite_attached is None:
+            self.sqlite_attached = self._attach_sqlite()
+        for table_name in self._sqlite_tables():
+            self._create_view(_ident(table_name), f"SELECT * FROM {SQLITE_ALIAS}.{_ident(table_name)}")
+        hive_types = ", ".join(f"{_literal(c)}: VARCHAR" for c in PARTITION_COLUMNS)
+        for table_name in list_lake_tables(self.lake_dir):
+            pattern = os.path.join(table_dir(table_name, self.lake_dir), "*", "*", "*.parquet")
+            select = f"SELECT * FROM read_parquet({_literal(pattern)}, hive_partitioning = true, hive_types = {{{hive_types}}})"
+            try:
+                self._create_view(f"lake.{_ident(table_name)}", select)
+            except self._error:
+                continue  # 目录中尚无分区文件
+            if not self.sqlite_attached:
+                self._create_view(_ident(table_name), f"SELECT * FROM lake.{_ident(table_name)}")
+        for name, directory in self.csv_sources.items():
+            if f"csv.{_ident(name)}" in self._views or not directory or not os.path.isdir(directory):
+                continue
+            if any(f.lower().endswith(".csv") for f in os.listdir(directory)):
+                pattern = os.path.join(directory, "*.csv")
+                self._create_view(f"csv.{_ident(name)}",
+                                  f"SELECT * FROM read_csv_auto({_literal(pattern)}, union_by_name = true)")
+
+    def query(self, sql: str, params: Optional[Any] = None, arrow: bool = False):
+        """执行查询，返回 pandas DataFrame（`arrow=True` 时返回 pyarrow.Table）。"""
+        with self._lock:
+            self.refresh()
+            result = self.conn.execute(sql, params) if params is not None else self.conn.execute(sql)
+            if arrow:
+                to_arrow = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+                return to_arrow()
+            return result.df()
+
+    def iter_batches(self, sql: str, params: Optional[Any] = None, chunksize: int = 50000):
+        """逐块返回查询结果（pyarrow.RecordBatch）。
+
+        使用独立游标执行，迭代期间不占用引擎锁；游标与主连接共享同一内存库中的视图。
+        """
+        with self._lock:
+            self.refresh()
+            cursor = self.conn.cursor()
+        try:
+            result = cursor.execute(sql, params) if params is not None else cursor.execute(sql)
+            to_reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+            yield from to_reader(chunksize)
+        finally:
+            cursor.close()
+
+    def snapshot(self, sql: str, params: Optional[Any] = None) -> str:
+        """把查询结果物化为主连接上的临时表（数据留在 DuckDB 中，必要时溢出到磁盘），返回表名。
+
+        DuckDB 并行执行时排序相同的行、GROUP BY 的输出顺序在两次执行之间可能不同；物化后行序固定，
+        表中 rowid 即结果行号（从 0 开始），可按行号区间分页。
+        """
+        with self._lock:
+            self.refresh()
+            name = f"pager_snapshot_{next(self._snapshot_ids)}"
+            select = f"CREATE TEMP TABLE {name} AS {sql}"
+            self.conn.execute(select, params) if params is not None else self.conn.execute(select)
+            return name
+
+    def drop_snapshot(self, name: str):
+        with self._lock:
+            self.conn.execute(f"DROP TABLE IF EXISTS temp.{_ident(name)}")
+
+    def sources(self):
+        """返回 [(模式, 视图名)]，即当前可查询的表。"""
+        with self._lock:
+            self.refresh()
+            return self.conn.execute(
+                "SELECT schema_name, view_name FROM duckdb_views() WHERE NOT internal ORDER BY 1, 2").fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(db_path: str = DATABASE_PATH, lake_dir: str = PARQUET_LAKE_DIR) -> DuckDBEngine:
+    """返回进程内共享的 DuckDB 引擎（按数据库与数据湖路径缓存）。"""
+    key = (os.path.abspath(db_path), os.path.abspath(lake_dir))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = DuckDBEngine(db_path, lake_dir)
+        return engine
+
+
+def query_duckdb(query: str, params: Optional[Any] = None, db_path: str = DATABASE_PATH,
+                 lake_dir: str = PARQUET_LAKE_DIR, arrow: bool = False):
+    """用 DuckDB 执行查询（可跨 SQLite / 数据湖 / CSV），返回 DataFrame 或 Arrow Table。"""
+    return get_engine(db_path, lake_dir).query(query, params=params, arrow=arrow)
+
+
+__all__ = ["DuckDBEngine", "get_engine", "query_duckdb"]
@@ -0,0 +1,237 @@
+"""查询结果的按需分页（供查询 REPL 的 show / next / prev / page 使用）。
+
+`QueryPager` 只读取当前需要的那一页，而不是先把整个结果读入内存：
+
+- keyset 分页：SQLite 引擎下形如 `SELECT <*|列名...> FROM <表> [WHERE ...]` 的单表查询按 rowid 翻页
+  （`WHERE rowid > <上一页最后一个 rowid> ORDER BY rowid LIMIT n`），每页都是一次索引范围查找，
+  耗时与页码无关；跳页时从最近的已知页边界开始 OFFSET；
+- LIMIT/OFFSET：SQLite 引擎下的其他查询（排序、聚合、多表等）包装为 `SELECT * FROM (<SQL>) LIMIT n OFFSET m`，
+  DuckDB 引擎下的简单单表查询同样如此（DuckDB 保持扫描顺序）；
+- 快照：DuckDB 引擎下的其他查询先在 DuckDB 中物化为临时表（`DuckDBEngine.snapshot`），再按 rowid 区间取页，
+  避免并行排序/聚合的行序在两次执行之间不同导致翻页时重复或遗漏；
+- 一次性读取：非 SELECT 语句（如 PRAGMA）无法包装，第一次取页时读入全部结果后按页切片。
+
+最近访问的 `QUERY_PAGE_CACHE` 页缓存在内存中（LRU），每次取页后在后台线程预取下一页。
+总行数先给出估计值（keyset 分页取 `sqlite_stat1` 统计或 `MAX(rowid)`，其他查询在后台执行 `COUNT(*)`），
+读到最后一页后即为准确值。
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+import logging
+import pandas as pd
+
+from config.settings import DATABASE_PATH, QUERY_ENGINE, QUERY_PAGE_CACHE
+from src.data_processing.db_pool import reader
+from src.data_processing.duckdb_engine import get_engine
+from src.data_processing.storage import query_sqlite
+
+logger = logging.getLogger("db_operations")
+
+_IDENT = r'(?:"(?:[^"]|"")+"|\[[^\]]+\]|`[^`]+`|\w+)'
+_SIMPLE_SELECT = re.compile(
+    rf'^\s*SELECT\s+(?P<columns>\*|{_IDENT}(?:\s*,\s*{_IDENT})*)\s+FROM\s+(?P<table>{_IDENT}(?:\.{_IDENT})?)'
+    r'(?:\s+WHERE\s+(?P<where>.+?))?\s*$', re.IGNORECASE | re.DOTALL)
+# WHERE 之后出现这些关键字说明不是简单的单表过滤（也包括 WHERE 中带子查询的情况），不做 keyset 分页
+_NOT_SIMPLE = re.compile(r'\b(?:SELECT|JOIN|UNION|INTERSECT|EXCEPT|GROUP|ORDER|LIMIT|OFFSET|HAVING|WINDOW)\b',
+                         re.IGNORECASE)
+_WRAPPABLE = re.compile(r'^\s*(?:SELECT|WITH|VALUES)\b', re.IGNORECASE)
+_KEY = "__pager_rowid__"
+
+
+def _unquote(name):
+    if name[0] in '"`[':
+        name = name[1:-1]
+    return name.replace('""', '"')
+
+
+class QueryPager:
+    """按页读取一条查询的结果：`page(n)` 返回第 n 页（从 0 开始）的 DataFrame，超出末页时返回空表。"""
+
+    def __init__(self, sql: str, page_size: int = 20, engine: Optional[str] = None,
+                 params: Optional[Any] = None, db_path: str = DATABASE_PATH, cache_pages: int = QUERY_PAGE_CACHE):
+        self.sql = sql.strip().rstrip(";").strip()
+        self.page_size = max(1, int(page_size))
+        self.engine = (engine or QUERY_ENGINE).lower()
+        self.params = params
+        self.db_path = db_path
+        self.cache_pages = max(1, int(cache_pages))
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._after = {0: None}  # 页码 -> 该页之前最后一行的 rowid（keyset 分页的页边界）
+        self._last_page = None
+        self._total = None
+        self._total_exact = False
+        self._count_future = None
+        self._frame = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pager")
+        self._table = self._where = self._columns = None
+        self.mode = self._choose_mode()
+
+    def _choose_mode(self):
+        if not _WRAPPABLE.match(self.sql):
+            return "full"
+        match = _SIMPLE_SELECT.match(self.sql)
+        simple = match is not None and not (match.group("where") and _NOT_SIMPLE.search(match.group("where")))
+        if self.engine == "duckdb":
+            return "offset" if simple else "snapshot"
+        if not simple:
+            return "offset"
+        table = _unquote(match.group("table"))
+        with reader(self.db_path) as conn:
+            row = conn.execute("SELECT type, sql FROM sqlite_master WHERE name = ? COLLATE NOCASE", (table,)).fetchone()
+        if not row or row[0] != "table" or "WITHOUT ROWID" in (row[1] or "").upper():
+            return "offset"  # 视图与 WITHOUT ROWID 表没有 rowid
+        self._table, self._where, self._columns = match.group("table"), match.group("where"), match.group("columns")
+        return "keyset"
+
+    # ---- 读取 ----
+
+    def _keyset_sql(self, after, offset):
+        conditions = (["rowid > ?"] if after is not None else []) + ([f"({self._where})"] if self._where else [])
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f'SELECT rowid AS "{_KEY}", {self._columns} FROM {self._table}{where} ORDER BY rowid LIMIT ?'
+        params = ([after] if after is not None else []) + list(self.params or ()) + [self.page_size]
+        if offset:
+            sql += " OFFSET ?"
+            params.append(offset)
+        return sql, params
+
+    def _query(self, page):
+        if self.mode == "full":
+            if self._frame is None:
+                self._frame = query_sqlite(self.sql, self.params, db_path=self.db_path, engine=self.engine)
+                self._set_total(len(self._frame), exact=True)
+            start = page * self.page_size
+            return self._frame.iloc[start:start + self.page_size].reset_index(drop=True)
+        if self.mode == "keyset":
+            with self._lock:
+                # 从不晚于目标页的最近已知边界开始
+                known = max(p for p in self._after if p <= page)
+                after = self._after[known]
+            sql, params = self._keyset_sql(after, (page - known) * self.page_size)
+            df = query_sqlite(sql, params, db_path=self.db_path, engine=self.engine)
+            if len(df) == self.page_size:
+                with self._lock:
+                    self._after[page + 1] = int(df[_KEY].iloc[-1])
+            return df.drop(columns=[_KEY])
+        if self.mode == "snapshot":
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = get_engine(self.db_path).snapshot(self.sql, self.params)
+                    total = query_sqlite(f"SELECT COUNT(*) FROM {self._snapshot}", db_path=self.db_path,
+                                         engine=self.engine).iloc[0, 0]
+                    self._set_total(int(total), exact=True)
+            start = page * self.page_size
+            return query_sqlite(f"SELECT * FROM {self._snapshot} WHERE rowid >= ? AND rowid < ? ORDER BY rowid",
+                                [start, start + self.page_size], db_path=self.db_path, engine=self.engine)
+        params = list(self.params or ()) + [self.page_size, page * self.page_size]
+        return query_sqlite(f"SELECT * FROM ({self.sql}) LIMIT ? OFFSET ?", params,
+                            db_path=self.db_path, engine=self.engine)
+
+    def _fetch(self, page):
+        try:
+            df = self._query(page)
+            with self._lock:
+                if len(df) < self.page_size:
+                    last = page if len(df) else page - 1
+                    self._last_page = last if self._last_page is None else min(self._last_page, last)
+                    previous = self._cache.get(page - 1)
+                    if len(df) or page == 0 or (previous is not None and len(previous) == self.page_size):
+                        self._set_total(page * self.page_size + len(df), exact=True)
+                self._cache[page] = df
+                self._cache.move_to_end(page)
+                while len(self._cache) > self.cache_pages:
+                    self._cache.popitem(last=False)
+            return df
+        finally:
+            with self._lock:
+                self._pending.pop(page, None)
+
+    def _prefetch(self, page):
+        with self._lock:
+            if (self._last_page is not None and page > self._last_page) or page in self._cache or page in self._pending:
+                return
+            self._pending[page] = self._executor.submit(self._fetch, page)
+
+    def page(self, page: int) -> pd.DataFrame:
+        """返回第 `page` 页（从 0 开始），并在后台预取下一页。"""
+        with self._lock:
+            if self._last_page is not None and page > self._last_page:
+                return pd.DataFrame()
+            df = self._cache.get(page)
+            if df is not None:
+                self._cache.move_to_end(page)
+            future = self._pending.get(page)
+        if df is None:
+            df = future.result() if future is not None else self._fetch(page)
+        if len(df) == self.page_size:
+            self._prefetch(page + 1)
+        if page == 0:
+            self._start_count()
+        return df
+
+    @property
+    def last_page(self) -> Optional[int]:
+        """已知的末页页码（尚未读到末页时为 None）。"""
+        return self._last_page
+
+    # ---- 行数 ----
+
+    def _set_total(self, total, exact):
+        if exact or not self._total_exact:
+            self._total, self._total_exact = total, exact
+
+    def _estimate_keyset(self):
+        """keyset 分页且无过滤条件时，由统计信息或 MAX(rowid) 估计行数（不扫描全表）。"""
+        with reader(self.db_path) as conn:
+            try:
+                row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? COLLATE NOCASE AND stat IS NOT NULL",
+                                   (_unquote(self._table),)).fetchone()
+            except Exception:
+                row = None  # 尚未 ANALYZE，没有 sqlite_stat1
+            if row:
+                return int(str(row[0]).split()[0])
+            return conn.execute(f"SELECT MAX(rowid) FROM {self._table}").fetchone()[0] or 0
+
+    def _count(self):
+        total = query_sqlite(f"SELECT COUNT(*) FROM ({self.sql})", self.params,
+                             db_path=self.db_path, engine=self.engine).iloc[0, 0]
+        with self._lock:
+            self._set_total(int(total), exact=True)
+
+    def _start_count(self):
+        with self._lock:
+            if self._total_exact or self._count_future is not None or self.mode in ("full", "snapshot"):
+                return
+            if self.mode == "keyset" and not self._where:
+                try:
+                    self._set_total(self._estimate_keyset(), exact=False)
+                    self._count_future = False
+                    return
+                except Exception as e:
+                    logger.warning(f"⚠️ 估计行数失败：{e}")
+            self._count_future = self._executor.submit(self._count)
+
+    def total(self):
+        """返回 (行数, 是否准确)：后台计数尚未完成时为 (None, False)。"""
+        with self._lock:
+            return self._total, self._total_exact
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._snapshot is not None:
+            try:
+                get_engine(self.db_path).drop_snapshot(self._snapshot)
+            except Exception as e:
+                logger.warning(f"⚠️ 删除分页快照失败：{e}")
+            self._snapshot = None
+
+
+__all__ = ["QueryPager"]
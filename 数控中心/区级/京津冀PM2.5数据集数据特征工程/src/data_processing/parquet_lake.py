@@ -0,0 +1,187 @@
+"""按 Hive 分区组织的 Parquet 数据湖（与 CSV / SQLite 并行写入，供分析类读取）。
+
+目录结构：`PARQUET_LAKE_DIR/<表名>/年份=<YYYY>/城市=<城市>/part-0.parquet`
+
+- 写入：`save_to_parquet` 按 (年份, 城市) 分区，把新数据与分区中已有数据合并后按键去重（后写入覆盖先写入，
+  键为 `TABLE_SCHEMAS` 中的主键，未声明的表取 `INDEX_CATALOGUE` 的首个索引列），按日期排序后原子替换分区文件；
+  列类型按 `TABLE_SCHEMAS` 显式指定（TEXT → string、REAL → double、INTEGER → int64），未声明的列由 pandas 类型推断。
+  没有 `年份` 列的表（如 realtime_data）按 `日期` 的前 4 位分区；
+- 读取：`read_parquet` 支持列裁剪（`columns`）与分区裁剪（`cities` / `years`），只打开命中分区的文件；
+  分区列 `年份`、`城市` 由目录名还原，`城市` 以字典编码（pandas category）返回。
+
+依赖 pyarrow（可选依赖，仅在开启 `SAVE_TO_PARQUET` 或调用本模块时需要）。
+"""
+
+import os
+import threading
+from typing import Iterable, Optional
+
+import logging
+import pandas as pd
+
+from config.settings import PARQUET_LAKE_DIR, PARQUET_COMPRESSION
+from src.data_processing.schema import get_schema, normalize_frame, catalogue_indexes
+
+logger = logging.getLogger("db_operations")
+
+PARTITION_COLUMNS = ("年份", "城市")
+PART_FILE = "part-0.parquet"
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+_lock = threading.Lock()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet 数据湖需要 pyarrow，请先执行：pip install pyarrow") from e
+
+
+def _arrow_type(pa, sqlite_type):
+    return {"INTEGER": pa.int64(), "REAL": pa.float64()}.get(sqlite_type, pa.string())
+
+
+def _arrow_schema(table_name, df):
+    """文件内列（不含分区列）的 Arrow 结构：声明列按 `TABLE_SCHEMAS`，其余列按 pandas 类型推断。"""
+    import pyarrow as pa
+
+    schema = get_schema(table_name)
+    declared = dict(schema["columns"]) if schema else {}
+    fields = []
+    for col in df.columns:
+        if col in declared:
+            type_ = _arrow_type(pa, declared[col])
+        elif pd.api.types.is_bool_dtype(df[col]):
+            type_ = pa.bool_()
+        elif pd.api.types.is_integer_dtype(df[col]):
+            type_ = pa.int64()
+        elif pd.api.types.is_float_dtype(df[col]):
+            type_ = pa.float64()
+        else:
+            type_ = pa.string()
+        fields.append(pa.field(col, type_))
+    return pa.schema(fields)
+
+
+def _key_columns(table_name, columns):
+    """分区内去重的键（分区列在同一分区内取值相同，不参与）。"""
+    schema = get_schema(table_name)
+    if schema is not None:
+        keys = schema["primary_key"]
+    else:
+        indexes = catalogue_indexes(table_name)
+        keys = indexes[0] if indexes else ()
+    keys = [c for c in keys if c in columns and c not in PARTITION_COLUMNS]
+    return keys or list(columns)
+
+
+def _sort_columns(columns):
+    return [c for c in ("日期", "小时") if c in columns]
+
+
+def _partition_values(df):
+    """返回 (年份, 城市) 分区值 Series（空值映射为 Hive 默认分区）。"""
+    if "年份" in df.columns:
+        years = df["年份"].astype(object)
+    elif "日期" in df.columns:
+        years = df["日期"].astype(object).where(df["日期"].isna(), df["日期"].astype(str).str[:4])
+    else:
+        years = pd.Series(None, index=df.index, dtype=object)
+    cities = df["城市"].astype(object) if "城市" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    return years.where(years.notna(), _NULL_PARTITION).astype(str), cities.where(cities.notna(), _NULL_PARTITION).astype(str)
+
+
+def table_dir(table_name: str, lake_dir: str = PARQUET_LAKE_DIR) -> str:
+    return os.path.join(lake_dir, table_name)
+
+
+def _partition_path(table_name, year, city, lake_dir):
+    return os.path.join(table_dir(table_name, lake_dir), f"年份={year}", f"城市={city}", PART_FILE)
+
+
+def _write_partition(path, df, table_name):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if os.path.exists(path):
+        existing = pq.read_table(path).to_pandas()
+        df = pd.concat([existing, df], ignore_index=True)
+    keys = _key_columns(table_name, df.columns)
+    df = df.drop_duplicates(subset=keys, keep="last")
+    order = _sort_columns(df.columns)
+    if order:
+        df = df.sort_values(order, kind="stable")
+    table = pa.Table.from_pandas(df.reset_index(drop=True), schema=_arrow_schema(table_name, df), preserve_index=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 以 "." 开头的临时文件不会被读取端的数据集扫描到
+    tmp_path = os.path.join(os.path.dirname(path), f".{PART_FILE}.tmp")
+    pq.write_table(table, tmp_path, compression=PARQUET_COMPRESSION)
+    os.replace(tmp_path, path)
+    return len(df)
+
+
+def save_to_parquet(df: pd.DataFrame, table_name: str, lake_dir: str = PARQUET_LAKE_DIR) -> int:
+    """把 df 按 (年份, 城市) 分区合并写入数据湖，返回涉及的分区数。"""
+    if df is None or df.empty:
+        return 0
+    _require_pyarrow()
+    df = normalize_frame(df, table_name)
+    years, cities = _partition_values(df)
+    data = df.drop(columns=[c for c in PARTITION_COLUMNS if c in df.columns])
+    partitions = 0
+    with _lock:
+        for (year, city), part in data.groupby([years, cities], sort=False):
+            _write_partition(_partition_path(table_name, year, city, lake_dir), part, table_name)
+            partitions += 1
+    logger.info(f"🪣 已将 {len(df)} 条记录写入数据湖 '{table_name}'（{partitions} 个分区）")
+    return partitions
+
+
+def _dataset(table_name, lake_dir):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(pa.schema([(c, pa.string()) for c in PARTITION_COLUMNS]), flavor="hive")
+    return ds.dataset(table_dir(table_name, lake_dir), format="parquet", partitioning=partitioning)
+
+
+def _partition_filter(cities, years):
+    import pyarrow.dataset as ds
+
+    expr = None
+    if cities:
+        expr = ds.field("城市").isin([str(c) for c in cities])
+    if years:
+        year_expr = ds.field("年份").isin([str(y) for y in years])
+        expr = year_expr if expr is None else expr & year_expr
+    return expr
+
+
+def read_parquet(table_name: str, columns: Optional[Iterable[str]] = None, cities: Optional[Iterable[str]] = None,
+                 years: Optional[Iterable] = None, lake_dir: str = PARQUET_LAKE_DIR) -> pd.DataFrame:
+    """读取数据湖中的表：`columns` 为需要的列（缺省全部），`cities` / `years` 只读取对应分区。"""
+    _require_pyarrow()
+    if not os.path.isdir(table_dir(table_name, lake_dir)):
+        return pd.DataFrame(columns=list(columns) if columns else None)
+    dataset = _dataset(table_name, lake_dir)
+    table = dataset.to_table(columns=list(columns) if columns else None, filter=_partition_filter(cities, years))
+    if "城市" in table.column_names:
+        table = table.set_column(table.column_names.index("城市"), "城市", table["城市"].dictionary_encode())
+    return table.to_pandas()
+
+
+def partition_files(table_name: str, cities=None, years=None, lake_dir: str = PARQUET_LAKE_DIR) -> list:
+    """返回读取时会打开的分区文件路径（分区裁剪后）。"""
+    _require_pyarrow()
+    if not os.path.isdir(table_dir(table_name, lake_dir)):
+        return []
+    return [f.path for f in _dataset(table_name, lake_dir).get_fragments(filter=_partition_filter(cities, years))]
+
+
+def list_lake_tables(lake_dir: str = PARQUET_LAKE_DIR) -> list:
+    if not os.path.isdir(lake_dir):
+        return []
+    return sorted(name for name in os.listdir(lake_dir) if os.path.isdir(os.path.join(lake_dir, name)))
+
+
+__all__ = ["save_to_parquet", "read_parquet", "partition_files", "list_lake_tables", "table_dir"]
@@ -0,0 +1,307 @@
+"""业务表的声明式结构与 UPSERT 写入。
+
+`realtime_data` / `history_data` 不再由首个 DataFrame 推断列类型、以自增 id 盲目追加，而是：
+
+- 按 `TABLE_SCHEMAS` 建表：数值列 REAL / INTEGER、文本列 TEXT，并以
+  (城市, 日期, 小时) / (城市, 日期) 为复合主键；
+- 写入前规范化键列（日期取 YYYY-MM-DD，小时、月份补足两位），丢弃键为空的行；
+- 使用 `INSERT ... ON CONFLICT(主键) DO UPDATE` 写入，同一小时/日期重复写入时以新数据为准，
+  数据库中不会再出现重复行，下游无需再在 pandas 中去重；
+- 旧库中没有主键的表在首次写入时（或 `python -m src.main migrate_db`）由 `migrate_table`
+  迁移：按原插入顺序去重（后写入的行覆盖先写入的行）后替换原表。
+
+未在 `TABLE_SCHEMAS` 中声明的表保持原有的推断建表 + 追加写入行为。
+
+`INDEX_CATALOGUE` 按表名（支持 `*_processed` 这类通配）列出城市/日期/小时的常用访问路径，
+`ensure_indexes` 在批量写入、迁移与同步之后补建缺失的索引；已被主键或其他索引前缀覆盖的索引不再重复创建。
+"""
+
+import fnmatch
+import logging
+import sqlite3
+
+import pandas as pd
+
+logger = logging.getLogger("db_operations")
+
+# 列定义：(列名, 类型)；主键列自动加 NOT NULL
+TABLE_SCHEMAS = {
+    "realtime_data": {
+        "columns": [
+            ("城市", "TEXT"), ("日期", "TEXT"), ("小时", "TEXT"),
+            ("AQI", "REAL"), ("空气质量等级", "TEXT"),
+            ("PM2.5", "REAL"), ("PM10", "REAL"), ("SO₂", "REAL"), ("NO₂", "REAL"), ("CO", "REAL"), ("O₃", "REAL"),
+            ("首要污染物", "TEXT"), ("健康建议", "TEXT"), ("措施建议", "TEXT"), ("采集时间", "TEXT"),
+        ],
+        "primary_key": ("城市", "日期", "小时"),
+    },
+    "history_data": {
+        "columns": [
+            ("日期", "TEXT"), ("AQI指数", "INTEGER"), ("质量等级", "TEXT"), ("当天AQI排名", "INTEGER"),
+            ("PM2.5", "REAL"), ("PM10", "REAL"), ("No2", "REAL"), ("So2", "REAL"), ("Co", "REAL"), ("O3", "REAL"),
+            ("城市", "TEXT"), ("年份", "TEXT"), ("月份", "TEXT"),
+        ],
+        "primary_key": ("城市", "日期"),
+    },
+}
+
+
+def _as_text(series, width=0):
+    """数字取整后转文本（`width` 位补零），非数字的取值（极少见）保留原文，空值为 None；整列向量化处理。"""
+    values = pd.to_numeric(series, errors="coerce")
+    numeric = values.notna().to_numpy()
+    result = pd.Series([None] * len(series), index=series.index, dtype=object)
+    other = series.notna().to_numpy() & ~numeric
+    if other.any():
+        result[other] = series[other].astype(str).astype(object)
+    if numeric.any():
+        text = values[numeric].astype("int64").astype(str)
+        result[numeric] = (text.str.zfill(width) if width else text).astype(object)
+    return result
+
+
+# 索引目录：表名（可用通配符）-> [索引列, ...]；先匹配的条目生效
+INDEX_CATALOGUE = {
+    # 主键 (城市, 日期) 已覆盖按城市查询；按日期跨城市查询（某天全部城市）另建日期索引
+    "history_data": [("城市", "日期"), ("日期",)],
+    "realtime_data": [("城市", "日期", "小时"), ("日期", "小时")],
+    # 清洗结果表由首个 DataFrame 推断建表，只有自增 id
+    "*_processed": [("城市", "日期", "小时"), ("日期",)],
+    "*_merged": [("城市", "日期", "小时"), ("日期",)],
+}
+
+
+def _two_digits(series):
+    return _as_text(series, width=2)
+
+
+def _date_text(series):
+    return series.where(series.isna(), series.astype(str).str[:10])
+
+
+def _int_text(series):
+    return _as_text(series)
+
+
+# 列规范化：(pandas 实现, 迁移时的 SQL 表达式)；CSV 回读时小时/月份可能是整数，日期可能带时间
+_NORMALIZERS = {
+    "日期": (_date_text, 'substr(CAST("日期" AS TEXT), 1, 10)'),
+    "小时": (_two_digits, 'printf(\'%02d\', CAST("小时" AS INTEGER))'),
+    "月份": (_two_digits, 'printf(\'%02d\', CAST("月份" AS INTEGER))'),
+    "年份": (_int_text, 'CAST(CAST("年份" AS INTEGER) AS TEXT)'),
+}
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def get_schema(table_name):
+    """返回表的声明结构（未声明时返回 None）。"""
+    return TABLE_SCHEMAS.get(table_name)
+
+
+def normalize_frame(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """按表结构规范化列取值，并丢弃主键列为空的行（返回新的 DataFrame）。"""
+    schema = get_schema(table_name)
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    if schema is None:
+        return df
+    for col, (func, _sql) in _NORMALIZERS.items():
+        if col in df.columns:
+            df[col] = func(df[col].astype(object))
+    keys = [c for c in schema["primary_key"] if c in df.columns]
+    missing = [c for c in schema["primary_key"] if c not in df.columns]
+    if missing:
+        raise ValueError(f"写入表 '{table_name}' 的数据缺少主键列：{missing}")
+    valid = df[keys].notna().all(axis=1) & (df[keys].astype(str) != "").all(axis=1)
+    if not valid.all():
+        logger.warning(f"⚠️ 表 '{table_name}'：丢弃 {int((~valid).sum())} 行主键为空的数据")
+        df = df[valid]
+    return df
+
+
+def _table_columns(conn, table_name):
+    """返回 [(列名, 类型, 主键序号)]，表不存在时返回空列表。"""
+    rows = conn.execute(f"PRAGMA table_info({_quote(table_name)})").fetchall()
+    return [(row[1], row[2], row[5]) for row in rows]
+
+
+def _create_sql(table_name, schema, extra_columns=()):
+    pk = set(schema["primary_key"])
+    defs = [f"{_quote(c)} {t}{' NOT NULL' if c in pk else ''}" for c, t in schema["columns"]]
+    defs += [f"{_quote(c)} {t}" for c, t in extra_columns]
+    defs.append(f"PRIMARY KEY ({', '.join(_quote(c) for c in schema['primary_key'])})")
+    return f"CREATE TABLE IF NOT EXISTS {_quote(table_name)} ({', '.join(defs)})"
+
+
+def is_keyed(conn, table_name):
+    """表是否已按声明的复合主键建立（旧的自增 id 表返回 False）。"""
+    schema = get_schema(table_name)
+    columns = _table_columns(conn, table_name)
+    pk = [name for name, _type, seq in sorted(columns, key=lambda c: c[2]) if seq > 0]
+    return schema is not None and tuple(pk) == tuple(schema["primary_key"])
+
+
+def ensure_table(conn, table_name, df: pd.DataFrame):
+    """确保声明的表存在且带主键：不存在时建表，旧表先迁移；df 中多出的列以 ALTER TABLE 补充。
+
+    建表与补列在调用方的事务中执行、由调用方提交（随后的数据写入失败时一并回滚）。
+    """
+    from src.data_processing.storage import _infer_sqlite_type
+
+    schema = get_schema(table_name)
+    columns = _table_columns(conn, table_name)
+    if not columns:
+        declared = {c for c, _t in schema["columns"]}
+        extra = [(c, _infer_sqlite_type(df[c])) for c in df.columns if c not in declared]
+        conn.execute(_create_sql(table_name, schema, extra))
+        logger.info(f"🧱 已按声明结构创建表 '{table_name}'（主键：{', '.join(schema['primary_key'])}）")
+        return
+    if not is_keyed(conn, table_name):
+        migrate_table(conn, table_name)
+        columns = _table_columns(conn, table_name)
+    existing = {name for name, _type, _seq in columns}
+    added = [c for c in df.columns if c not in existing]
+    for col in added:
+        conn.execute(f"ALTER TABLE {_quote(table_name)} ADD COLUMN {_quote(col)} {_infer_sqlite_type(df[col])}")
+    if added:
+        logger.info(f"🧱 表 '{table_name}' 新增列：{added}")
+
+
+def upsert_sql(table_name, columns):
+    """返回按主键 UPSERT 的 INSERT 语句（非主键列以新值覆盖）。"""
+    schema = get_schema(table_name)
+    pk = schema["primary_key"]
+    cols = ", ".join(_quote(c) for c in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    updates = [f"{_quote(c)} = excluded.{_quote(c)}" for c in columns if c not in pk]
+    action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+    return (
+        f"INSERT INTO {_quote(table_name)} ({cols}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(_quote(c) for c in pk)}) {action}"
+    )
+
+
+def catalogue_indexes(table_name):
+    """返回表在 `INDEX_CATALOGUE` 中登记的索引列组合（未登记时返回空列表）。"""
+    for pattern, indexes in INDEX_CATALOGUE.items():
+        if fnmatch.fnmatchcase(table_name, pattern):
+            return list(indexes)
+    return []
+
+
+def _index_columns(conn, table_name):
+    """返回表上已有索引（含主键自动索引）的列组合列表。"""
+    result = []
+    for row in conn.execute(f"PRAGMA index_list({_quote(table_name)})").fetchall():
+        info = conn.execute(f"PRAGMA index_info({_quote(row[1])})").fetchall()
+        result.append(tuple(r[2] for r in sorted(info, key=lambda r: r[0])))
+    return result
+
+
+def ensure_indexes(conn, tables=None):
+    """为 `tables`（缺省为库中全部表）补建 `INDEX_CATALOGUE` 中缺失的索引，返回新建的索引名列表。
+
+    索引列在表中不存在、或已是某个现有索引（含主键）前缀的条目跳过；新建索引后执行 `PRAGMA optimize`
+    更新查询规划统计。不提交事务：与同一事务中写入的数据一起由调用方提交。
+    """
+    if tables is None:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()]
+    created = []
+    for table_name in tables:
+        wanted = catalogue_indexes(table_name)
+        if not wanted:
+            continue
+        existing_cols = {name for name, _type, _seq in _table_columns(conn, table_name)}
+        if not existing_cols:
+            continue
+        existing = _index_columns(conn, table_name)
+        for cols in wanted:
+            if not set(cols) <= existing_cols:
+                continue
+            if any(idx[:len(cols)] == tuple(cols) for idx in existing):
+                continue
+            name = f"idx_{table_name}__{'_'.join(cols)}"
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(name)} ON {_quote(table_name)} "
+                         f"({', '.join(_quote(c) for c in cols)})")
+            existing.append(tuple(cols))
+            created.append(name)
+    if created:
+        conn.execute("PRAGMA optimize")
+        logger.info(f"🗂️ 已创建索引：{created}")
+    return created
+
+
+def migrate_table(conn, table_name):
+    """把旧表（自增 id、无主键）迁移为声明结构并去重，返回 (迁移前行数, 迁移后行数)。
+
+    按原插入顺序写入新表，主键冲突时后写入的行覆盖先写入的行；主键为空的行被丢弃。
+    旧表中多出的列保留在新表中。整个迁移在一个事务内完成。
+    """
+    schema = get_schema(table_name)
+    old_columns = [(name, type_) for name, type_, _seq in _table_columns(conn, table_name) if name != "id"]
+    if not old_columns:
+        return 0, 0
+    declared = {c for c, _t in schema["columns"]}
+    old_names = {name for name, _type in old_columns}
+    missing_keys = [c for c in schema["primary_key"] if c not in old_names]
+    if missing_keys:
+        raise ValueError(f"表 '{table_name}' 缺少主键列 {missing_keys}，无法迁移")
+    extra = [(name, type_ or "TEXT") for name, type_ in old_columns if name not in declared]
+    copy_cols = [c for c, _t in schema["columns"] if c in old_names] + [c for c, _t in extra]
+    select = [(_NORMALIZERS[c][1] if c in _NORMALIZERS else _quote(c)) for c in copy_cols]
+    not_null = " AND ".join(f"{_quote(c)} IS NOT NULL AND {_quote(c)} != ''" for c in schema["primary_key"])
+    tmp_name = f"{table_name}__migrating"
+    pk = schema["primary_key"]
+    updates = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in copy_cols if c not in pk)
+
+    conn.commit()
+    before = conn.execute(f"SELECT COUNT(*) FROM {_quote(table_name)}").fetchone()[0]
+    try:
+        conn.execute("BEGIN")
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(tmp_name)}")
+        conn.execute(_create_sql(tmp_name, schema, extra))
+        conn.execute(
+            f"INSERT INTO {_quote(tmp_name)} ({', '.join(_quote(c) for c in copy_cols)}) "
+            f"SELECT {', '.join(select)} FROM {_quote(table_name)} WHERE {not_null} ORDER BY rowid "
+            f"ON CONFLICT ({', '.join(_quote(c) for c in pk)}) "
+            + (f"DO UPDATE SET {updates}" if updates else "DO NOTHING")
+        )
+        conn.execute(f"DROP TABLE {_quote(table_name)}")
+        conn.execute(f"ALTER TABLE {_quote(tmp_name)} RENAME TO {_quote(table_name)}")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    after = conn.execute(f"SELECT COUNT(*) FROM {_quote(table_name)}").fetchone()[0]
+    logger.info(f"🧱 已迁移表 '{table_name}'：{before} 行 → {after} 行（去除重复/无效 {before - after} 行）")
+    return before, after
+
+
+def migrate_all(db_path=None):
+    """迁移库中所有已声明结构但尚未带主键的表，返回 {表名: (迁移前行数, 迁移后行数)}。"""
+    from src.data_processing.storage import _get_conn
+    from config.settings import DATABASE_PATH
+
+    conn = _get_conn(db_path or DATABASE_PATH)
+    results = {}
+    try:
+        for table_name in TABLE_SCHEMAS:
+            if not _table_columns(conn, table_name):
+                continue
+            if is_keyed(conn, table_name):
+                logger.info(f"✅ 表 '{table_name}' 已带主键，无需迁移")
+                continue
+            results[table_name] = migrate_table(conn, table_name)
+    finally:
+        conn.close()
+    return results
+
+
+__all__ = [
+    "TABLE_SCHEMAS", "get_schema", "normalize_frame", "ensure_table", "is_keyed",
+    "upsert_sql", "migrate_table", "migrate_all", "INDEX_CATALOGUE", "catalogue_indexes", "ensure_indexes",
+]
@@ -1,11 +1,16 @@
 import os
+import re
 import sqlite3
 from typing import Optional, Any
 
 import logging
+import numpy as np
 import pandas as pd
 
-from config.settings import DATABASE_PATH, RAW_DATA_DIR
+from config.settings import DATABASE_PATH, RAW_DATA_DIR, SAVE_TO_PARQUET, QUERY_ENGINE, QUERY_CHUNK_ROWS
+from src.data_processing.db_pool import reader, writer
+from src.data_processing.schema import get_schema, normalize_frame, ensure_table, upsert_sql, ensure_indexes, _quote
+from src.data_processing.parquet_lake import save_to_parquet
 
 # 配置数据库操作专用 logger，避免在模块导入时修改根 logger 的 handlers
 # 这样可以防止其他模块（例如爬虫模块）配置的 console 日志被覆盖或失效。
@@ -47,6 +52,7 @@ if not logger.handlers:
     logger.propagate = False
 
 def _get_conn(db_path: str = DATABASE_PATH) -> sqlite3.Connection:
+    """新建一个独立连接（调用方负责关闭）；storage 的公开函数改用 `db_pool` 中的池化连接。"""
     _ensure_dir(db_path)
     conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
     # 性能/并发优化
@@ -61,8 +67,8 @@ def _get_conn(db_path: str = DATABASE_PATH) -> sqlite3.Connection:
 
 def init_db(db_path: str = DATABASE_PATH):
     """初始化数据库（创建目录并设置基本PRAGMA）。"""
-    conn = _get_conn(db_path)
-    conn.close()
+    with writer(db_path):
+        pass
     logger.info(f"🌐 已初始化数据库（路径：{db_path}）")
 
 
@@ -97,40 +103,199 @@ def _create_table_if_not_exists(conn: sqlite3.Connection, table_name: str, df: p
     conn.commit()
 
 
-def save_to_sqlite(df: pd.DataFrame, table_name: str, db_path: str = DATABASE_PATH, if_exists: str = "append", chunksize: int = 500):
-    """将 DataFrame 保存到 SQLite。自动建表（首次写入），并使用事务批量插入。
+def _prepare_insert(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame):
+    """建表（或迁移旧表）并返回 (INSERT 语句, 规范化后的 DataFrame)。
 
-    注意：列名会按 DataFrame 的列顺序写入，空值转换为 NULL。
+    `schema.TABLE_SCHEMAS` 中声明的表按主键 UPSERT，其余表推断建表并追加写入。
     """
-    if df is None or df.empty:
-        return 0
+    if get_schema(table_name) is not None:
+        df = normalize_frame(df, table_name)
+        ensure_table(conn, table_name, df)
+        return upsert_sql(table_name, list(df.columns)), df
 
     # 保持列名为字符串
     df = df.copy()
     df.columns = [str(c) for c in df.columns]
+    _create_table_if_not_exists(conn, table_name, df)
+    cols = [f'"{c.replace('"', '""')}"' for c in df.columns]
+    placeholders = ",".join(["?" for _ in df.columns])
+    return f'INSERT INTO "{table_name}" ({",".join(cols)}) VALUES ({placeholders})', df
+
+
+def iter_rows(df: pd.DataFrame):
+    """逐行生成由 Python 原生值组成的元组（NaN / NaT / pd.NA → None），供 `executemany` 流式消费。
+
+    按列整体转换：`tolist()` 把 numpy 标量转为 int / float / str，空值位置由 `isna()` 掩码一次性找出，
+    不再对每个单元格调用 `pd.isna`；日期时间列转为 ISO 格式字符串。
+    """
+    columns = []
+    for _, series in df.items():
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime("%Y-%m-%d %H:%M:%S")
+        values = series.tolist()
+        mask = series.isna().to_numpy()
+        for i in np.flatnonzero(mask):
+            values[i] = None
+        columns.append(values)
+    return zip(*columns)
+
+
+def _staged_sql(insert_sql: str, stage_table: str, columns) -> str:
+    """把 `INSERT ... VALUES (?, ...)` 改写为从暂存表 `INSERT ... SELECT`（保留 ON CONFLICT 子句）。"""
+    cols = ", ".join(f'"{str(c).replace(chr(34), chr(34) * 2)}"' for c in columns)
+    # WHERE true：避免 SQLite 把 ON CONFLICT 解析为联接条件
+    return re.sub(r"VALUES \([?,\s]+\)", lambda _m: f'SELECT {cols} FROM temp."{stage_table}" WHERE true', insert_sql, count=1)
+
+
+def bulk_load(df: pd.DataFrame, table_name: str, db_path: str = DATABASE_PATH, stage: bool = False) -> int:
+    """高吞吐批量写入：使用连接池的写连接，在一个事务中把全部行流式写入，返回写入行数。
+
+    `stage=True` 时先写入内存中的临时表，再以一条 `INSERT ... SELECT` 并入目标表
+    （目标表索引较多或 UPSERT 冲突较多时更快）。建表、旧表迁移与 UPSERT 规则同 `save_to_sqlite`。
+    写入后按 `INDEX_CATALOGUE` 补建缺失的索引。
+    """
+    if df is None or df.empty:
+        return 0
+    with writer(db_path) as conn:
+        insert_sql, df = _prepare_insert(conn, table_name, df)
+        if stage:
+            stage_table = f"_stage_{table_name}"
+            cols = ", ".join(f'"{str(c).replace(chr(34), chr(34) * 2)}"' for c in df.columns)
+            placeholders = ", ".join("?" for _ in df.columns)
+            conn.execute(f'DROP TABLE IF EXISTS temp."{stage_table}"')
+            conn.execute(f'CREATE TEMP TABLE "{stage_table}" ({cols})')
+            conn.executemany(f'INSERT INTO temp."{stage_table}" VALUES ({placeholders})', iter_rows(df))
+            conn.execute(_staged_sql(insert_sql, stage_table, df.columns))
+            conn.execute(f'DROP TABLE temp."{stage_table}"')
+        else:
+            conn.executemany(insert_sql, iter_rows(df))
+        ensure_indexes(conn, [table_name])
+    return len(df)
+
+
+def merge_staged(conn: sqlite3.Connection, df: pd.DataFrame, table_name: str, keys=None, dry_run: bool = False):
+    """在 SQLite 内以集合操作把 df 并入目标表，返回 (新增行数, 更新行数)。
+
+    df 先写入临时表（列类型与目标表一致，取值按同样的类型亲和转换），再：
+
+    - 声明了主键的表：`INSERT ... SELECT ... ON CONFLICT(主键) DO UPDATE ... WHERE <有列取值不同>`，
+      与 `save_to_sqlite` 一样以新数据为准，但取值未变的行不会被重写；
+    - 其他表：按 `keys`（缺省为全部列）反连接，只追加目标表中不存在的行（`INSERT ... WHERE NOT EXISTS`）。
+
+    新增/更新行数由同样的反连接/连接在写入前统计；`dry_run=True` 时只统计不写入（也不建表）。
+    在调用方的写事务中执行，不自行提交。
+    """
+    schema = get_schema(table_name)
+    if schema is not None:
+        df = normalize_frame(df, table_name)
+        keys = list(schema["primary_key"])
+    else:
+        df = df.copy()
+        df.columns = [str(c) for c in df.columns]
+        keys = [c for c in (keys or []) if c in df.columns] or list(df.columns)
+    df = df.drop_duplicates(subset=keys, keep="last")
+    if df.empty:
+        return 0, 0
+
+    target_types = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({_quote(table_name)})").fetchall()}
+    if dry_run and not target_types:
+        return len(df), 0
+    if not dry_run:
+        if schema is not None:
+            ensure_table(conn, table_name, df)
+        else:
+            _create_table_if_not_exists(conn, table_name, df)
+        target_types = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({_quote(table_name)})").fetchall()}
+
+    # dry-run 时目标表可能缺少 df 的新列，只比较共有的列
+    columns = [c for c in df.columns if c in target_types or not dry_run]
+    table, stage = _quote(table_name), _quote(f"_sync_{table_name}")
+    cols = ", ".join(_quote(c) for c in columns)
+    defs = ", ".join(f"{_quote(c)} {target_types.get(c, '')}".rstrip() for c in columns)
+    conn.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+    conn.execute(f"CREATE TEMP TABLE {stage} ({defs})")
+    conn.executemany(f"INSERT INTO temp.{stage} VALUES ({', '.join('?' for _ in columns)})", iter_rows(df[columns]))
+
+    # 主键列非空，用 = 以便走主键索引；无主键的表用 IS 使空值也能匹配
+    op = "=" if schema is not None else "IS"
+    match = " AND ".join(f"t.{_quote(k)} {op} s.{_quote(k)}" for k in keys)
+    values = [c for c in columns if c not in keys] if schema is not None else []
+    inserted = conn.execute(
+        f"SELECT COUNT(*) FROM temp.{stage} s WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})").fetchone()[0]
+    updated = 0
+    if values:
+        differs = " OR ".join(f"t.{_quote(c)} IS NOT s.{_quote(c)}" for c in values)
+        updated = conn.execute(
+            f"SELECT COUNT(*) FROM temp.{stage} s JOIN {table} t ON {match} WHERE {differs}").fetchone()[0]
+
+    if not dry_run and (inserted or updated):
+        if schema is not None:
+            pk = ", ".join(_quote(k) for k in keys)
+            if values:
+                sets = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in values)
+                differs = " OR ".join(f"{table}.{_quote(c)} IS NOT excluded.{_quote(c)}" for c in values)
+                action = f"DO UPDATE SET {sets} WHERE {differs}"
+            else:
+                action = "DO NOTHING"
+            # WHERE true：避免 SQLite 把 ON CONFLICT 解析为联接条件
+            conn.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM temp.{stage} WHERE true "
+                         f"ON CONFLICT ({pk}) {action}")
+        else:
+            conn.execute(f"INSERT INTO {table} ({cols}) SELECT {', '.join(f's.{_quote(c)}' for c in columns)} "
+                         f"FROM temp.{stage} s WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})")
+        ensure_indexes(conn, [table_name])
+    conn.execute(f"DROP TABLE temp.{stage}")
+    return inserted, updated
+
+
+def save_to_sqlite(df: pd.DataFrame, table_name: str, db_path: str = DATABASE_PATH, if_exists: str = "append", chunksize: int = 500):
+    """将 DataFrame 保存到 SQLite。自动建表（首次写入），并在一个事务中批量插入（见 `bulk_load`）。
+
+    注意：列名会按 DataFrame 的列顺序写入，空值转换为 NULL。
+    `realtime_data` / `history_data` 等声明了主键的表按主键 UPSERT（重复写入时以新数据为准）。
+    `chunksize` 仅为兼容旧调用保留。
+    """
+    if df is None or df.empty:
+        return 0
 
-    conn = _get_conn(db_path)
     try:
-        _create_table_if_not_exists(conn, table_name, df)
-
-        cols = [f'"{c.replace('"', '""')}"' for c in df.columns]
-        placeholders = ",".join(["?" for _ in df.columns])
-        insert_sql = f'INSERT INTO "{table_name}" ({",".join(cols)}) VALUES ({placeholders})'
-
-        total = 0
-        with conn:
-            for start in range(0, len(df), chunksize):
-                chunk = df.iloc[start:start + chunksize]
-                values = [tuple(None if pd.isna(x) else x for x in row) for row in chunk.values.tolist()]
-                conn.executemany(insert_sql, values)
-                total += len(values)
+        total = bulk_load(df, table_name, db_path=db_path)
         logger.info(f"📌 已将 {total} 条记录写入表 '{table_name}'（数据库：{db_path}）")
         return total
     except Exception as e:
         logger.exception(f"❌ 写入表 '{table_name}' 失败：{e}")
         raise
-    finally:
-        conn.close()
+
+
+def save_to_lake(df: pd.DataFrame, table_name: str) -> int:
+    """开启 `SAVE_TO_PARQUET` 时把 df 同步写入 Parquet 数据湖（失败只记录日志，不影响 CSV / SQLite）。"""
+    if not SAVE_TO_PARQUET or df is None or df.empty:
+        return 0
+    try:
+        return save_to_parquet(df, table_name)
+    except Exception as e:
+        logger.exception(f"⚠️ 写入数据湖 '{table_name}' 失败：{e}")
+        return 0
+
+
+def export_to_lake(tables: Optional[list] = None, db_path: str = DATABASE_PATH) -> dict:
+    """把数据库中的表整表导出到 Parquet 数据湖（首次启用数据湖时回填），返回 {表名: 行数}。
+
+    缺省导出 `history_data`、`realtime_data` 与库中的 `*_merged` 表。
+    """
+    existing = list_tables(db_path)
+    if tables is None:
+        tables = [t for t in existing if t in ("history_data", "realtime_data") or t.endswith("_merged")]
+    result = {}
+    for table_name in tables:
+        if table_name not in existing:
+            logger.warning(f"⚠️ 表 '{table_name}' 不存在，跳过导出")
+            continue
+        df = query_sqlite(f'SELECT * FROM "{table_name}"', db_path=db_path)
+        df = df.drop(columns=["id"], errors="ignore")  # 推断建表的自增 id 不导出
+        save_to_parquet(df, table_name)
+        result[table_name] = len(df)
+    return result
 
 
 def save_raw_data(df: pd.DataFrame, filename: Optional[str] = None, table_name: str = "raw_data") -> Optional[str]:
@@ -168,59 +333,225 @@ def save_raw_data(df: pd.DataFrame, filename: Optional[str] = None, table_name:
     except Exception as e:
         logger.exception(f"⚠️ 写入 SQLite 失败：{e}")
 
+    save_to_lake(df, table_name)
     return csv_path
 
 
-def query_sqlite(query: str, params: Optional[Any] = None, db_path: str = DATABASE_PATH) -> pd.DataFrame:
-    """执行查询并返回 pandas.DataFrame。"""
-    conn = _get_conn(db_path)
+def query_sqlite(query: str, params: Optional[Any] = None, db_path: str = DATABASE_PATH,
+                 engine: Optional[str] = None) -> pd.DataFrame:
+    """执行查询并返回 pandas.DataFrame。
+
+    `engine`（缺省为 `QUERY_ENGINE`）为 "sqlite" 时使用当前线程的只读连接；为 "duckdb" 时交给
+    `duckdb_engine.query_duckdb`（列式执行，可同时查询 `lake.*` 数据湖与 `csv.*` 视图）。
+    """
+    engine = (engine or QUERY_ENGINE).lower()
     try:
-        df = pd.read_sql_query(query, conn, params=params)
-        logger.info(f"🎯 已执行查询：{query}")
+        if engine == "duckdb":
+            from src.data_processing.duckdb_engine import query_duckdb
+
+            df = query_duckdb(query, params=params, db_path=db_path)
+        else:
+            with reader(db_path) as conn:
+                df = pd.read_sql_query(query, conn, params=params)
+        logger.info(f"🎯 已执行查询（{engine}）：{query}")
         return df
     except Exception as e:
         logger.exception(f"⚠️ 查询失败：{e}，SQL: {query}")
         raise
+
+
+def iter_query(query: str, params: Optional[Any] = None, chunksize: int = QUERY_CHUNK_ROWS,
+               db_path: str = DATABASE_PATH, engine: Optional[str] = None, arrow: bool = False):
+    """逐块执行查询：每次产出不超过 `chunksize` 行的 DataFrame（`arrow=True` 时为 pyarrow.RecordBatch）。
+
+    SQLite 引擎用游标 `fetchmany` 分批取行，DuckDB 引擎用 Arrow 流式读取；内存占用取决于块大小，
+    与结果总行数无关。查询无结果时不产出任何块。SQLite 的列可以混存不同类型的值（如 `1` 与 `'x'`），
+    这样的列在 Arrow 块中转为字符串（与导出 CSV 的结果一致）。
+    """
+    engine = (engine or QUERY_ENGINE).lower()
+    chunksize = max(1, int(chunksize))
+    if engine == "duckdb":
+        from src.data_processing.duckdb_engine import get_engine
+
+        for batch in get_engine(db_path).iter_batches(query, params=params, chunksize=chunksize):
+            yield batch if arrow else batch.to_pandas()
+        return
+
+    with reader(db_path) as conn:
+        cursor = conn.execute(query, params or ())
+        try:
+            columns = [d[0] for d in cursor.description or ()]
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                if arrow:
+                    yield _arrow_batch(rows, columns)
+                else:
+                    yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        finally:
+            cursor.close()
+
+
+def _arrow_batch(rows, columns):
+    """把 fetchmany 取出的行转为 RecordBatch；无法推断出统一类型的列转为字符串（空值保持为空）。"""
+    import pyarrow as pa
+
+    arrays = []
+    for values in zip(*rows):
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+
+def _cast_to_schema(table, schema):
+    """把块转换为写入结构，返回 (转换后的表, {需要放宽类型的列名: 新类型})。
+
+    整数与浮点数混合的列放宽为 float64，其余无法转换的列（含字符串块写入数值列）放宽为字符串；
+    需要放宽时返回的表为 None。
+    """
+    import pyarrow as pa
+
+    arrays, widen = [], {}
+    for field, column in zip(schema, table.columns):
+        source = column.type
+        numeric = pa.types.is_integer(source) or pa.types.is_floating(source)
+        target_numeric = pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+        if source != field.type and not pa.types.is_null(source):
+            if numeric and target_numeric and not pa.types.is_floating(field.type):
+                widen[field.name] = pa.float64()
+                continue
+            if not pa.types.is_string(field.type) and not (numeric and target_numeric):
+                widen[field.name] = pa.string()
+                continue
+        try:
+            arrays.append(column.cast(field.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            widen[field.name] = pa.string()
+    return (None if widen else pa.Table.from_arrays(arrays, schema=schema)), widen
+
+
+def _widen_parquet(part_path, new_path, writer, widen):
+    """放宽已写入 `part_path` 的列类型（`widen` 为 {列名: 新类型}）：按行组复制到 `new_path`，返回新的 writer。
+
+    Parquet 文件写入过程中不能修改列类型，只能换一个文件重写；复制按行组进行，内存占用与已写行数无关。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([pa.field(f.name, widen.get(f.name, f.type)) for f in writer.schema])
+    writer.close()
+    new_writer = pq.ParquetWriter(new_path, schema)
+    try:
+        source = pq.ParquetFile(part_path)
+        for i in range(source.num_row_groups):
+            new_writer.write_table(source.read_row_group(i).cast(schema))
+    except Exception:
+        new_writer.close()
+        raise
+    os.remove(part_path)
+    logger.info(f"💾 列 {', '.join(widen)} 出现多种类型的值，导出时放宽为 {', '.join(map(str, widen.values()))}")
+    return new_writer
+
+
+def _parquet_schema(schema):
+    """首块中全为空（null 类型）的列改为 string，后续块按此结构写入。"""
+    import pyarrow as pa
+
+    return pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+
+
+def export_query(query: str, path: str, params: Optional[Any] = None, chunksize: int = QUERY_CHUNK_ROWS,
+                 db_path: str = DATABASE_PATH, engine: Optional[str] = None) -> int:
+    """把查询结果逐块写入文件并返回行数：`.parquet` 后缀写 Parquet（需 pyarrow），否则写 UTF-8-BOM CSV。
+
+    先写入同目录的临时文件，完成后再替换目标文件，中途失败不会留下不完整的结果；查询无结果时不生成文件。
+    """
+    _ensure_dir(path)
+    tmp_path = path + ".part"
+    widened_path = path + ".part2"  # Parquet 列改为字符串时换用的临时文件
+    writer_path = tmp_path
+    total = 0
+    try:
+        if path.lower().endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            writer = None
+            try:
+                for batch in iter_query(query, params, chunksize, db_path=db_path, engine=engine, arrow=True):
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, _parquet_schema(batch.schema))
+                    table, widen = _cast_to_schema(pa.Table.from_batches([batch]), writer.schema)
+                    while widen:
+                        # 后续块中出现了与首块不同类型的值：放宽已写入部分的列类型后继续
+                        other_path = widened_path if writer_path == tmp_path else tmp_path
+                        writer = _widen_parquet(writer_path, other_path, writer, widen)
+                        writer_path = other_path
+                        table, widen = _cast_to_schema(pa.Table.from_batches([batch]), writer.schema)
+                    writer.write_table(table)
+                    total += batch.num_rows
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+                for i, chunk in enumerate(iter_query(query, params, chunksize, db_path=db_path, engine=engine)):
+                    chunk.to_csv(f, index=False, header=(i == 0))
+                    total += len(chunk)
+        if total == 0:
+            return 0  # 无结果时不生成文件
+        os.replace(writer_path, path)
     finally:
-        conn.close()
+        for leftover in (tmp_path, widened_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    logger.info(f"💾 已导出查询结果 {total} 行：{path}")
+    return total
+
+
+def explain_query(query: str, params: Optional[Any] = None, db_path: str = DATABASE_PATH) -> pd.DataFrame:
+    """返回查询的 `EXPLAIN QUERY PLAN`（列：id / parent / notused / detail）。"""
+    with reader(db_path) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall()
+    return pd.DataFrame(rows, columns=["id", "parent", "notused", "detail"])
+
+
+def build_indexes(db_path: str = DATABASE_PATH) -> list:
+    """为库中所有表补建 `INDEX_CATALOGUE` 中登记的索引，返回新建的索引名列表。"""
+    with writer(db_path) as conn:
+        return ensure_indexes(conn)
 
 
 def list_tables(db_path: str = DATABASE_PATH) -> list:
     """列出数据库中的表名。"""
-    conn = _get_conn(db_path)
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+    with reader(db_path) as conn:
+        cur = conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
         tables = [row[0] for row in cur.fetchall()]
-        logger.info(f"数据库表列表：{tables}")
-        return tables
-    finally:
-        conn.close()
+    logger.info(f"数据库表列表：{tables}")
+    return tables
 
 
 def table_info(table_name: str, db_path: str = DATABASE_PATH) -> pd.DataFrame:
     """返回表的列信息（PRAGMA table_info）。"""
-    conn = _get_conn(db_path)
-    try:
+    with reader(db_path) as conn:
         df = pd.read_sql_query(f"PRAGMA table_info('{table_name}')", conn)
-        logger.info(f"表 {table_name} 的列信息已读取（{len(df)} 列）")
-        return df
-    finally:
-        conn.close()
+    logger.info(f"表 {table_name} 的列信息已读取（{len(df)} 列）")
+    return df
 
 def view_db_table(table_name: str, limit: int = 100):
     """查询并打印数据库表内容"""
-    conn = sqlite3.connect(DATABASE_PATH)
     try:
         # 读取表数据
-        df = pd.read_sql(f"SELECT * FROM {table_name} LIMIT {limit}", conn)
+        with reader(DATABASE_PATH) as conn:
+            df = pd.read_sql(f"SELECT * FROM {table_name} LIMIT {limit}", conn)
         logger.info(f"表 {table_name} 的前 {limit} 行数据已读取（共 {len(df)} 行）")
         return df
     except Exception as e:
         logger.exception(f"查询失败：{e}")
         return None
-    finally:
-        conn.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+"""CSV 同步清单。
+
+在 SQLite（与业务数据同库）中维护 `sync_manifest` 表，按 (目标表, 文件路径) 记录每个已同步 CSV 的
+大小、修改时间、内容哈希、行数与同步时间，供 `scripts/sync_csv_to_db.py` 跳过未变化的文件：
+
+- 大小与修改时间都未变：直接跳过，不读取文件；
+- 大小未变、修改时间变化（如复制、touch）：计算内容哈希，与记录一致时只更新修改时间并跳过；
+- 新文件或内容已变化：重新同步，数据写入与清单记录在同一个写事务中提交。
+
+文件路径保存为相对数据库所在目录的路径，数据目录整体搬迁后清单仍然有效。
+"""
+
+import hashlib
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from config.settings import DATABASE_PATH
+from src.data_processing.db_pool import reader, writer
+
+MANIFEST_TABLE = "sync_manifest"
+
+# key 为清单中保存的相对路径；content_hash 为 None 表示尚未计算
+SyncFile = namedtuple("SyncFile", ["path", "key", "size", "mtime_ns", "content_hash"])
+
+
+def file_hash(path: str) -> str:
+    """返回文件内容的 SHA1 摘要（按块读取，不把整个文件读入内存）。"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    """(目标表, 文件) 粒度的同步清单。"""
+
+    def __init__(self, db_path: str = DATABASE_PATH):
+        self.db_path = db_path
+        self.base_dir = os.path.dirname(os.path.abspath(db_path))
+        with writer(db_path) as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{MANIFEST_TABLE}" ('
+                "table_name TEXT NOT NULL, "
+                "path TEXT NOT NULL, "
+                "size INTEGER, "
+                "mtime_ns INTEGER, "
+                "content_hash TEXT, "
+                "row_count INTEGER DEFAULT 0, "
+                "synced_at TEXT, "
+                "PRIMARY KEY (table_name, path))"
+            )
+
+    def _key(self, path):
+        try:
+            return os.path.relpath(os.path.abspath(path), self.base_dir).replace(os.sep, "/")
+        except ValueError:
+            return os.path.abspath(path)  # Windows 下与数据库不在同一盘符
+
+    def entries(self, table_name: str) -> dict:
+        """返回 {相对路径: (size, mtime_ns, content_hash)}。"""
+        with reader(self.db_path) as conn:
+            rows = conn.execute(
+                f'SELECT path, size, mtime_ns, content_hash FROM "{MANIFEST_TABLE}" WHERE table_name = ?',
+                (table_name,),
+            ).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def plan(self, table_name: str, paths, force: bool = False, dry_run: bool = False):
+        """把 `paths` 分为需要同步的文件与可跳过的文件，返回 (待同步 SyncFile 列表, 跳过数)。
+
+        内容未变、仅修改时间变化的文件在非 dry-run 时顺带更新清单中的修改时间。
+        `force=True` 时忽略清单，全部重新同步。
+        """
+        known = {} if force else self.entries(table_name)
+        pending, skipped, touched = [], 0, []
+        for path in paths:
+            st = os.stat(path)
+            item = SyncFile(path, self._key(path), st.st_size, st.st_mtime_ns, None)
+            record = known.get(item.key)
+            if record is not None and record[0] == item.size:
+                if record[1] == item.mtime_ns:
+                    skipped += 1
+                    continue
+                item = item._replace(content_hash=file_hash(path))
+                if item.content_hash == record[2]:
+                    skipped += 1
+                    touched.append((item.mtime_ns, table_name, item.key))
+                    continue
+            pending.append(item)
+        if touched and not dry_run:
+            with writer(self.db_path) as conn:
+                conn.executemany(
+                    f'UPDATE "{MANIFEST_TABLE}" SET mtime_ns = ? WHERE table_name = ? AND path = ?', touched)
+        return pending, skipped
+
+    def record(self, conn, table_name: str, item: SyncFile, row_count: int):
+        """在调用方的写事务中记录（或覆盖）文件的同步结果。"""
+        content_hash = item.content_hash or file_hash(item.path)
+        conn.execute(
+            f'INSERT INTO "{MANIFEST_TABLE}" '
+            "(table_name, path, size, mtime_ns, content_hash, row_count, synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(table_name, path) DO UPDATE SET "
+            "size = excluded.size, mtime_ns = excluded.mtime_ns, content_hash = excluded.content_hash, "
+            "row_count = excluded.row_count, synced_at = excluded.synced_at",
+            (table_name, item.key, item.size, item.mtime_ns, content_hash, int(row_count),
+             datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+
+
+__all__ = ["SyncManifest", "SyncFile", "file_hash", "MANIFEST_TABLE"]
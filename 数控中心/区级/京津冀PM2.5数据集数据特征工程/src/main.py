@@ -11,8 +11,15 @@ import os
 import runpy
 
 
-def run_history(batch_size: Optional[int] = None):
-	"""运行历史数据爬取（调用 `src.crawlers.aqi_history.AQIHistoryCrawler`）。"""
+def run_history(batch_size: Optional[int] = None, workers: Optional[int] = None, resume: bool = False,
+                incremental: bool = False, use_cache: Optional[bool] = None):
+	"""运行历史数据爬取（调用 `src.crawlers.aqi_history.AQIHistoryCrawler`）。
+
+	`workers` 为并发线程数，缺省使用 `config.settings.HISTORY_CRAWL_WORKERS`（1 为串行）；
+	`resume=True` 时跳过爬取台账（`crawl_ledger`）中已完成的城市月份；
+	`incremental=True` 时只爬取当前月、天数不全和缺失的月份（见 `history --plan`）；
+	`use_cache=True` 时启用本地响应缓存（缺省按 `HTTP_CACHE_ENABLED`）。
+	"""
 	try:
 		from src.crawlers.aqi_history import AQIHistoryCrawler
 		from config.settings import HISTORY_CRAWL_BATCH_SIZE
@@ -20,12 +27,48 @@ def run_history(batch_size: Optional[int] = None):
 		print(f"无法导入历史爬虫模块：{e}")
 		return
 
-	crawler = AQIHistoryCrawler()
-	crawler.crawl_all(batch_size=batch_size or HISTORY_CRAWL_BATCH_SIZE)
+	crawler = AQIHistoryCrawler(use_cache=use_cache)
+	crawler.crawl_all(batch_size=batch_size or HISTORY_CRAWL_BATCH_SIZE, workers=workers, resume=resume,
+	                  incremental=incremental)
 
 
-def run_realtime(cities: Optional[list] = None):
-    """运行实时数据爬取（调用 `src.crawlers.aqi_realtime.AQIRealtimeCrawler`）。"""
+def run_history_plan():
+	"""输出历史数据增量爬取计划（dry-run），不创建爬虫、不发起任何请求。"""
+	try:
+		from src.crawlers.history_planner import candidate_months, load_coverage, plan_history_crawl, print_plan
+		from src.crawlers.crawl_ledger import CrawlLedger
+		from src.utils.city_mapper import get_all_cities
+	except Exception as e:
+		print(f"无法导入历史爬取计划模块：{e}")
+		return
+
+	cities = get_all_cities()
+	months = candidate_months()
+	coverage = load_coverage()
+	plan = plan_history_crawl(cities, months, coverage=coverage, completed=CrawlLedger().completed_units())
+	total_units = len(months) * sum(len(city_list) for city_list in cities.values())
+	print_plan(plan, total_units, coverage=coverage)
+
+
+def run_reparse(months: Optional[list] = None, workers: Optional[int] = None):
+	"""从页面归档离线重建历史数据（Hisraw CSV 与 `history_data`），不发起任何请求。
+
+	`months` 为 YYYYMM 列表，缺省重解析归档中的全部月份；`workers` 为进程数。
+	"""
+	try:
+		from src.crawlers.history_reparse import reparse_history
+	except Exception as e:
+		print(f"无法导入历史重解析模块：{e}")
+		return
+
+	reparse_history(months=months, workers=workers)
+
+
+def run_realtime(cities: Optional[list] = None, workers: Optional[int] = None):
+    """运行实时数据爬取（调用 `src.crawlers.aqi_realtime.AQIRealtimeCrawler`）。
+
+    `workers` 为并发线程数，缺省使用 `config.settings.REALTIME_CRAWL_WORKERS`（1 为串行）。
+    """
     try:
         from src.crawlers.aqi_realtime import AQIRealtimeCrawler
     except Exception as e:
@@ -33,7 +76,7 @@ def run_realtime(cities: Optional[list] = None):
         return
 
     crawler = AQIRealtimeCrawler()
-    crawler.crawl_realtime_batch(cities=cities)
+    crawler.crawl_realtime_batch(cities=cities, workers=workers)
 
 
 # 导入定时实时爬取功能
@@ -64,6 +107,43 @@ def run_sync_csv_to_db():
     finally:
         sys.argv = old_argv
 
+def run_migrate_db():
+    """把旧库中无主键的 `realtime_data` / `history_data` 迁移为声明结构（按主键去重）。"""
+    try:
+        from src.data_processing.schema import migrate_all
+    except Exception as e:
+        print(f"无法导入数据库结构模块：{e}")
+        return
+
+    results = migrate_all()
+    for table_name, (before, after) in results.items():
+        print(f"🧱 {table_name}：{before} 行 → {after} 行（去除重复 {before - after} 行）")
+    if not results:
+        print("✅ 没有需要迁移的表")
+
+    from src.data_processing.storage import build_indexes
+
+    created = build_indexes()
+    print(f"🗂️ 新建索引 {len(created)} 个" if created else "✅ 索引已齐全")
+
+def run_lake_export(tables=None):
+    """把数据库中的表导出到 Parquet 数据湖（按 年份/城市 分区）。"""
+    try:
+        from src.data_processing.storage import export_to_lake
+        from config.settings import PARQUET_LAKE_DIR
+    except Exception as e:
+        print(f"无法导入存储模块：{e}")
+        return
+
+    try:
+        result = export_to_lake(tables)
+    except ImportError as e:
+        print(f"❌ {e}")
+        return
+    for table_name, rows in result.items():
+        print(f"🪣 {table_name}：{rows} 行")
+    print(f"✅ 已导出到数据湖：{PARQUET_LAKE_DIR}")
+
 # 导入数据清洗功能
 from src.data_processing.cleaner_manager import run_clean_history, run_clean_realtime, run_clean
 
@@ -72,11 +152,28 @@ from src.data_processing.cleaner_manager import run_clean_history, run_clean_rea
 from src.data_processing.data_sync import data_sync
 
 
+def _option_value(args, name, cast=str):
+    """从命令行参数中读取 `--name value` 形式的选项值，不存在时返回 None。"""
+    if name in args:
+        idx = args.index(name)
+        if idx + 1 < len(args):
+            try:
+                return cast(args[idx + 1])
+            except ValueError:
+                print(f"参数 {name} 的取值无效：{args[idx + 1]}")
+    return None
+
+
 def _usage():
     print("✅ 欢迎使用-AQI数据采集项目！🎯")
-    print("🔄 用法: python -m src.main [history|realtime|history_realtime|scheduled|query|sync|clean_history|clean_realtime|clean|data_sync]")
-    print("  ├─ history:    🚀 运行历史数据爬取")
-    print("  ├─ realtime:   🚀 运行单次实时数据爬取")
+    print("🔄 用法: python -m src.main [history|reparse|realtime|history_realtime|scheduled|query|sync|migrate_db|clean_history|clean_realtime|clean|data_sync|lake_export]")
+    print("  ├─ history:    🚀 运行历史数据爬取（--workers N 指定并发线程数，1 为串行）")
+    print("                  ├─ python -m src.main history --resume  (断点续爬，跳过已完成的城市月份)")
+    print("                  ├─ python -m src.main history --plan  (仅输出增量爬取计划与预计请求数)")
+    print("                  ├─ python -m src.main history --cache  (启用本地响应缓存，重跑时不重复请求)")
+    print("                  └─ python -m src.main history --incremental  (只爬取当前月/不完整/缺失的月份)")
+    print("  ├─ realtime:   🚀 运行单次实时数据爬取（--workers N 指定并发线程数，1 为串行）")
+    print("  ├─ reparse:    📦 从页面归档离线重建历史数据（--months 202501,202502 --workers N）")
     print("  ├─ history_realtime:   🚀 同时运行 历史数据 和 实时数据爬取")
     print("  ├─ scheduled:  🛑 启动定时任务，每小时运行一次实时爬取")
     print("  ├─ query:      🔎 启动交互式数据库查看器（REPL）或执行查询，例如：")
@@ -86,6 +183,8 @@ def _usage():
     print("  ├─ sync:       🔁 将 data 中的 CSV 同步到数据库（历史/实时）。用法示例：") 
     print("                  ├─ python -m src.main sync --target both")
     print("                  └─ python -m src.main sync --target realtime --dry-run")
+    print("  ├─ migrate_db:     🧱 为 realtime_data / history_data 建立复合主键并去除重复行，补建常用查询索引（旧库执行一次）")
+    print("  ├─ lake_export:    🪣 把数据库表导出到 Parquet 数据湖（需 pyarrow；--tables history_data,realtime_data）")
     print("  ├─ clean_history:  🧹 清洗历史数据（扫描 data/Hisraw 并保存 processed/ + DB）")
     print("  ├─ clean_realtime: 🧹 清洗实时数据（扫描 data/Newraw 并保存 processed/ + DB）")
     print("  ├─ clean:          🧹 同时清洗历史与实时数据（先历史后实时）")
@@ -97,10 +196,18 @@ if __name__ == "__main__":
         sys.exit(1)
 
     cmd = sys.argv[1].lower()
+    opts = sys.argv[2:]
     if cmd == "history":
-        run_history()
+        if "--plan" in opts:
+            run_history_plan()
+        else:
+            run_history(workers=_option_value(opts, "--workers", int), resume="--resume" in opts,
+                        incremental="--incremental" in opts, use_cache=True if "--cache" in opts else None)
     elif cmd == "realtime":
-        run_realtime()
+        run_realtime(workers=_option_value(opts, "--workers", int))
+    elif cmd == "reparse":
+        months = _option_value(opts, "--months")
+        run_reparse(months=months.split(",") if months else None, workers=_option_value(opts, "--workers", int))
     elif cmd == "history_realtime":
         # 同时爬取历史和实时
         run_history()
@@ -112,6 +219,11 @@ if __name__ == "__main__":
     elif cmd == "sync":
         # 将后续参数传递给 scripts/sync_csv_to_db.py，并以脚本形式运行（dry-run / real run）
         run_sync_csv_to_db()
+    elif cmd == "migrate_db":
+        run_migrate_db()
+    elif cmd == "lake_export":
+        tables = _option_value(opts, "--tables")
+        run_lake_export(tables.split(",") if tables else None)
     elif cmd == "clean_history":
         # 清洗历史数据（data/raw）
         run_clean_history()
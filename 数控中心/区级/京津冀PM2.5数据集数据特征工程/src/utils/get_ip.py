@@ -1,7 +1,19 @@
-"""IP查询工具模块"""
+"""IP查询工具模块
+
+`get_current_ip()` 每次都会依次访问外部 IP 回显接口；爬取过程中应使用 `get_cached_ip()`：
+启动时查询一次，之后按 `EGRESS_IP_TTL` 在后台刷新（刷新期间返回上一次的结果），
+会话重建或更换代理后调用 `invalidate_cached_ip()` 触发刷新。
+"""
 import requests
 import re
-from config.settings import TUNNEL_PROXY, USE_TUNNEL_PROXY  # 引入代理配置
+import threading
+import time
+from config.settings import TUNNEL_PROXY, USE_TUNNEL_PROXY, EGRESS_IP_TTL  # 引入代理配置
+
+_ip_lock = threading.Lock()
+_cached_ip = None
+_cached_at = 0.0  # 上次查询完成的时间（time.monotonic），0 表示需要刷新
+_refreshing = False
 
 def get_current_ip():
     """
@@ -55,4 +67,37 @@ def get_current_ip():
             continue
     
     # 所有API都失败时返回错误
-    return "获取IP失败：所有备选接口均无法访问"
\ No newline at end of file
+    return "获取IP失败：所有备选接口均无法访问"
+
+
+def _refresh_cached_ip():
+    global _cached_ip, _cached_at, _refreshing
+    ip = get_current_ip()
+    with _ip_lock:
+        _cached_ip = ip
+        _cached_at = time.monotonic()
+        _refreshing = False
+    return ip
+
+
+def get_cached_ip(max_age=EGRESS_IP_TTL, refresh=False):
+    """返回缓存的出口IP（不在请求热路径上访问外部接口）。
+
+    首次调用或 `refresh=True` 时同步查询；缓存超过 `max_age` 秒或已失效时在后台线程刷新，
+    本次先返回上一次的结果。
+    """
+    global _refreshing
+    with _ip_lock:
+        if not refresh and _cached_ip is not None:
+            if time.monotonic() - _cached_at >= max_age and not _refreshing:
+                _refreshing = True
+                threading.Thread(target=_refresh_cached_ip, name="egress-ip", daemon=True).start()
+            return _cached_ip
+    return _refresh_cached_ip()
+
+
+def invalidate_cached_ip():
+    """标记缓存的出口IP需要刷新（会话重建、更换代理后调用），下次 `get_cached_ip` 时在后台重新查询。"""
+    global _cached_at
+    with _ip_lock:
+        _cached_at = 0.0
@@ -0,0 +1,244 @@
+"""本地 HTTP 响应缓存。
+
+为 `create_session(cache=True)` 创建的会话提供磁盘缓存层：
+
+- 以 方法 + 完整 URL（含查询参数）+ 请求体 作为缓存键；
+- 响应体经 zlib 压缩后存放在 `HTTP_CACHE_DIR/cache.db`（SQLite）中；
+- 有效期按 `HTTP_CACHE_TTL_RULES` 中的 URL 正则决定，0 表示不缓存；
+- 过期条目若带有 ETag / Last-Modified，则发送条件请求，服务器返回 304 时直接复用缓存；
+- 总体积超过 `HTTP_CACHE_MAX_BYTES` 时按最近访问时间（LRU）淘汰。
+
+缓存命中时不会访问网络，`safe_get` / `safe_post` 也会跳过请求前的随机等待。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from config.settings import (
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    HTTP_CACHE_TTL_RULES,
+    HTTP_CACHE_ACTIVE_TTL,
+    HTTP_CACHE_DEFAULT_TTL,
+)
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 解压后的响应体不再对应这些头，重建响应时去掉
+_DROP_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class ResponseCache:
+    """基于 SQLite 的压缩响应缓存（线程安全）。"""
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES,
+                 ttl_rules=HTTP_CACHE_TTL_RULES, default_ttl=HTTP_CACHE_DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.ttl_rules = [(re.compile(pattern), int(ttl)) for pattern, ttl in ttl_rules]
+        self.default_ttl = int(default_ttl)
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "cache.db"), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, method TEXT, url TEXT, status INTEGER, headers TEXT, "
+                "body BLOB, size INTEGER, etag TEXT, last_modified TEXT, "
+                "stored_at REAL, expires_at REAL, last_access REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+
+    @staticmethod
+    def make_key(method, url, body=None):
+        """缓存键：方法 + 完整 URL + 请求体的 SHA1。"""
+        digest = hashlib.sha1(f"{method.upper()} {url}".encode("utf-8"))
+        if body:
+            digest.update(body if isinstance(body, bytes) else str(body).encode("utf-8"))
+        return digest.hexdigest()
+
+    def ttl_for(self, url):
+        """返回 URL 对应的缓存有效期（秒），0 表示不缓存。"""
+        for pattern, ttl in self.ttl_rules:
+            match = pattern.search(url)
+            if not match:
+                continue
+            month = match.groupdict().get("month")
+            if ttl > 0 and month and month >= datetime.now().strftime("%Y%m"):
+                # 当前月份页面仍在更新，使用较短的有效期
+                return min(ttl, HTTP_CACHE_ACTIVE_TTL)
+            return ttl
+        return self.default_ttl
+
+    def lookup(self, key):
+        """读取缓存条目，不存在返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, etag, last_modified, expires_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, etag, last_modified, expires_at = row
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires_at": expires_at,
+        }
+
+    def is_fresh(self, method, url, params=None, data=None):
+        """判断请求是否可直接由缓存应答（不访问网络）。"""
+        prepared = requests.Request(method, url, params=params, data=data).prepare()
+        if self.ttl_for(prepared.url) <= 0:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM responses WHERE key = ?",
+                (self.make_key(method, prepared.url, prepared.body),),
+            ).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def store(self, key, method, url, response, ttl):
+        """写入（或覆盖）缓存条目，并在超出体积上限时淘汰旧条目。"""
+        body = zlib.compress(response.content, 6)
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS}
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, method, url, status, headers, body, size, etag, last_modified, stored_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, method, url, response.status_code, json.dumps(headers, ensure_ascii=False), body, len(body),
+                 response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now + ttl, now),
+            )
+        self._evict()
+
+    def refresh(self, key, ttl, headers=None):
+        """条件请求返回 304 后延长有效期，并更新 ETag / Last-Modified。"""
+        headers = headers or {}
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ?, last_access = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (now + ttl, now, headers.get("ETag"), headers.get("Last-Modified"), key),
+            )
+
+    def touch(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+
+    def _evict(self):
+        """总体积超过上限时，按最近访问时间从旧到新删除条目。"""
+        with self._lock, self._conn:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            removed = 0
+            for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+        logger.info(f"🧹 HTTP 缓存超出上限，已淘汰 {removed} 条最久未使用的响应")
+
+    def build_response(self, entry, request):
+        """由缓存条目构造 `requests.Response`（`from_cache=True`）。"""
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = zlib.decompress(entry["body"])
+        response.url = request.url
+        response.request = request
+        response.reason = "OK"
+        response.from_cache = True
+        return response
+
+    def stats(self):
+        """返回缓存条目数、压缩后体积与本进程的命中统计。"""
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": size, "hits": self.hits,
+                "revalidated": self.revalidated, "misses": self.misses}
+
+
+class CachingAdapter(HTTPAdapter):
+    """在 `HTTPAdapter.send` 外包一层缓存：命中直接返回，过期时做条件请求。"""
+
+    def __init__(self, cache, *args, **kwargs):
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        ttl = self.cache.ttl_for(request.url)
+        if ttl <= 0 or request.method not in ("GET", "POST"):
+            return super().send(request, **kwargs)
+
+        key = self.cache.make_key(request.method, request.url, request.body)
+        entry = self.cache.lookup(key)
+        if entry is not None and entry["expires_at"] > time.time():
+            self.cache.hits += 1
+            self.cache.touch(key)
+            return self.cache.build_response(entry, request)
+
+        if entry is not None:
+            # 过期条目：带上验证头发起条件请求
+            if entry["etag"]:
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.revalidated += 1
+            self.cache.refresh(key, ttl, response.headers)
+            response.close()
+            return self.cache.build_response(entry, request)
+
+        self.cache.misses += 1
+        if response.status_code == 200 and not kwargs.get("stream"):
+            try:
+                self.cache.store(key, request.method, request.url, response, ttl)
+            except Exception as e:
+                logger.warning(f"⚠️ 写入 HTTP 缓存失败：{request.url}，错误：{e}")
+        response.from_cache = False
+        return response
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def get_response_cache(cache_dir=HTTP_CACHE_DIR):
+    """返回进程内共享的 `ResponseCache`（同一目录只打开一次）。"""
+    with _shared_lock:
+        cache = _shared_caches.get(cache_dir)
+        if cache is None:
+            cache = ResponseCache(cache_dir=cache_dir)
+            _shared_caches[cache_dir] = cache
+        return cache
+
+
+__all__ = ["ResponseCache", "CachingAdapter", "get_response_cache"]
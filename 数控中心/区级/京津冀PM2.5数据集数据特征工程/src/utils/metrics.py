@@ -0,0 +1,397 @@
+"""爬取指标（Prometheus 文本格式）。
+
+进程内维护一组带标签的计数器、仪表与直方图（线程安全，不依赖 prometheus_client），
+历史与实时爬虫共用：
+
+- `aqi_crawl_http_request_seconds`（直方图）：单次 HTTP 请求耗时，不含限速等待，按域名/方法；
+- `aqi_crawl_http_responses_total`：按域名与状态码（超时、连接错误记为 timeout / error）的请求数；
+- `aqi_crawl_http_response_bytes_total`：下载字节数；`aqi_crawl_http_cache_hits_total`：本地缓存命中数；
+- `aqi_crawl_http_retries_total`：重试次数（适配器层重试与 safe_get/safe_post 的重试）；
+- `aqi_crawl_parse_seconds` / `aqi_crawl_save_seconds`（直方图）：解析与落盘耗时，按爬虫；
+- `aqi_crawl_pages_total`：按爬虫与结果（ok / failed）统计的页面（城市）数；
+- `aqi_crawl_rows_written_total`：按爬虫与去向（csv / sqlite）统计的写入行数；
+- `aqi_crawl_run_seconds` / `aqi_crawl_run_pages_per_second` / `aqi_crawl_last_run_timestamp_seconds`（仪表）：
+  最近一轮的耗时、吞吐与结束时间，用于吞吐下降告警。
+
+`export_metrics(name)` 把带 `crawler="<name>"` 标签的指标与本进程的 HTTP 指标写入 `METRICS_DIR/<name>.prom`
+（可被 node_exporter textfile collector 采集）。HTTP 指标本身只按域名统计，导出时附加 `crawler="<name>"` 标签，
+每个文件只由一个爬虫写入、文件之间没有重复序列，历史爬虫与常驻的实时爬虫分进程运行时计数器也不会互相覆盖；
+`history_realtime` 在一个进程内先后运行两个爬虫时，`realtime.prom` 中的 HTTP 计数包含历史爬虫的请求
+（两者访问的域名不同，可按 host 区分），
+`start_metrics_server()` 在 `METRICS_HTTP_PORT` 上提供 `/metrics`；
+`snapshot()` + `log_summary()` 在每轮结束时把本轮增量汇总写入日志。
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import METRICS_DIR, METRICS_HTTP_PORT
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 秒级耗时的默认分桶（请求耗时 10ms ~ 60s）
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def render(self, select=None, const_labels=None):
+        """渲染为文本行；`select(metric, key)` 为 False 的序列不输出，全部被过滤时不输出该指标。
+
+        `const_labels`（{标签: 取值}）附加到指标本身没有的标签上。
+        """
+        samples = sorted(self.snapshot().items())
+        if select is not None:
+            samples = [(key, value) for key, value in samples if select(self, key)]
+            if not samples:
+                return []
+        extra = [(k, str(v)) for k, v in (const_labels or {}).items() if k not in self.labelnames]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in samples:
+            lines.extend(self._render_sample(key, value, extra))
+        return lines
+
+    def _render_sample(self, key, value, extra=()):
+        return [f"{self.name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    @staticmethod
+    def _copy(value):
+        counts, total, count = value
+        return list(counts), total, count
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：with 块的耗时记入直方图。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, value, extra=()):
+        counts, total, count = value
+        extra = list(extra)
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, extra + [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key, extra)} {total!r}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key, extra)} {count}")
+        return lines
+
+    def quantile(self, q, counts):
+        """按分桶线性插值估算分位数（`counts` 为各桶非累计计数）。"""
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return lower
+
+
+class MetricsRegistry:
+    """指标注册表：按名称保存指标并整体渲染为 Prometheus 文本格式。"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self, select=None, const_labels=None):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(select, const_labels))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in metrics.items()}
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "aqi_crawl_http_request_seconds", "HTTP 请求耗时（秒，不含限速等待）", ("host", "method"))
+HTTP_RESPONSES = REGISTRY.counter(
+    "aqi_crawl_http_responses_total", "HTTP 请求结果数（状态码 / timeout / error）", ("host", "code"))
+HTTP_RESPONSE_BYTES = REGISTRY.counter(
+    "aqi_crawl_http_response_bytes_total", "下载的响应体字节数", ("host",))
+HTTP_CACHE_HITS = REGISTRY.counter(
+    "aqi_crawl_http_cache_hits_total", "本地响应缓存命中数", ("host",))
+HTTP_RETRIES = REGISTRY.counter(
+    "aqi_crawl_http_retries_total", "HTTP 重试次数", ("host",))
+PARSE_SECONDS = REGISTRY.histogram(
+    "aqi_crawl_parse_seconds", "页面解析 / 接口解码耗时（秒）", ("crawler",))
+SAVE_SECONDS = REGISTRY.histogram(
+    "aqi_crawl_save_seconds", "落盘（CSV + SQLite）耗时（秒）", ("crawler",))
+PAGES = REGISTRY.counter(
+    "aqi_crawl_pages_total", "爬取的页面（城市）数", ("crawler", "result"))
+ROWS_WRITTEN = REGISTRY.counter(
+    "aqi_crawl_rows_written_total", "写入的数据行数", ("crawler", "sink"))
+RUN_SECONDS = REGISTRY.gauge(
+    "aqi_crawl_run_seconds", "最近一轮爬取总耗时（秒）", ("crawler",))
+RUN_PAGES_PER_SECOND = REGISTRY.gauge(
+    "aqi_crawl_run_pages_per_second", "最近一轮爬取吞吐（页/秒）", ("crawler",))
+LAST_RUN_TIMESTAMP = REGISTRY.gauge(
+    "aqi_crawl_last_run_timestamp_seconds", "最近一轮爬取结束时间（Unix 时间戳）", ("crawler",))
+
+
+_GAUGES = {RUN_SECONDS.name, RUN_PAGES_PER_SECOND.name, LAST_RUN_TIMESTAMP.name}
+
+
+def snapshot():
+    """返回当前全部指标的快照，供 `log_summary(since=...)` 计算本轮增量。"""
+    return REGISTRY.snapshot()
+
+
+def finish_run(crawler, elapsed, since=None):
+    """记录一轮爬取的耗时、吞吐与结束时间（吞吐按本轮增量的页面数计算）。"""
+    pages = sum(
+        value for key, value in _delta(REGISTRY.snapshot(), since).get(PAGES.name, {}).items()
+        if key[0] == crawler
+    )
+    RUN_SECONDS.set(round(elapsed, 3), crawler=crawler)
+    RUN_PAGES_PER_SECOND.set(round(pages / elapsed, 3) if elapsed > 0 else 0.0, crawler=crawler)
+    LAST_RUN_TIMESTAMP.set(int(time.time()), crawler=crawler)
+
+
+def _delta(current, since):
+    if not since:
+        return current
+    result = {}
+    for name, samples in current.items():
+        before = since.get(name, {})
+        result[name] = {}
+        for key, value in samples.items():
+            old = before.get(key)
+            if isinstance(value, tuple):
+                if old is not None:
+                    value = ([a - b for a, b in zip(value[0], old[0])], value[1] - old[1], value[2] - old[2])
+            elif old is not None and name not in _GAUGES:
+                value = value - old
+            result[name][key] = value
+    return result
+
+
+def log_summary(log=None, since=None):
+    """把本轮（自 `since` 快照以来）的指标增量汇总写入日志。"""
+    log = log or logger.info
+    data = _delta(REGISTRY.snapshot(), since)
+
+    requests = {}
+    for (host, _method), (counts, total, count) in data.get(HTTP_REQUEST_SECONDS.name, {}).items():
+        entry = requests.setdefault(host, [[0] * len(counts), 0.0, 0])
+        entry[0] = [a + b for a, b in zip(entry[0], counts)]
+        entry[1] += total
+        entry[2] += count
+    codes = {}
+    for (host, code), value in data.get(HTTP_RESPONSES.name, {}).items():
+        if value:
+            codes.setdefault(host, []).append(f"{code}×{int(value)}")
+    byte_counts = {key[0]: value for key, value in data.get(HTTP_RESPONSE_BYTES.name, {}).items()}
+    cache_hits = {key[0]: value for key, value in data.get(HTTP_CACHE_HITS.name, {}).items()}
+    retries = {key[0]: value for key, value in data.get(HTTP_RETRIES.name, {}).items()}
+    for host, (counts, total, count) in sorted(requests.items()):
+        if not count:
+            continue
+        log(
+            f"   ├─ 📈 {host}：请求 {count} 次，p50 {HTTP_REQUEST_SECONDS.quantile(0.5, counts) * 1000:.0f}ms，"
+            f"p95 {HTTP_REQUEST_SECONDS.quantile(0.95, counts) * 1000:.0f}ms，"
+            f"下载 {byte_counts.get(host, 0) / 1024 / 1024:.2f}MB，缓存命中 {int(cache_hits.get(host, 0))} 次，"
+            f"重试 {int(retries.get(host, 0))} 次，状态码 {', '.join(sorted(codes.get(host, []))) or '-'}"
+        )
+    for metric, label in ((PARSE_SECONDS, "解析"), (SAVE_SECONDS, "落盘")):
+        for (crawler,), (_counts, total, count) in sorted(data.get(metric.name, {}).items()):
+            if count:
+                log(f"   ├─ ⏱️ {crawler} {label}：{count} 次，共 {total:.2f}秒，平均 {total / count * 1000:.1f}ms")
+    pages = {}
+    for (crawler, result), value in data.get(PAGES.name, {}).items():
+        pages.setdefault(crawler, {})[result] = int(value)
+    rows = {}
+    for (crawler, sink), value in data.get(ROWS_WRITTEN.name, {}).items():
+        rows.setdefault(crawler, {})[sink] = int(value)
+    for crawler in sorted(set(pages) | set(rows)):
+        p = pages.get(crawler, {})
+        r = rows.get(crawler, {})
+        log(
+            f"   ├─ 📊 {crawler}：成功 {p.get('ok', 0)} 个页面，失败 {p.get('failed', 0)} 个，"
+            f"写入 CSV {r.get('csv', 0)} 行、SQLite {r.get('sqlite', 0)} 行"
+        )
+
+
+def _crawler_of(metric, key):
+    return key[metric.labelnames.index("crawler")] if "crawler" in metric.labelnames else None
+
+
+def _write_prom(path, text):
+    # 先写临时文件再替换，避免采集到半个文件
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def export_metrics(name, metrics_dir=METRICS_DIR):
+    """以 Prometheus 文本格式导出指标，返回 `metrics_dir/<name>.prom` 的路径。
+
+    `<name>.prom` 包含 `crawler="<name>"` 的序列与附加了 `crawler="<name>"` 标签的 HTTP 序列，
+    不包含其他爬虫的序列。`metrics_dir` 为空时不导出。
+    """
+    if not metrics_dir:
+        return None
+    path = os.path.join(metrics_dir, f"{name}.prom")
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        _write_prom(path, REGISTRY.render(lambda metric, key: _crawler_of(metric, key) in (name, None),
+                                          const_labels={"crawler": name}))
+        return path
+    except Exception as e:
+        logger.error(f"⚠️ 写入指标文件失败：{e}")
+        return None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_HTTP_PORT, host="127.0.0.1"):
+    """在后台线程启动 `/metrics` HTTP 服务（`port` 为空时不启动，重复调用只启动一次），返回端口。"""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError as e:
+                logger.error(f"⚠️ 启动指标服务失败（端口 {port}）：{e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"📈 指标服务已启动：http://{host}:{_server.server_address[1]}/metrics")
+        return _server.server_address[1]
+
+
+__all__ = [
+    "REGISTRY", "Counter", "Gauge", "Histogram", "MetricsRegistry",
+    "HTTP_REQUEST_SECONDS", "HTTP_RESPONSES", "HTTP_RESPONSE_BYTES", "HTTP_CACHE_HITS", "HTTP_RETRIES",
+    "PARSE_SECONDS", "SAVE_SECONDS", "PAGES", "ROWS_WRITTEN",
+    "snapshot", "finish_run", "log_summary", "export_metrics", "start_metrics_server",
+]
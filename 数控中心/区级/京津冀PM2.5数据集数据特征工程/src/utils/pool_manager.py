@@ -0,0 +1,166 @@
+"""共享 HTTP 连接池管理。
+
+`create_session` 创建的所有会话挂载同一个适配器（按是否启用响应缓存区分），
+历史、实时与 Selenium 版爬虫、各工作线程以及重试过程因此复用同一组按域名划分的连接池，
+HTTPS 接口（如 air.cnemc.cn:18007）不必每次重新握手。
+
+- 会话关闭时不关闭共享连接池，进程退出前可调用 `shutdown_pools()`；
+- 连接被远端重置时调用 `evict_broken(url)`，只关闭该域名池中已断开的空闲连接，
+  不丢弃整个池（取代原先重建整个 `requests.Session` 的做法）；
+- `pool_stats()` 返回各域名连接池的统计：open / idle / in_use / created / reused / evicted。
+"""
+
+import queue
+import threading
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.connection import is_connection_dropped
+
+from config.settings import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE
+from src.utils.http_cache import CachingAdapter
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_lock = threading.Lock()
+_adapters = {}  # 是否启用缓存 -> 共享适配器
+_evicted = {}   # "host:port" -> 已剔除的失效连接数
+
+
+class _SharedPoolMixin:
+    """共享适配器：会话关闭时保留连接池，由 `shutdown_pools` 统一关闭。"""
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+
+class SharedPoolAdapter(_SharedPoolMixin, HTTPAdapter):
+    pass
+
+
+class SharedCachingAdapter(_SharedPoolMixin, CachingAdapter):
+    pass
+
+
+def get_shared_adapter(max_retries, cache=None):
+    """返回进程内共享的适配器；`cache` 为响应缓存实例时返回带缓存的适配器。
+
+    同一类适配器只在首次调用时创建，之后传入的 `max_retries` 不再生效。
+    """
+    key = cache is not None
+    with _lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            options = dict(max_retries=max_retries, pool_connections=HTTP_POOL_CONNECTIONS,
+                           pool_maxsize=HTTP_POOL_MAXSIZE, pool_block=False)
+            adapter = SharedCachingAdapter(cache, **options) if key else SharedPoolAdapter(**options)
+            _adapters[key] = adapter
+        return adapter
+
+
+def _iter_pools():
+    """遍历所有共享适配器（含代理）中的连接池。"""
+    with _lock:
+        adapters = list(_adapters.values())
+    for adapter in adapters:
+        managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+        for manager in managers:
+            if manager is None:
+                continue
+            for pool_key in list(manager.pools.keys()):
+                pool = manager.pools.get(pool_key)
+                if pool is not None:
+                    yield pool
+
+
+def _pool_name(pool):
+    return f"{pool.host}:{pool.port}"
+
+
+def evict_broken(url=None):
+    """关闭 `url` 所在域名（缺省为全部）连接池中已断开的空闲连接，返回剔除数量。
+
+    已关闭的连接对象仍放回池中，下次取出时由 urllib3 重新建立连接；健康的空闲连接保持不动。
+    """
+    from src.utils.rate_limiter import host_of
+
+    target = host_of(url) if url else None
+    evicted = 0
+    for pool in _iter_pools():
+        if pool.pool is None:
+            continue
+        if target is not None and host_of(f"{pool.scheme}://{_pool_name(pool)}") != target:
+            continue
+        drained = []
+        while True:
+            try:
+                drained.append(pool.pool.get(block=False))
+            except queue.Empty:
+                break
+        count = 0
+        for conn in drained:
+            if conn is not None and getattr(conn, "sock", None) is not None and is_connection_dropped(conn):
+                conn.close()
+                count += 1
+            try:
+                pool.pool.put(conn, block=False)
+            except queue.Full:
+                if conn is not None:
+                    conn.close()
+        if count:
+            with _lock:
+                _evicted[_pool_name(pool)] = _evicted.get(_pool_name(pool), 0) + count
+            logger.info(f"🔌 {_pool_name(pool)}：剔除 {count} 个已断开的连接，保留其余 {len(drained) - count} 个")
+        evicted += count
+    return evicted
+
+
+def pool_stats():
+    """返回 {"host:port": {open, idle, in_use, created, requests, reused, evicted}}（同一域名的多个池合并）。"""
+    stats = {}
+    for pool in _iter_pools():
+        name = _pool_name(pool)
+        entry = stats.setdefault(name, {"open": 0, "idle": 0, "in_use": 0, "created": 0,
+                                        "requests": 0, "reused": 0, "evicted": 0})
+        idle = 0
+        in_use = 0
+        if pool.pool is not None:
+            with pool.pool.mutex:
+                idle = sum(1 for conn in pool.pool.queue if conn is not None and getattr(conn, "sock", None) is not None)
+                in_use = max(0, pool.pool.maxsize - len(pool.pool.queue))
+        entry["idle"] += idle
+        entry["in_use"] += in_use
+        entry["open"] += idle + in_use
+        entry["created"] += pool.num_connections
+        entry["requests"] += pool.num_requests
+    with _lock:
+        for name, entry in stats.items():
+            entry["reused"] = max(0, entry["requests"] - entry["created"])
+            entry["evicted"] = _evicted.get(name, 0)
+    return stats
+
+
+def log_pool_stats(log=None):
+    """把各域名连接池统计写入日志（爬取结束时调用）。"""
+    log = log or logger.info
+    for name, s in pool_stats().items():
+        log(f"   ├─ 🔗 {name}：新建连接 {s['created']} 个，复用 {s['reused']} 次，"
+            f"空闲 {s['idle']} 个，在用 {s['in_use']} 个，剔除失效 {s['evicted']} 个")
+
+
+def shutdown_pools():
+    """关闭所有共享连接池（进程退出前调用，之后的请求会重新创建）。"""
+    with _lock:
+        adapters = list(_adapters.values())
+        _adapters.clear()
+    for adapter in adapters:
+        adapter.shutdown()
+
+
+__all__ = [
+    "get_shared_adapter", "evict_broken", "pool_stats", "log_pool_stats", "shutdown_pools",
+    "SharedPoolAdapter", "SharedCachingAdapter",
+]
@@ -0,0 +1,183 @@
+"""按域名的自适应礼貌限速工具。
+
+提供 `HostThrottle`：按域名的令牌桶限速器，由服务端反馈驱动（AIMD）：
+
+- 健康时按 `min_interval` 对应的速率发放令牌（礼貌上限），并限制同时在途的请求数；
+- 遇到 429 / 5xx / 超时 / 连接错误时请求间隔成倍放大（速率乘性下降），
+  响应带 `Retry-After` 时该域名在指定时间内暂停发放令牌；
+- 每次成功后速率加性恢复（每次增加礼貌上限速率的 `recovery_step` 倍），直到回到礼貌上限。
+
+进程内共用一个实例（`get_host_throttle()`），`safe_get`/`safe_post` 在发起请求前占用名额，
+成功时由其反馈，需要重试的失败由会话的重试策略（`FeedbackRetry`）逐次反馈，
+因此串行与并发爬取、多个工作线程看到的是同一域名的同一速率。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from config.settings import HOST_MAX_INFLIGHT, HOST_MIN_INTERVAL, HOST_LIMIT_OVERRIDES
+from config.settings import HOST_RATE_BURST, HOST_BACKOFF_FACTOR, HOST_RECOVERY_STEP, HOST_MAX_INTERVAL
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1", "[::1]")
+_BACKOFF_START = 0.5  # 退避间隔的下限基准（秒）：礼貌间隔更小（如本机地址为 0）时按此计算退避与恢复
+
+
+def host_of(url):
+    """返回 URL 中的域名（含非默认端口），用作限速的分组键。"""
+    parts = urlsplit(url if "//" in url else f"//{url}")
+    host = (parts.hostname or url.split("//")[-1].split("/")[0]).lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is None or port == _DEFAULT_PORTS.get(parts.scheme):
+        return host
+    return f"{host}:{port}"
+
+
+class _HostState:
+    def __init__(self, max_inflight, min_interval, burst):
+        self.semaphore = threading.BoundedSemaphore(max_inflight)
+        self.lock = threading.Lock()
+        self.min_interval = min_interval  # 礼貌上限对应的最小请求间隔
+        self.interval = min_interval      # 当前请求间隔（令牌发放周期）
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0          # Retry-After 暂停截止时间（time.monotonic）
+        self.successes = 0
+        self.failures = 0
+        self.retry_after_hits = 0
+
+
+class HostThrottle:
+    """线程安全的按域名自适应限速器：最大在途数 + 令牌桶 + AIMD 速率调整。"""
+
+    def __init__(self, max_inflight=HOST_MAX_INFLIGHT, min_interval=HOST_MIN_INTERVAL, burst=HOST_RATE_BURST,
+                 backoff_factor=HOST_BACKOFF_FACTOR, recovery_step=HOST_RECOVERY_STEP,
+                 max_interval=HOST_MAX_INTERVAL, overrides=None):
+        self.max_inflight = max(1, int(max_inflight))
+        self.min_interval = max(0.0, float(min_interval))
+        self.burst = max(1, int(burst))
+        self.backoff_factor = max(1.0, float(backoff_factor))
+        self.recovery_step = max(0.0, float(recovery_step))
+        self.max_interval = max(self.min_interval, float(max_interval))
+        self.overrides = {}
+        for host, (max_inflight_, min_interval_) in (HOST_LIMIT_OVERRIDES if overrides is None else overrides).items():
+            self.configure(host, max_inflight_, min_interval_)
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def configure(self, url, max_inflight=None, min_interval=None):
+        """为某个域名单独设置最大在途数与最小请求间隔（需在该域名首次请求前调用）。"""
+        self.overrides[host_of(url)] = (max_inflight, min_interval)
+
+    def reset(self, url=None):
+        """清除某个域名（缺省为全部）的限速状态，下次请求时按配置重新初始化。"""
+        with self._lock:
+            if url is None:
+                self._hosts.clear()
+            else:
+                self._hosts.pop(host_of(url), None)
+
+    def _state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                max_inflight, min_interval = self.overrides.get(host, (None, None))
+                if min_interval is None:
+                    # 本机地址（如离线模拟站点）默认不设礼貌间隔，只在失败时退避
+                    min_interval = 0.0 if host.rsplit(":", 1)[0] in _LOOPBACK_HOSTS else self.min_interval
+                state = _HostState(max(1, int(max_inflight or self.max_inflight)), max(0.0, float(min_interval)),
+                                   self.burst)
+                self._hosts[host] = state
+            return state
+
+    @staticmethod
+    def _refill(state, now):
+        if state.interval <= 0:
+            state.tokens = float(state.burst)
+        else:
+            state.tokens = min(float(state.burst), state.tokens + (now - state.updated) / state.interval)
+        state.updated = now
+
+    @contextmanager
+    def slot(self, url):
+        """占用目标域名的一个请求名额，在 with 块内发起请求。"""
+        state = self._state(host_of(url))
+        state.semaphore.acquire()
+        try:
+            # 预约令牌：令牌不足时按当前间隔计算等待时间（令牌可透支，后到的请求顺延）
+            with state.lock:
+                now = time.monotonic()
+                self._refill(state, now)
+                wait = 0.0 if state.tokens >= 1 else (1 - state.tokens) * state.interval
+                state.tokens -= 1
+                wait = max(wait, state.blocked_until - now)
+            if wait > 0:
+                time.sleep(wait)
+            yield
+        finally:
+            state.semaphore.release()
+
+    def record_success(self, url):
+        """请求成功：速率加性恢复（不超过礼貌上限）。"""
+        state = self._state(host_of(url))
+        with state.lock:
+            state.successes += 1
+            if state.interval <= state.min_interval:
+                return
+            base = max(state.min_interval, _BACKOFF_START)
+            rate = 1.0 / state.interval + self.recovery_step / base
+            state.interval = 1.0 / rate
+            if state.interval <= base:
+                # 回到退避起点以内即恢复礼貌上限（礼貌间隔小于基准时不再逐步逼近 0）
+                state.interval = state.min_interval
+
+    def record_failure(self, url, retry_after=None):
+        """请求失败（429 / 5xx / 超时 / 连接错误）：速率乘性下降，并遵守 Retry-After。"""
+        state = self._state(host_of(url))
+        with state.lock:
+            now = time.monotonic()
+            self._refill(state, now)
+            state.failures += 1
+            base = max(state.interval, state.min_interval, _BACKOFF_START / self.backoff_factor)
+            # 间隔放大 backoff_factor 倍，即速率乘性下降
+            state.interval = min(max(self.max_interval, state.min_interval), base * self.backoff_factor)
+            if retry_after:
+                state.retry_after_hits += 1
+                state.blocked_until = max(state.blocked_until, now + float(retry_after))
+
+    def snapshot(self):
+        """返回 {域名: {interval, min_interval, successes, failures, retry_after}}，用于日志汇总。"""
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            host: {
+                "interval": state.interval,
+                "min_interval": state.min_interval,
+                "successes": state.successes,
+                "failures": state.failures,
+                "retry_after": state.retry_after_hits,
+            }
+            for host, state in hosts.items()
+        }
+
+
+_shared_throttle = None
+_shared_lock = threading.Lock()
+
+
+def get_host_throttle():
+    """返回进程内共享的 `HostThrottle`（首次调用时按配置创建）。"""
+    global _shared_throttle
+    with _shared_lock:
+        if _shared_throttle is None:
+            _shared_throttle = HostThrottle()
+        return _shared_throttle
+
+
+__all__ = ["HostThrottle", "get_host_throttle", "host_of"]
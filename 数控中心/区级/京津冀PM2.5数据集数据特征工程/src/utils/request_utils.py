@@ -4,17 +4,24 @@
 """
 
 import requests
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from config.settings import MAX_RETRY_TIMES, USER_AGENT_POOL, PROXY_POOL, USE_PROXY, PROXY_TIMEOUT, TUNNEL_PROXY, USE_TUNNEL_PROXY
+from config.settings import MAX_RETRY_TIMES, USER_AGENT_POOL, PROXY_POOL, USE_PROXY, PROXY_TIMEOUT, TUNNEL_PROXY, USE_TUNNEL_PROXY, HTTP_CACHE_ENABLED
 import random
 import time
+import ipaddress
+from urllib.parse import urlsplit
 from src.utils.logger import setup_logger
 from urllib3.exceptions import InsecureRequestWarning, ProtocolError
 import socket
 import logging
 import ssl
 from urllib3.poolmanager import PoolManager
+from src.utils.http_cache import get_response_cache
+from src.utils.pool_manager import get_shared_adapter, evict_broken
+from src.utils.rate_limiter import get_host_throttle, host_of
+from src.utils import metrics
+from src.utils.get_ip import invalidate_cached_ip
+from contextlib import nullcontext
 
 # 忽略SSL验证警告
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
@@ -23,17 +30,42 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 logger = setup_logger(__name__)
 
 
-def create_session():
-    """创建一个带重试策略的 `requests.Session` 对象。（支持代理）"""
+class FeedbackRetry(Retry):
+    """重试策略：每次需要重试的失败（429 / 5xx / 超时 / 连接错误）都反馈给按域名的自适应限速器。"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if url and "//" in url:
+            target = url  # 经 HTTP 代理时 url 为完整地址
+        elif _pool is not None:
+            target = f"{_pool.scheme}://{_pool.host}:{_pool.port}"
+        else:
+            target = None
+        if target:
+            retry_after = self.get_retry_after(response) if response is not None else None
+            get_host_throttle().record_failure(target, retry_after=retry_after)
+            metrics.HTTP_RETRIES.inc(host=host_of(target))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def create_session(cache=None):
+    """创建一个带重试策略的 `requests.Session` 对象。（支持代理）
+
+    `cache` 为 True 时挂载本地响应缓存（见 `src/utils/http_cache.py`），
+    为 None 时按 `HTTP_CACHE_ENABLED` 决定。所有会话共用 `pool_manager` 中的适配器与连接池，
+    创建会话本身不新建连接。
+    """
     session = requests.Session()
-    retry_strategy = Retry(
+    retry_strategy = FeedbackRetry(
         total=MAX_RETRY_TIMES,
         backoff_factor=1,  # 重试间隔：1s, 2s, 4s...
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["GET","POST"],  # 仅对GET请求重试
         respect_retry_after_header=True  # 尊重服务器的 Retry-After 头
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=20, pool_maxsize=20, pool_block=False)
+    use_cache = HTTP_CACHE_ENABLED if cache is None else cache
+    if use_cache:
+        session.response_cache = get_response_cache()
+    adapter = get_shared_adapter(retry_strategy, cache=session.response_cache if use_cache else None)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
 
@@ -53,6 +85,21 @@ def create_session():
 
     return session
 
+def is_cached(session, url, params=None, data=None, method="GET"):
+    """请求能否直接由会话的本地缓存应答（命中时无需礼貌等待）。"""
+    cache = getattr(session, "response_cache", None)
+    return cache is not None and cache.is_fresh(method, url, params=params, data=data)
+
+def is_loopback(url):
+    """目标是否为本机地址（如 `scripts/crawl_simulator.py` 启动的模拟站点），此时无需礼貌等待。"""
+    host = urlsplit(url).hostname or ""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
 def get_random_proxy():
     """从代理池随机选择一个可用代理"""
     if not USE_PROXY or not PROXY_POOL:
@@ -103,18 +150,40 @@ def get_headers(referer="https://www.tianqihoubao.com/aqi/"):
     }
 
 
-def safe_get(session, url, params=None, timeout=15, referer=None, verify=False):
+def _record_response(url, method, started, response):
+    """把一次完成的请求记入指标：缓存命中只计命中数，否则记录耗时、状态码与下载字节数。"""
+    host = host_of(url)
+    if getattr(response, "from_cache", False):
+        metrics.HTTP_CACHE_HITS.inc(host=host)
+        return
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, host=host, method=method)
+    metrics.HTTP_RESPONSES.inc(host=host, code=response.status_code)
+    metrics.HTTP_RESPONSE_BYTES.inc(len(response.content or b""), host=host)
+
+
+def _wait_before_retry(throttle, url, attempt):
+    """重试前的等待：经过限速器时由其按退避后的间隔等待，否则按指数退避休眠。"""
+    metrics.HTTP_RETRIES.inc(host=host_of(url))
+    if throttle is not None:
+        logger.info(f"⏱️ 按自适应限速间隔重试（第{attempt + 1}次）: {url}")
+        return
+    backoff = (2 ** (attempt - 1)) + random.uniform(0, 1)
+    logger.info(f"⏱️ 等待 {backoff:.1f}s 后重试（第{attempt + 1}次）: {url}")
+    time.sleep(backoff)
+
+
+def safe_get(session, url, params=None, timeout=15, referer=None, verify=False, delay=True):
     """安全请求：集成代理池、动态间隔、自动重试、添加伪装头并返回 response 或 None。
 
     在底层连接被远端重置（ProtocolError / ConnectionResetError）时，
-    会按 `MAX_RETRY_TIMES` 进行指数退避重试，并在每次重试时尝试重建会话以避免复用已损坏的连接。
+    会按 `MAX_RETRY_TIMES` 重试，并从共享连接池中剔除已断开的连接（健康连接继续复用）。
+    请求间隔由按域名的自适应限速器（`get_host_throttle()`）控制：健康时不超过礼貌上限，
+    失败后自动放慢并遵守 Retry-After；`delay=False` 或缓存命中时不经过限速器。
     """
 
-    # 随机间隔优化（根据域名动态调整间隔）
     domain = url.split("//")[-1].split("/")[0]
-    base_interval = 1.5 if "cnemc.cn" in domain else 0.8
-    sleep_time = random.uniform(base_interval, base_interval + 2.0) # 1.5-3.5秒随机间隔
-    time.sleep(sleep_time)
+    # 缓存命中不访问网络，无需等待
+    throttle = get_host_throttle() if delay and not is_cached(session, url, params=params) else None
 
     max_attempts = max(1, int(getattr(__import__('config.settings'), 'MAX_RETRY_TIMES', MAX_RETRY_TIMES)))
     for attempt in range(1, max_attempts + 1):
@@ -122,55 +191,58 @@ def safe_get(session, url, params=None, timeout=15, referer=None, verify=False):
             # 获取随机代理（每次重试可能更换代理）
             proxies = get_random_proxy() if USE_PROXY else None
             headers = get_headers(referer=referer or f'https://{domain}')
-            response = session.get(
-                url=url,
-                params=params,
-                headers=headers,
-                proxies=proxies,
-                timeout=timeout,
-                verify=False  # 忽略SSL验证（部分网站可能证书过期）
-            )
+            with (throttle.slot(url) if throttle else nullcontext()):
+                started = time.perf_counter()
+                response = session.get(
+                    url=url,
+                    params=params,
+                    headers=headers,
+                    proxies=proxies,
+                    timeout=timeout,
+                    verify=False  # 忽略SSL验证（部分网站可能证书过期）
+                )
+            _record_response(url, "GET", started, response)
             response.raise_for_status()  # 触发HTTP错误
+            if throttle:
+                throttle.record_success(url)
             response.encoding = response.apparent_encoding or "utf-8"
-            logger.info(f" └─ ✅ 请求成功：{url}（状态码：{response.status_code}）")
+            if getattr(response, "from_cache", False):
+                logger.info(f" └─ 💾 缓存命中：{url}")
+            else:
+                logger.info(f" └─ ✅ 请求成功：{url}（状态码：{response.status_code}）")
             return response
 
         except requests.exceptions.HTTPError as e:
             logger.error(f" ├─ ❌ HTTP错误：{url}，状态码：{e.response.status_code if e.response else '未知'}，错误：{str(e)}")
             break
         except requests.exceptions.Timeout:
+            metrics.HTTP_RESPONSES.inc(host=host_of(url), code="timeout")
             logger.warning(f" ├─ ⏱️ 请求超时（第{attempt}次）：{url}（超时时间：{timeout}s）")
-        except (ProtocolError, ConnectionResetError, socket.error) as e:
-            # 底层连接被重置：尝试重建 session 并重试
+        except (requests.exceptions.ConnectionError, ProtocolError, ConnectionResetError, socket.error) as e:
+            # 底层连接被重置：只剔除该域名已断开的连接后重试（出口可能随之变化，刷新缓存的出口IP）
             logger.warning(f" ├─ ！ 连接被重置（第{attempt}次）：{url}，错误：{repr(e)}")
-            try:
-                session.close()
-            except Exception:
-                pass
-            # 重建 session，避免复用损坏的连接
-            session = create_session()
+            metrics.HTTP_RESPONSES.inc(host=host_of(url), code="error")
+            evict_broken(url)
+            invalidate_cached_ip()
         except requests.exceptions.RequestException as e:
+            metrics.HTTP_RESPONSES.inc(host=host_of(url), code="error")
             logger.error(f" ├─ ❌ 请求失败（第{attempt}次）：{url}，错误：{str(e)}")
 
-        # 若需要重试，先等一段指数退避时间
         if attempt < max_attempts:
-            backoff = (2 ** (attempt - 1)) + random.uniform(0, 1)
-            logger.info(f"⏱️ 等待 {backoff:.1f}s 后重试（第{attempt + 1}次）: {url}")
-            time.sleep(backoff)
+            _wait_before_retry(throttle, url, attempt)
 
     logger.error(f" └─ 🔄 多次重试失败：{url}")
     return None
 
-def safe_post(session, url, params=None, data=None, timeout=15, referer=None, verify=False):
+def safe_post(session, url, params=None, data=None, timeout=15, referer=None, verify=False, delay=True):
     """安全的POST请求：集成代理池、动态间隔、自动重试、添加伪装头并返回 response 或 None。
     
     与 safe_get 共享相同的重试逻辑和抗反爬策略，适用于需要POST方法的接口。
+    请求间隔同样由按域名的自适应限速器控制，`delay=False` 或缓存命中时不经过限速器。
     """
-    # 随机间隔优化（根据域名动态调整间隔）
     domain = url.split("//")[-1].split("/")[0]
-    base_interval = 1.5 if "cnemc.cn" in domain else 0.8
-    sleep_time = random.uniform(base_interval, base_interval + 2.0)  # 1.5-3.5秒随机间隔
-    time.sleep(sleep_time)
+    cached = is_cached(session, url, params=params, data=data, method="POST")  # 缓存命中无需等待
+    throttle = get_host_throttle() if delay and not cached else None
 
     max_attempts = max(1, int(getattr(__import__('config.settings'), 'MAX_RETRY_TIMES', MAX_RETRY_TIMES)))
     for attempt in range(1, max_attempts + 1):
@@ -178,16 +250,21 @@ def safe_post(session, url, params=None, data=None, timeout=15, referer=None, ve
             # 获取随机代理（每次重试可能更换代理）
             proxies = get_random_proxy() if USE_PROXY else None
             headers = get_headers(referer=referer or f'https://{domain}')
-            response = session.post(
-                url=url,
-                params=params,  # URL参数（?后的键值对）
-                data=data,      # POST表单数据（body内容）
-                headers=headers,
-                proxies=proxies,
-                timeout=timeout,
-                verify=False  # 忽略SSL验证
-            )
+            with (throttle.slot(url) if throttle else nullcontext()):
+                started = time.perf_counter()
+                response = session.post(
+                    url=url,
+                    params=params,  # URL参数（?后的键值对）
+                    data=data,      # POST表单数据（body内容）
+                    headers=headers,
+                    proxies=proxies,
+                    timeout=timeout,
+                    verify=False  # 忽略SSL验证
+                )
+            _record_response(url, "POST", started, response)
             response.raise_for_status()  # 触发HTTP错误
+            if throttle:
+                throttle.record_success(url)
             response.encoding = response.apparent_encoding or "utf-8"
             logger.info(f" └─ ✅ POST请求成功：{url}（状态码：{response.status_code}）")
             return response
@@ -196,23 +273,20 @@ def safe_post(session, url, params=None, data=None, timeout=15, referer=None, ve
             logger.error(f" ├─ ❌ POST HTTP错误：{url}，状态码：{e.response.status_code if e.response else '未知'}，错误：{str(e)}")
             break
         except requests.exceptions.Timeout:
+            metrics.HTTP_RESPONSES.inc(host=host_of(url), code="timeout")
             logger.warning(f" ├─ ⏱️ POST请求超时（第{attempt}次）：{url}（超时时间：{timeout}s）")
-        except (ProtocolError, ConnectionResetError, socket.error) as e:
-            # 底层连接被重置：重建session重试
+        except (requests.exceptions.ConnectionError, ProtocolError, ConnectionResetError, socket.error) as e:
+            # 底层连接被重置：剔除已断开的连接后重试
             logger.warning(f" ├─ ！ POST连接被重置（第{attempt}次）：{url}，错误：{repr(e)}")
-            try:
-                session.close()
-            except Exception:
-                pass
-            session = create_session()  # 重建会话
+            metrics.HTTP_RESPONSES.inc(host=host_of(url), code="error")
+            evict_broken(url)
+            invalidate_cached_ip()
         except requests.exceptions.RequestException as e:
+            metrics.HTTP_RESPONSES.inc(host=host_of(url), code="error")
             logger.error(f" ├─ ❌ POST请求失败（第{attempt}次）：{url}，错误：{str(e)}")
 
-        # 指数退避重试
         if attempt < max_attempts:
-            backoff = (2 ** (attempt - 1)) + random.uniform(0, 1)
-            logger.info(f"⏱️ 等待 {backoff:.1f}s 后重试（第{attempt + 1}次）: {url}")
-            time.sleep(backoff)
+            _wait_before_retry(throttle, url, attempt)
 
     logger.error(f" └─ 🔄 POST多次重试失败：{url}")
     return None
\ No newline at end of file